@@ -0,0 +1,70 @@
+"""
+Production entry point.
+
+    python -m main
+
+Runs WEB_CONCURRENCY worker processes (default: one per CPU core) that
+share one listening socket bound by the supervisor. On SIGTERM/SIGINT each
+worker stops accepting, tells WebSocket clients to reconnect after a
+jittered delay, flushes buffered feed events, and gives in-flight requests
+up to SHUTDOWN_TIMEOUT_SECONDS before the process exits.
+
+HOST (default 0.0.0.0), PORT (default 8000), LOG_LEVEL,
+FORWARDED_ALLOW_IPS (proxies whose X-Forwarded-For is trusted for the
+client address, default 127.0.0.1; "*" behind a load balancer that is
+the only way in).
+"""
+import os
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import uvicorn  # noqa: E402
+from uvicorn.supervisors import Multiprocess  # noqa: E402
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "15"))
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn.Server that drains WebSockets before the standard shutdown."""
+
+    async def shutdown(self, sockets=None):
+        # Stop accepting first, so drained clients can't land back here.
+        for server in self.servers:
+            server.close()
+
+        # Imported in the worker only; the supervisor never loads the app.
+        from main.ws_manager import drain_realtime
+        await drain_realtime()
+
+        # Standard path: waits for in-flight requests up to the graceful
+        # timeout, then runs the app's shutdown hooks (jobs, outbox).
+        await super().shutdown(sockets=sockets)
+
+
+def main():
+    config = uvicorn.Config(
+        "main.app:app",
+        host=HOST,
+        port=PORT,
+        workers=WORKERS,
+        log_level=os.getenv("LOG_LEVEL", "INFO").lower(),
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        timeout_graceful_shutdown=SHUTDOWN_TIMEOUT_SECONDS,
+    )
+    server = DrainingServer(config)
+
+    if WORKERS > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,143 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI
+import asyncio
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from pymongo.errors import ConnectionFailure
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, HTMLResponse
 from pathlib import Path
 
 from main.auth import router as auth_router
 from main.feed import router as feed_router
 from main.ws_room import router as ws_router
 from main.profile import router as profile_router
-from main.database import init_indexes
+from main.database import init_indexes, posts_collection
+from main.ranking import backfill_scores
+from main.search import router as search_router, backfill_hashtags
+from main.tiering import ensure_notification_ttl, archive_old_posts, ARCHIVE_INTERVAL_SECONDS
+from main import jobs, outbox
+from main.follow_graph import graph, GRAPH_RELOAD_SECONDS
+from main.graph_sync import graph_sync, GRAPH_SYNC_SECONDS
+from main.reconcile import reconcile_counters, RECONCILE_INTERVAL_SECONDS
+from main.deletion import cascade_deletes, CASCADE_INTERVAL_SECONDS
+from main.views import views, VIEWS_FLUSH_SECONDS
+from main.availability import availability, AVAILABILITY_SYNC_SECONDS
+from main.pages import PageTemplate, home_bootstrap
 from main.friends import router as friends_router
 from main.ws import router as ws_router
+from main.metrics import router as metrics_router, MetricsMiddleware
+from main.health import router as health_router, state as health_state
+from main.export import router as export_router
+from main.log import setup_logging, get_logger
+from main.profiling import PROFILE_ENABLED, ProfilingMiddleware
+from main.ratelimit import AdmissionMiddleware
+from main.breaker import record_exception
+from main.sessions import denylist, DENYLIST_SYNC_SECONDS
 
+setup_logging()
+logger = get_logger("app")
 
-
-print("🔥 Wire App Loaded 🔥")
+logger.info("app_loaded")
 
 app = FastAPI()
+# Last added runs first: metrics wrap admission so shed requests are counted.
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+if PROFILE_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+
+@app.exception_handler(ConnectionFailure)
+async def mongo_unavailable(request: Request, exc: ConnectionFailure):
+    # Unreachable/timed-out Mongo is a 503, and counts against the breaker.
+    record_exception(exc)
+    return JSONResponse(
+        {"detail": "Database unavailable, retry shortly"},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
+
+INDEX_RETRY_SECONDS = 5
+
+
+async def ensure_indexes():
+    # Retried in the background so a worker that boots while Mongo is down
+    # still comes up (not ready) instead of crashing. Every step is
+    # idempotent, so a failure anywhere restarts the whole sequence.
+    while True:
+        try:
+            built = await init_indexes()
+            # Posts that predate ranking; uses the score index, so it is a
+            # near no-op once everything is scored.
+            scored = await backfill_scores(posts_collection)
+            tagged = await backfill_hashtags(posts_collection)
+            await ensure_notification_ttl()
+            logger.info("indexes_ensured", extra={"fields": {"built": built, "scored": scored, "tagged": tagged}})
+            # Feed privacy checks read the graph, so stay unready until loaded.
+            await graph.load()
+            # Likewise, a restarted worker must not accept logged-out tokens.
+            await denylist.sync()
+        except Exception:
+            logger.exception("index_bootstrap_failed")
+            await asyncio.sleep(INDEX_RETRY_SECONDS)
+            continue
+        health_state["indexes_ready"] = True
+        return
+
+
+# The loop only holds weak references to tasks; keep the bootstrap alive.
+bootstrap_task: Optional[asyncio.Task] = None
+
 
 @app.on_event("startup")
 async def startup():
-    await init_indexes()
-    print("✅ MongoDB indexes ensured")
+    global bootstrap_task
+    bootstrap_task = asyncio.create_task(ensure_indexes())
+    jobs.start_periodic("archive_old_posts", ARCHIVE_INTERVAL_SECONDS, archive_old_posts)
+    jobs.start_periodic("reconcile_counters", RECONCILE_INTERVAL_SECONDS, reconcile_counters)
+    jobs.start_periodic("cascade_deletes", CASCADE_INTERVAL_SECONDS, cascade_deletes)
+    # Each worker merges its own sketches.
+    jobs.start_periodic("views_flush", VIEWS_FLUSH_SECONDS, views.flush, leased=False)
+    jobs.start_periodic("follow_graph_reload", GRAPH_RELOAD_SECONDS, graph.load, leased=False)
+    jobs.start_periodic("graph_sync", GRAPH_SYNC_SECONDS, graph_sync.sync, leased=False)
+    jobs.start_periodic("denylist_sync", DENYLIST_SYNC_SECONDS, denylist.sync, leased=False)
+    jobs.start_periodic("availability_sync", AVAILABILITY_SYNC_SECONDS, availability.sync, leased=False)
+    outbox.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    jobs.stop_all()
+    await outbox.stop()
+    # Unmerged impressions would otherwise die with the worker.
+    try:
+        await views.flush()
+    except Exception:
+        logger.exception("views_flush_failed")
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 STATIC_DIR = BASE_DIR / "static"
 
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
+home_template = PageTemplate(STATIC_DIR / "home.html")
+
 # ---------- API ROUTERS ----------
 app.include_router(friends_router)
 app.include_router(ws_router)
 app.include_router(auth_router)
+app.include_router(search_router)
 app.include_router(feed_router)
 app.include_router(ws_router)
 app.include_router(profile_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
+app.include_router(export_router)
 
 # ---------- PAGES ----------
 @app.get("/")
@@ -44,8 +145,12 @@ def landing_page():
     return FileResponse(STATIC_DIR / "landing.html")
 
 @app.get("/home")
-def home_page():
-    return FileResponse(STATIC_DIR / "home.html")
+async def home_page(request: Request):
+    # Identity and first feed page inline: one round trip to first post.
+    return HTMLResponse(
+        home_template.render(await home_bootstrap(request)),
+        headers={"Cache-Control": "no-store"},
+    )
 
 @app.get("/profile")
 def profile_page():
@@ -1,17 +1,75 @@
-from fastapi import APIRouter, HTTPException, status, Response, Depends
+from fastapi import APIRouter, HTTPException, status, Request, Response, Depends, Query
+from fastapi.responses import JSONResponse
 from datetime import datetime
 from pymongo.errors import DuplicateKeyError
 import os
+from typing import Optional
 
-from main.database import users_collection, profiles_collection
-from main.models import UserSignup, UserLogin
-from main.security import hash_password, verify_password, create_access_token
+from main.database import (
+    users_collection,
+    profiles_collection,
+    run_in_transaction,
+    CASE_INSENSITIVE,
+    LIVE,
+)
+from main.availability import availability
+from main.models import UserSignup, UserLogin, AccountDelete
+from main.security import (
+    hash_password,
+    verify_password,
+    decode_token,
+    ACCESS_TOKEN_TTL,
+    REFRESH_TOKEN_TTL,
+)
+from main.sessions import open_session, refresh_session, revoke_session, SessionError
+from main.deletion import tombstone_account
 from main.deps import get_current_user
+from main.ratelimit import rate_limit_ip
+from main.metrics import auth_failures
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 ENV = os.getenv("ENV", "development")
 
+# The refresh cookie is only ever sent to /auth/refresh and /auth/logout.
+REFRESH_COOKIE_PATH = "/auth"
+
+
+def set_auth_cookies(response: Response, access: str, refresh: str = None):
+    common = {"httponly": True}
+
+    # 🔥 ENV-AWARE COOKIE SETTINGS
+    if ENV == "production":
+        common.update({
+            "secure": True,     # HTTPS only (ngrok / prod)
+            "samesite": "none"
+        })
+    else:
+        common.update({
+            "secure": False,    # Local HTTP
+            "samesite": "lax"
+        })
+
+    response.set_cookie(
+        key="access_token",
+        value=access,
+        max_age=int(ACCESS_TOKEN_TTL.total_seconds()),
+        **common,
+    )
+    if refresh:
+        response.set_cookie(
+            key="refresh_token",
+            value=refresh,
+            max_age=int(REFRESH_TOKEN_TTL.total_seconds()),
+            path=REFRESH_COOKIE_PATH,
+            **common,
+        )
+
+
+def clear_auth_cookies(response: Response):
+    response.delete_cookie("access_token")
+    response.delete_cookie("refresh_token", path=REFRESH_COOKIE_PATH)
+
 
 # ======================
 # ME (COOKIE AUTH)
@@ -25,22 +83,69 @@ async def me(user=Depends(get_current_user)):
     }
 
 
+# ======================
+# AVAILABILITY
+# ======================
+
+@router.get("/available", dependencies=[Depends(rate_limit_ip("available"))])
+async def check_available(
+    username: Optional[str] = Query(None, max_length=50),
+    email: Optional[str] = Query(None, max_length=254),
+):
+    """For the signup form; most answers come from memory, not Mongo."""
+    result = {}
+    if username:
+        result["username"] = not await availability.is_taken("username", username)
+    if email:
+        result["email"] = not await availability.is_taken("email", email)
+    if not result:
+        raise HTTPException(400, "Pass username and/or email")
+    return result
+
+
 # ======================
 # SIGNUP
 # ======================
 
-@router.post("/signup", status_code=status.HTTP_201_CREATED)
+@router.post("/signup", status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit_ip("signup"))])
 async def signup(data: UserSignup):
     email = data.email.strip().lower()
     username = data.username.strip().lower()
 
-    try:
+    # Cheap checks before the deliberately expensive password hash. The
+    # unique indexes still decide races between concurrent signups.
+    if await availability.is_taken("email", email):
+        raise HTTPException(409, "Email already registered")
+    if await availability.is_taken("username", username):
+        raise HTTPException(409, "Username already taken")
+
+    password = hash_password(data.password)
+    now = datetime.utcnow()
+
+    async def write(session):
         await users_collection.insert_one({
             "email": email,
             "username": username,
-            "password": hash_password(data.password),
-            "created_at": datetime.utcnow()
-        })
+            "password": password,
+            "created_at": now
+        }, session=session)
+
+        await profiles_collection.insert_one({
+            "username": username,
+            "full_name": "",
+            "bio": "",
+            "gender": "prefer_not_say",
+            "date_of_birth": None,
+            "website": "",
+            "location": "",
+            "avatar_url": "",
+            "is_private": False,
+            "created_at": now,
+            "updated_at": now
+        }, session=session)
+
+    try:
+        await run_in_transaction(write)
     except DuplicateKeyError as e:
         msg = str(e)
         if "email" in msg:
@@ -49,20 +154,7 @@ async def signup(data: UserSignup):
             raise HTTPException(409, "Username already taken")
         raise HTTPException(409, "User already exists")
 
-    await profiles_collection.insert_one({
-        "username": username,
-        "full_name": "",
-        "bio": "",
-        "gender": "prefer_not_say",
-        "date_of_birth": None,
-        "website": "",
-        "location": "",
-        "avatar_url": "",
-        "is_private": False,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    })
-
+    availability.add(username, email)
     return {"message": "Account created successfully"}
 
 
@@ -74,40 +166,48 @@ async def signup(data: UserSignup):
 async def login(data: UserLogin, response: Response):
     email = data.email.strip().lower()
 
-    user = await users_collection.find_one({"email": email})
+    user = await users_collection.find_one(
+        {"email": email, **LIVE},
+        collation=CASE_INSENSITIVE
+    )
     if not user or not verify_password(data.password, user["password"]):
+        auth_failures.inc("bad_credentials")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
 
-    token = create_access_token({
-        "username": user["username"],
-        "email": user["email"]
-    })
-
-    cookie_kwargs = {
-        "key": "access_token",
-        "value": token,
-        "httponly": True,
-        "max_age": 60 * 60 * 24
-    }
+    access, refresh = await open_session(user)
+    set_auth_cookies(response, access, refresh)
 
-    # 🔥 ENV-AWARE COOKIE SETTINGS
-    if ENV == "production":
-        cookie_kwargs.update({
-            "secure": True,     # HTTPS only (ngrok / prod)
-            "samesite": "none"
-        })
-    else:
-        cookie_kwargs.update({
-            "secure": False,    # Local HTTP
-            "samesite": "lax"
-        })
+    return {"message": "Login successful"}
 
-    response.set_cookie(**cookie_kwargs)
 
-    return {"message": "Login successful"}
+# ======================
+# REFRESH
+# ======================
+
+@router.post("/refresh")
+async def refresh(request: Request, response: Response):
+    token = request.cookies.get("refresh_token")
+    if not token:
+        auth_failures.inc("missing_refresh")
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Authentication required")
+
+    try:
+        access, new_refresh = await refresh_session(token)
+    except SessionError:
+        auth_failures.inc("invalid_refresh")
+        # Returned, not raised, so the cookie deletions reach the client.
+        failed = JSONResponse(
+            {"detail": "Invalid or expired session"},
+            status_code=status.HTTP_401_UNAUTHORIZED,
+        )
+        clear_auth_cookies(failed)
+        return failed
+
+    set_auth_cookies(response, access, new_refresh)
+    return {"message": "Refreshed"}
 
 
 # ======================
@@ -115,6 +215,50 @@ async def login(data: UserLogin, response: Response):
 # ======================
 
 @router.post("/logout")
-async def logout(response: Response):
-    response.delete_cookie("access_token")
-    return {"message": "Logged out"}
\ No newline at end of file
+async def logout(request: Request, response: Response):
+    """Ends the session server-side, so copies of its tokens stop working."""
+    payload = {}
+    for cookie, kind in (("access_token", "access"), ("refresh_token", "refresh")):
+        token = request.cookies.get(cookie)
+        if token:
+            try:
+                payload = decode_token(token, kind)
+                break
+            except ValueError:
+                continue
+
+    await revoke_session(
+        payload.get("sid"),
+        payload.get("jti") if payload.get("type") == "access" else None,
+    )
+    clear_auth_cookies(response)
+    return {"message": "Logged out"}
+
+
+# ======================
+# DELETE ACCOUNT
+# ======================
+
+@router.delete("/me")
+async def delete_account(
+    data: AccountDelete,
+    response: Response,
+    user=Depends(get_current_user)
+):
+    """
+    Takes effect at once: sessions revoked, profile and posts hidden. The
+    username stays taken until the background cascade has removed the
+    rest of the account's data.
+    """
+    record = await users_collection.find_one(
+        {"username": user["username"], **LIVE},
+        collation=CASE_INSENSITIVE
+    )
+    # 403, not 401: a wrong password must not look like an expired session.
+    if not record or not verify_password(data.password, record["password"]):
+        auth_failures.inc("bad_credentials")
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Invalid credentials")
+
+    await tombstone_account(record["username"])
+    clear_auth_cookies(response)
+    return {"message": "Account deleted"}
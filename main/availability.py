@@ -0,0 +1,149 @@
+import hashlib
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from main.database import users_collection, CASE_INSENSITIVE
+from main.log import get_logger
+from main.metrics import registry
+
+logger = get_logger("availability")
+
+# ======================
+# CONFIG
+# ======================
+
+# Accounts the filter is sized for (two keys each); rebuilds grow it.
+BLOOM_EXPECTED_USERS = int(os.getenv("BLOOM_EXPECTED_USERS", "1000000"))
+BLOOM_FALSE_POSITIVE_RATE = float(os.getenv("BLOOM_FALSE_POSITIVE_RATE", "0.01"))
+# New signups on other workers arrive by polling users.created_at; a full
+# rebuild (which also forgets deleted accounts) runs far less often.
+AVAILABILITY_SYNC_SECONDS = float(os.getenv("AVAILABILITY_SYNC_SECONDS", "5"))
+AVAILABILITY_REBUILD_SECONDS = float(os.getenv("AVAILABILITY_REBUILD_SECONDS", "3600"))
+AVAILABILITY_SYNC_OVERLAP = timedelta(seconds=10)
+LOAD_BATCH_SIZE = 10000
+
+FIELDS = ("username", "email")
+
+lookups_total = registry.counter(
+    "wire_availability_lookups_total",
+    "Availability checks: bloom miss (answered in memory), confirmed taken, false positive",
+    ("result",),
+)
+
+
+def normalize(value: str) -> str:
+    # Same normalization as signup; the unique indexes are case-insensitive.
+    return value.strip().lower()
+
+
+# ======================
+# BLOOM FILTER
+# ======================
+# k bit positions per key from one 128-bit hash (double hashing). No
+# false negatives: "not in the filter" is certain and needs no query.
+
+class BloomFilter:
+    def __init__(self, expected: int, fp_rate: float):
+        expected = max(expected, 1)
+        self.size = max(64, int(-expected * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / expected * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return ((h1 + i * h2) % size for i in range(self.hashes))
+
+    def add(self, key: str):
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+def _key(field: str, value: str) -> str:
+    return f"{field}:{value}"
+
+
+# ======================
+# TAKEN NAMES
+# ======================
+
+class Availability:
+    def __init__(self):
+        self.filter = BloomFilter(BLOOM_EXPECTED_USERS * len(FIELDS), BLOOM_FALSE_POSITIVE_RATE)
+        self.synced_at: Optional[datetime] = None
+        self.loaded = False
+        self.rebuilt_at = 0.0
+        registry.gauge_callback(
+            "wire_availability_bloom_bytes",
+            "Size of the username/email Bloom filter",
+            lambda: len(self.filter.bits),
+        )
+
+    def add(self, username: str, email: str):
+        self.filter.add(_key("username", normalize(username)))
+        self.filter.add(_key("email", normalize(email)))
+
+    async def rebuild(self):
+        """Full scan of the users collection; sized for twice its count."""
+        now = datetime.utcnow()
+        expected = max(BLOOM_EXPECTED_USERS, 2 * await users_collection.estimated_document_count())
+        fresh = BloomFilter(expected * len(FIELDS), BLOOM_FALSE_POSITIVE_RATE)
+        cursor = users_collection.find({}, {"_id": 0, "username": 1, "email": 1}).batch_size(LOAD_BATCH_SIZE)
+        async for u in cursor:
+            for field in FIELDS:
+                if u.get(field):
+                    fresh.add(_key(field, normalize(u[field])))
+
+        self.filter = fresh
+        self.synced_at = now
+        self.rebuilt_at = time.monotonic()
+        self.loaded = True
+        logger.info(
+            "availability_rebuilt",
+            extra={"fields": {"keys": fresh.count, "bytes": len(fresh.bits), "hashes": fresh.hashes}},
+        )
+
+    async def sync(self):
+        """Periodic job (every worker): pick up other workers' signups."""
+        if not self.loaded or time.monotonic() - self.rebuilt_at >= AVAILABILITY_REBUILD_SECONDS:
+            await self.rebuild()
+            return
+        now = datetime.utcnow()
+        cursor = users_collection.find(
+            {"created_at": {"$gt": self.synced_at - AVAILABILITY_SYNC_OVERLAP}},
+            {"_id": 0, "username": 1, "email": 1},
+        )
+        async for u in cursor:
+            self.add(u["username"], u["email"])
+        self.synced_at = now
+
+    async def is_taken(self, field: str, value: str) -> bool:
+        """
+        A filter miss is trusted (it lags other workers' signups by at
+        most one sync); a maybe is confirmed against the unique index.
+        """
+        value = normalize(value)
+        if self.loaded and _key(field, value) not in self.filter:
+            lookups_total.inc("miss")
+            return False
+        taken = await users_collection.find_one(
+            {field: value}, {"_id": 1}, collation=CASE_INSENSITIVE
+        ) is not None
+        lookups_total.inc("taken" if taken else "false_positive")
+        return taken
+
+
+# 🔥 SINGLE GLOBAL INSTANCE
+availability = Availability()
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Hashable, Tuple
+
+from fastapi import HTTPException
+from pymongo import monitoring
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, ServerSelectionTimeoutError
+
+from main.cache import LRUCache
+from main.log import get_logger
+from main.metrics import registry
+
+logger = get_logger("breaker")
+
+# ======================
+# CONFIG
+# ======================
+
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "true").lower() == "true"
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW_CALLS", "100"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "20"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_MS", "1000")) / 1000
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "5"))
+BREAKER_PROBE_INTERVAL = float(os.getenv("BREAKER_PROBE_INTERVAL_MS", "1000")) / 1000
+
+STALE_CACHE_SIZE = int(os.getenv("STALE_CACHE_SIZE", "10000"))
+STALE_TTL_SECONDS = float(os.getenv("STALE_TTL_SECONDS", "900"))
+
+STALE_HEADER = "X-Wire-Stale"
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half_open", OPEN: "open"}
+
+# Server error codes that mean "the database is unhealthy", as opposed to
+# "this command was wrong" (duplicate key, validation, ...).
+UNHEALTHY_CODES = {
+    6,      # HostUnreachable
+    7,      # HostNotFound
+    50,     # MaxTimeMSExpired
+    89,     # NetworkTimeout
+    91,     # ShutdownInProgress
+    189,    # PrimarySteppedDown
+    9001,   # SocketException
+    10107,  # NotWritablePrimary
+    11600,  # InterruptedAtShutdown
+    11602,  # InterruptedDueToReplStateChange
+    13435,  # NotPrimaryNoSecondaryOk
+}
+
+
+# ======================
+# BREAKER
+# ======================
+# Outcomes of the last BREAKER_WINDOW Mongo commands; a failure is an
+# unhealthy error or a command slower than BREAKER_SLOW_MS. Past
+# BREAKER_FAILURE_RATE the breaker opens and callers fail fast. After
+# BREAKER_OPEN_SECONDS it lets one request through per probe interval
+# (half-open); the next outcome closes or re-opens it.
+#
+# Outcomes arrive from driver threads, hence the lock.
+
+class CircuitBreaker:
+    def __init__(self):
+        self.state = CLOSED
+        self.outcomes: deque = deque(maxlen=BREAKER_WINDOW)
+        self.failures = 0
+        self.open_until = 0.0
+        self.last_probe = 0.0
+        self._lock = threading.Lock()
+
+        self.transitions = registry.counter(
+            "wire_breaker_transitions_total",
+            "Circuit breaker state changes",
+            ("state",),
+        )
+        registry.gauge_callback(
+            "wire_breaker_state",
+            "Mongo circuit breaker: 0 closed, 1 half-open, 2 open",
+            lambda: self.state,
+        )
+
+    def _set(self, state: int):
+        # Caller holds the lock.
+        if state == self.state:
+            return
+        self.state = state
+        self.transitions.inc(STATE_NAMES[state])
+        if state == OPEN:
+            self.open_until = time.monotonic() + BREAKER_OPEN_SECONDS
+        elif state == CLOSED:
+            self.outcomes.clear()
+            self.failures = 0
+        logger.warning("breaker_state", extra={"fields": {"state": STATE_NAMES[state]}})
+
+    def record(self, ok: bool):
+        if not BREAKER_ENABLED:
+            return
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._set(CLOSED if ok else OPEN)
+                return
+            if self.state == OPEN:
+                return
+            if len(self.outcomes) == self.outcomes.maxlen:
+                self.failures -= not self.outcomes[0]
+            self.outcomes.append(ok)
+            self.failures += not ok
+            if (
+                len(self.outcomes) >= BREAKER_MIN_CALLS
+                and self.failures / len(self.outcomes) >= BREAKER_FAILURE_RATE
+            ):
+                self._set(OPEN)
+
+    def allow(self) -> bool:
+        """May this request touch Mongo? Also admits half-open probes."""
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN and now >= self.open_until:
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN and now - self.last_probe >= BREAKER_PROBE_INTERVAL:
+                self.last_probe = now
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+
+breaker = CircuitBreaker()
+
+
+class BreakerListener(monitoring.CommandListener):
+    """Feeds every command's outcome and latency into the breaker."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        breaker.record(event.duration_micros / 1_000_000 < BREAKER_SLOW_SECONDS)
+
+    def failed(self, event):
+        code = event.failure.get("code") if isinstance(event.failure, dict) else None
+        breaker.record(code is not None and code not in UNHEALTHY_CODES)
+
+
+def record_exception(exc: BaseException):
+    """
+    Server selection timeouts never start a command, so the listener
+    never sees them; callers that catch driver errors report them here.
+    Anything else already reached BreakerListener.failed.
+    """
+    if isinstance(exc, ServerSelectionTimeoutError):
+        breaker.record(False)
+
+
+# ======================
+# STALE READS
+# ======================
+# Last-known-good responses of a few hot reads, per key (usually per
+# viewer and query). Served, marked stale, while the breaker is open or
+# the live read fails; 503 only when nothing was ever cached.
+
+stale_cache = LRUCache("stale_reads", maxsize=STALE_CACHE_SIZE, ttl=STALE_TTL_SECONDS)
+
+stale_served = registry.counter(
+    "wire_stale_responses_total",
+    "Responses served from the last-known-good cache",
+    ("route",),
+)
+
+
+async def stale_read(route: str, key: Hashable, fetch: Callable[[], Awaitable]) -> Tuple[object, bool]:
+    """Returns (value, stale)."""
+    cache_key = (route, key)
+    if breaker.allow():
+        try:
+            value = await fetch()
+        except (ConnectionFailure, ExecutionTimeout) as e:
+            record_exception(e)
+        else:
+            stale_cache.set(cache_key, value)
+            return value, False
+
+    value = stale_cache.get(cache_key)
+    if value is None:
+        raise HTTPException(503, "Database unavailable, retry shortly", headers={"Retry-After": "1"})
+    stale_served.inc(route)
+    return value, True
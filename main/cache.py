@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from main.metrics import registry
+
+# ======================
+# IN-PROCESS LRU
+# ======================
+# Small per-worker caches for hot reads. Event-loop only (no locking).
+# Each worker invalidates its own copy on writes it serves; entries also
+# expire after `ttl` seconds, which bounds staleness from other workers.
+
+cache_requests = registry.counter(
+    "wire_cache_requests_total",
+    "In-process cache lookups",
+    ("cache", "result"),
+)
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        registry.gauge_callback(
+            f"wire_cache_{name}_entries",
+            f"Entries in the {name} cache",
+            lambda: len(self._data),
+        )
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or entry[0] < time.monotonic():
+            if entry is not _MISSING:
+                del self._data[key]
+            cache_requests.inc(self.name, "miss")
+            return default
+        self._data.move_to_end(key)
+        cache_requests.inc(self.name, "hit")
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
@@ -1,12 +1,21 @@
-from dotenv import load_dotenv
-load_dotenv()
-
+import asyncio
+import hashlib
 import os
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel
+
+from main.metrics import MongoCommandListener, pool_listener
+from main.breaker import BreakerListener
 
 # ======================
 # MONGO CONNECTION
 # ======================
+# Environment is loaded by the entry point (main.app / CLI modules). The
+# client is created with connect=False, so importing this module does no
+# network I/O; the pool opens on the first command.
 
 MONGO_URL = os.getenv("MONGO_URL")
 if not MONGO_URL:
@@ -14,13 +23,43 @@ if not MONGO_URL:
 
 DB_NAME = os.getenv("DB_NAME", "wire")
 
+
+def client_options() -> dict:
+    """Pool, timeout and compression settings, all overridable via env."""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0")) or None,
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0")) or None,
+    }
+    compressors = os.getenv("MONGO_COMPRESSORS", "")  # e.g. "zstd,snappy,zlib"
+    if compressors:
+        options["compressors"] = compressors
+    return {k: v for k, v in options.items() if v is not None}
+
+
 client = AsyncIOMotorClient(
     MONGO_URL,
-    serverSelectionTimeoutMS=5000
+    connect=False,
+    event_listeners=[MongoCommandListener(), pool_listener, BreakerListener()],
+    **client_options(),
 )
 
 db = client[DB_NAME]
 
+# Usernames and emails are unique case-insensitively. A query only uses a
+# collated index when it passes the same collation, so lookups against
+# these indexes must send CASE_INSENSITIVE too.
+CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
+# Deleted posts and accounts keep their document, tombstoned with
+# deleted_at, until main.deletion has removed what hangs off them. Every
+# read of posts and users filters with LIVE.
+LIVE = {"deleted_at": {"$exists": False}}
+TOMBSTONED = {"deleted_at": {"$exists": True}}
+
 # ======================
 # COLLECTIONS
 # ======================
@@ -36,85 +75,220 @@ posts_collection = db["posts"]
 post_likes_collection = db["post_likes"]
 post_comments_collection = db["post_comments"]
 post_shares_collection = db["post_shares"]
+# HyperLogLog registers of unique viewers per post, see main.views.
+post_views_collection = db["post_views"]
 
 # ---------- NOTIFICATIONS ----------
 notifications_collection = db["notifications"]
 
+# ---------- COLD TIER ----------
+# Old posts and their interactions, moved by main.tiering.
+posts_archive_collection = db["posts_archive"]
+post_likes_archive_collection = db["post_likes_archive"]
+post_comments_archive_collection = db["post_comments_archive"]
+
+# ---------- INTERNAL ----------
+schema_meta_collection = db["schema_meta"]
+# Side effects committed with their primary write, drained by main.outbox.
+outbox_collection = db["outbox"]
+# Login sessions (refresh token state) and revoked token ids, see main.sessions.
+sessions_collection = db["sessions"]
+revocations_collection = db["revocations"]
+# Follow graph changes fanned out to every worker, see main.graph_sync.
+graph_events_collection = db["graph_events"]
+# Outbox event ids already applied to post counters, see feed.apply_post_counts.
+counter_events_collection = db["counter_events"]
+
 # ======================
 # INDEXES
 # ======================
 
-async def init_indexes():
-    """
-    Ensure all MongoDB indexes.
-    Safe to call multiple times.
-    """
-
+INDEXES = [
     # ---------- USERS ----------
-    await users_collection.create_index(
-        "email",
-        unique=True,
-        collation={"locale": "en", "strength": 2}
-    )
-    await users_collection.create_index(
-        "username",
-        unique=True,
-        collation={"locale": "en", "strength": 2}
-    )
+    (users_collection, [
+        IndexModel("email", unique=True, collation=CASE_INSENSITIVE),
+        IndexModel("username", unique=True, collation=CASE_INSENSITIVE),
+        # Availability filter sync picks up new signups (main.availability)
+        IndexModel([("created_at", 1)]),
+        # Pending account deletions, oldest first (main.deletion)
+        IndexModel("deleted_at", partialFilterExpression={"deleted_at": {"$exists": True}}),
+    ]),
 
     # ---------- PROFILES ----------
-    await profiles_collection.create_index(
-        "username",
-        unique=True,
-        collation={"locale": "en", "strength": 2}
-    )
+    (profiles_collection, [
+        IndexModel("username", unique=True, collation=CASE_INSENSITIVE),
+        # Explore search: anchored prefix regex over the stored lowercase
+        # usernames. Regex can't use a collated index, so this one is simple.
+        IndexModel("username", name="username_prefix"),
+    ]),
 
     # ---------- RELATIONSHIPS ----------
-    await relationships_collection.create_index(
-        [("from_username", 1), ("to_username", 1)],
-        unique=True,
-        collation={"locale": "en", "strength": 2}
-    )
-    await relationships_collection.create_index(
-        [("to_username", 1), ("status", 1)]
-    )
-    await relationships_collection.create_index(
-        [("from_username", 1), ("status", 1)]
-    )
+    (relationships_collection, [
+        IndexModel(
+            [("from_username", 1), ("to_username", 1)],
+            unique=True,
+            collation=CASE_INSENSITIVE,
+        ),
+        IndexModel([("to_username", 1), ("status", 1)]),
+        IndexModel([("from_username", 1), ("status", 1)]),
+    ]),
 
     # ---------- POSTS ----------
-    # Feed sorting & polling
-    await posts_collection.create_index(
-        [("created_at", -1)]
-    )
-    await posts_collection.create_index(
-        [("author", 1), ("created_at", -1)]
-    )
+    # Feed sorting & polling (keyset on created_at, _id)
+    (posts_collection, [
+        IndexModel([("created_at", -1), ("_id", -1)]),
+        # /posts/by/{username} keyset paging
+        IndexModel([("author", 1), ("created_at", -1), ("_id", -1)]),
+        # sort=top keyset paging
+        IndexModel([("score", -1), ("_id", -1)]),
+        # /posts/search (one text index per collection)
+        IndexModel(
+            [("content", "text")],
+            name="content_text",
+            default_language=os.getenv("SEARCH_LANGUAGE", "english"),
+        ),
+        # /posts/tags/{tag} keyset paging
+        IndexModel([("hashtags", 1), ("created_at", -1), ("_id", -1)]),
+        # Pending post deletions, oldest first (main.deletion)
+        IndexModel("deleted_at", partialFilterExpression={"deleted_at": {"$exists": True}}),
+    ]),
 
     # ---------- POST LIKES ----------
     # Prevent duplicate likes
-    await post_likes_collection.create_index(
-        [("post_id", 1), ("username", 1)],
-        unique=True
-    )
-    await post_likes_collection.create_index(
-        [("post_id", 1)]
-    )
+    (post_likes_collection, [
+        IndexModel([("post_id", 1), ("username", 1)], unique=True),
+        IndexModel([("post_id", 1)]),
+        # Per-user export
+        IndexModel([("username", 1)]),
+    ]),
 
     # ---------- POST COMMENTS ----------
-    await post_comments_collection.create_index(
-        [("post_id", 1), ("created_at", 1)]
-    )
+    (post_comments_collection, [
+        IndexModel([("post_id", 1), ("created_at", 1)]),
+        # Per-user export
+        IndexModel([("author", 1)]),
+    ]),
 
     # ---------- POST SHARES ----------
-    await post_shares_collection.create_index(
-        [("post_id", 1)]
-    )
+    (post_shares_collection, [
+        IndexModel([("post_id", 1)]),
+    ]),
+
+    # ---------- COLD TIER ----------
+    (posts_archive_collection, [
+        IndexModel([("created_at", -1), ("_id", -1)]),
+        IndexModel([("author", 1), ("created_at", -1), ("_id", -1)]),
+        # Pending post deletions, oldest first (main.deletion)
+        IndexModel("deleted_at", partialFilterExpression={"deleted_at": {"$exists": True}}),
+    ]),
+    (post_likes_archive_collection, [
+        IndexModel([("post_id", 1), ("username", 1)], unique=True),
+        IndexModel([("username", 1)]),
+    ]),
+    (post_comments_archive_collection, [
+        IndexModel([("post_id", 1), ("created_at", 1)]),
+        IndexModel([("author", 1)]),
+    ]),
 
     # ---------- NOTIFICATIONS ----------
-    await notifications_collection.create_index(
-        [("to_username", 1), ("created_at", -1)]
+    # TTL on seen_at is managed by main.tiering (its expiry is configurable)
+    (notifications_collection, [
+        IndexModel([("to_username", 1), ("created_at", -1)]),
+        IndexModel([("to_username", 1), ("seen", 1)]),
+        # Deletion cascade: by post and by the deleted sender
+        IndexModel([("post_id", 1)], sparse=True),
+        IndexModel([("from_username", 1)]),
+    ]),
+
+    # ---------- SESSIONS ----------
+    (sessions_collection, [
+        IndexModel([("username", 1)]),
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ]),
+    # Workers sync the denylist by created_at; Mongo drops entries once no
+    # token they cover can still be valid.
+    (revocations_collection, [
+        IndexModel([("created_at", 1)]),
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ]),
+
+    # Workers replay graph changes by created_at; older ones are covered
+    # by each worker's periodic full reload.
+    (graph_events_collection, [
+        IndexModel([("created_at", 1)]),
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ]),
+
+    # ---------- OUTBOX ----------
+    # Claim order; dead events have due_at null and drop out of range scans.
+    (outbox_collection, [
+        IndexModel([("due_at", 1)]),
+    ]),
+    # Applied counter events, kept until no redelivery can still arrive.
+    (counter_events_collection, [
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ]),
+]
+
+
+def index_schema_version() -> str:
+    """Fingerprint of INDEXES; changes whenever an index spec changes."""
+    spec = sorted(
+        (collection.name, sorted(repr(sorted(m.document.items())) for m in models))
+        for collection, models in INDEXES
+    )
+    return hashlib.sha1(repr(spec).encode()).hexdigest()[:12]
+
+
+async def init_indexes() -> bool:
+    """
+    Ensure all MongoDB indexes.
+    Safe to call multiple times; returns False when the stored schema
+    marker already matches and nothing had to be built.
+    """
+    version = index_schema_version()
+
+    marker = await schema_meta_collection.find_one({"_id": "indexes"})
+    if marker and marker.get("version") == version:
+        return False
+
+    # One createIndexes command per collection, all collections at once.
+    await asyncio.gather(*(
+        collection.create_indexes(models)
+        for collection, models in INDEXES
+    ))
+
+    await schema_meta_collection.update_one(
+        {"_id": "indexes"},
+        {"$set": {"version": version, "updated_at": datetime.utcnow()}},
+        upsert=True,
     )
-    await notifications_collection.create_index(
-        [("to_username", 1), ("seen", 1)]
-    )
\ No newline at end of file
+    return True
+
+
+# ======================
+# TRANSACTIONS
+# ======================
+
+_transactions: Optional[bool] = None
+
+
+async def supports_transactions() -> bool:
+    """Replica sets and sharded clusters only; a standalone mongod has none."""
+    global _transactions
+    if _transactions is None:
+        hello = await client.admin.command("hello")
+        _transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+    return _transactions
+
+
+async def run_in_transaction(fn: Callable[..., Awaitable]):
+    """
+    Run fn(session) in one transaction, retried on transient errors, so
+    fn must be safe to re-run. On a standalone server fn(None) runs the
+    same writes without one.
+    """
+    if not await supports_transactions():
+        return await fn(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(fn)
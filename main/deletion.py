@@ -0,0 +1,289 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from main.database import (
+    users_collection,
+    profiles_collection,
+    relationships_collection,
+    posts_collection,
+    post_likes_collection,
+    post_comments_collection,
+    post_shares_collection,
+    post_views_collection,
+    notifications_collection,
+    posts_archive_collection,
+    post_likes_archive_collection,
+    post_comments_archive_collection,
+    sessions_collection,
+    run_in_transaction,
+    CASE_INSENSITIVE,
+    LIVE,
+    TOMBSTONED,
+)
+from main.graph_sync import graph_sync
+from main.log import get_logger
+from main.metrics import registry
+from main.ranking import inc_counter
+from main.sessions import revoke_user_sessions
+
+logger = get_logger("deletion")
+
+# ======================
+# CONFIG
+# ======================
+
+CASCADE_INTERVAL_SECONDS = float(os.getenv("CASCADE_INTERVAL_SECONDS", "60"))
+CASCADE_BATCH_SIZE = int(os.getenv("CASCADE_BATCH_SIZE", "500"))
+# Fraction of wall time the cascade may spend in Mongo; it sleeps the rest.
+CASCADE_DUTY_CYCLE = min(max(float(os.getenv("CASCADE_DUTY_CYCLE", "0.1")), 0.01), 1.0)
+
+# ======================
+# TOMBSTONES
+# ======================
+# Deleting a post or an account only sets `deleted_at` on it, which hides
+# it from every read at once; the cascade job below then removes what
+# hangs off it, batch by batch.
+
+deleted_total = registry.counter(
+    "wire_cascade_deleted_total",
+    "Documents removed by the deletion cascade",
+    ("collection",),
+)
+
+
+async def tombstone_post(oid: ObjectId, author: str, posts=posts_collection) -> bool:
+    """
+    False when the post is not live or not `author`'s. `posts` is
+    posts_archive_collection for an archived post; its children are in
+    the archive collections and the cascade removes them from there.
+    """
+    result = await posts.update_one(
+        {"_id": oid, "author": author, **LIVE},
+        {"$set": {"deleted_at": datetime.utcnow()}},
+    )
+    return result.modified_count == 1
+
+
+async def tombstone_account(username: str) -> bool:
+    now = datetime.utcnow()
+
+    async def write(session):
+        result = await users_collection.update_one(
+            {"username": username, **LIVE},
+            {"$set": {"deleted_at": now}},
+            collation=CASE_INSENSITIVE,
+            session=session,
+        )
+        if result.modified_count:
+            await graph_sync.record("remove_user", username, session=session)
+        return result.modified_count
+
+    if not await run_in_transaction(write):
+        return False
+
+    # Logged out everywhere first, so nothing new gets written as them.
+    await revoke_user_sessions(username)
+    # Gone from explore, follow and profile lookups.
+    await profiles_collection.delete_one({"username": username}, collation=CASE_INSENSITIVE)
+    # One indexed update over the author's own posts; what hangs off them
+    # (the fan-out) is left to the cascade.
+    await posts_collection.update_many(
+        {"author": username, **LIVE},
+        {"$set": {"deleted_at": now}},
+    )
+    graph_sync.apply("remove_user", username)
+
+    logger.info("account_tombstoned", extra={"fields": {"username": username}})
+    return True
+
+
+# ======================
+# BATCHES
+# ======================
+# Each step removes at most CASCADE_BATCH_SIZE documents through an index
+# and returns how many; 0 means that step is finished.
+
+async def _delete_batch(collection, query: dict) -> int:
+    ids = [
+        d["_id"] async for d in
+        collection.find(query, {"_id": 1}).limit(CASCADE_BATCH_SIZE)
+    ]
+    if ids:
+        await collection.delete_many({"_id": {"$in": ids}})
+        deleted_total.inc(collection.name, amount=len(ids))
+    return len(ids)
+
+
+async def _delete_counted_batch(collection, query: dict, posts, field: str, cleanup: List[dict] = ()) -> int:
+    """
+    Likes or comments by a deleted account, taken off their posts'
+    counters; `cleanup` is extra pipeline for the same post update.
+    """
+    docs = await (
+        collection.find(query, {"post_id": 1})
+        .limit(CASCADE_BATCH_SIZE)
+        .to_list(CASCADE_BATCH_SIZE)
+    )
+    if not docs:
+        return 0
+
+    await collection.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+    deleted_total.inc(collection.name, amount=len(docs))
+
+    # A crash between the two writes leaves counters high; the reconciler
+    # recounts them.
+    per_post = Counter(d["post_id"] for d in docs)
+    await posts.bulk_write([
+        UpdateOne({"_id": post_id, field: {"$gte": n}}, inc_counter(field, -n) + list(cleanup))
+        for post_id, n in per_post.items()
+    ], ordered=False)
+    return len(docs)
+
+
+async def _tombstone_live_posts(username: str) -> int:
+    # Posts that raced the account tombstone.
+    ids = [
+        d["_id"] async for d in
+        posts_collection.find({"author": username, **LIVE}, {"_id": 1}).limit(CASCADE_BATCH_SIZE)
+    ]
+    if ids:
+        await posts_collection.update_many(
+            {"_id": {"$in": ids}},
+            {"$set": {"deleted_at": datetime.utcnow()}},
+        )
+    return len(ids)
+
+
+async def _delete_archived_posts(username: str) -> int:
+    # The archive is read-only, so archived posts skip the tombstone and
+    # go in place: children first, then the posts themselves.
+    ids = [
+        d["_id"] async for d in
+        posts_archive_collection
+        .find({"author": username}, {"_id": 1})
+        .sort("created_at", -1)
+        .limit(CASCADE_BATCH_SIZE)
+    ]
+    if not ids:
+        return 0
+    for collection, query in (
+        (post_likes_archive_collection, {"post_id": {"$in": ids}}),
+        (post_comments_archive_collection, {"post_id": {"$in": ids}}),
+        (notifications_collection, {"post_id": {"$in": [str(i) for i in ids]}}),
+        (post_views_collection, {"_id": {"$in": ids}}),
+    ):
+        n = await _delete_batch(collection, query)
+        if n:
+            return n
+    return await _delete_batch(posts_archive_collection, {"_id": {"$in": ids}})
+
+
+def _drop_previews_by(username: str) -> List[dict]:
+    return [{"$set": {"recent_comments": {"$filter": {
+        "input": {"$ifNull": ["$recent_comments", []]},
+        "cond": {"$ne": ["$$this.author", username]},
+    }}}}]
+
+
+Stage = Callable[[dict], Awaitable[int]]
+
+POST_STAGES: List[Stage] = [
+    lambda p: _delete_batch(post_likes_collection, {"post_id": p["_id"]}),
+    lambda p: _delete_batch(post_comments_collection, {"post_id": p["_id"]}),
+    lambda p: _delete_batch(post_shares_collection, {"post_id": p["_id"]}),
+    lambda p: _delete_batch(post_views_collection, {"_id": p["_id"]}),
+    lambda p: _delete_batch(notifications_collection, {"post_id": str(p["_id"])}),
+]
+
+ARCHIVED_POST_STAGES: List[Stage] = [
+    lambda p: _delete_batch(post_likes_archive_collection, {"post_id": p["_id"]}),
+    lambda p: _delete_batch(post_comments_archive_collection, {"post_id": p["_id"]}),
+    lambda p: _delete_batch(post_shares_collection, {"post_id": p["_id"]}),
+    lambda p: _delete_batch(post_views_collection, {"_id": p["_id"]}),
+    lambda p: _delete_batch(notifications_collection, {"post_id": str(p["_id"])}),
+]
+
+ACCOUNT_STAGES: List[Stage] = [
+    lambda u: _delete_batch(relationships_collection, {"from_username": u["username"]}),
+    lambda u: _delete_batch(relationships_collection, {"to_username": u["username"]}),
+    lambda u: _delete_counted_batch(
+        post_likes_collection, {"username": u["username"]}, posts_collection, "like_count"),
+    lambda u: _delete_counted_batch(
+        post_likes_archive_collection, {"username": u["username"]}, posts_archive_collection, "like_count"),
+    lambda u: _delete_counted_batch(
+        post_comments_collection, {"author": u["username"]}, posts_collection, "comment_count",
+        _drop_previews_by(u["username"])),
+    lambda u: _delete_counted_batch(
+        post_comments_archive_collection, {"author": u["username"]}, posts_archive_collection, "comment_count",
+        _drop_previews_by(u["username"])),
+    lambda u: _delete_batch(notifications_collection, {"to_username": u["username"]}),
+    lambda u: _delete_batch(notifications_collection, {"from_username": u["username"]}),
+    lambda u: _tombstone_live_posts(u["username"]),
+    lambda u: _delete_archived_posts(u["username"]),
+    lambda u: _delete_batch(sessions_collection, {"username": u["username"]}),
+]
+
+
+# ======================
+# JOB
+# ======================
+# The checkpoint is `cascade_stage` on the tombstone itself: a finished
+# stage is never rescanned, and a half-done one resumes where its deletes
+# stopped. The tombstone goes last, after its final stage.
+
+async def _advance(collection, doc: dict, stages: List[Stage]) -> int:
+    stage = doc.get("cascade_stage", 0)
+    if stage < len(stages):
+        n = await stages[stage](doc)
+        if n == 0:
+            await collection.update_one({"_id": doc["_id"]}, {"$set": {"cascade_stage": stage + 1}})
+        return n
+
+    await collection.delete_one({"_id": doc["_id"], **TOMBSTONED})
+    deleted_total.inc(collection.name)
+    logger.info(
+        "cascade_completed",
+        extra={"fields": {"collection": collection.name, "id": str(doc["_id"])}},
+    )
+    return 1
+
+
+async def cascade_step() -> Optional[int]:
+    """One batch of the oldest pending deletion; None when nothing is pending."""
+    # Accounts first: they tombstone posts, which then cascade in turn.
+    for collection, stages in (
+        (users_collection, ACCOUNT_STAGES),
+        (posts_collection, POST_STAGES),
+        (posts_archive_collection, ARCHIVED_POST_STAGES),
+    ):
+        doc = await collection.find_one(TOMBSTONED, sort=[("deleted_at", 1)])
+        if doc:
+            return await _advance(collection, doc, stages)
+    return None
+
+
+async def cascade_deletes():
+    """
+    Periodic job: work through pending deletions for at most one interval
+    (the job lease is two), sleeping between batches per the duty cycle.
+    """
+    deadline = time.monotonic() + CASCADE_INTERVAL_SECONDS
+    removed = 0
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        n = await cascade_step()
+        if n is None:
+            break
+        removed += n
+        busy = time.monotonic() - started
+        await asyncio.sleep(busy * (1 - CASCADE_DUTY_CYCLE) / CASCADE_DUTY_CYCLE)
+
+    if removed:
+        logger.info("cascade_progress", extra={"fields": {"removed": removed}})
@@ -1,19 +1,25 @@
 from fastapi import Request, HTTPException, status
 from main.security import decode_token
+from main.metrics import auth_failures
+from main.profiling import section
+from main.sessions import denylist
 
 
 def get_current_user(request: Request):
     token = request.cookies.get("access_token")
 
     if not token:
+        auth_failures.inc("missing_token")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication required"
         )
 
     try:
-        payload = decode_token(token)
+        with section("auth"):
+            payload = decode_token(token)
     except Exception:
+        auth_failures.inc("invalid_token")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired session"
@@ -21,9 +27,18 @@ def get_current_user(request: Request):
 
     # Safety check (important)
     if "username" not in payload:
+        auth_failures.inc("bad_payload")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload"
         )
 
+    # Logged out (this token or its whole session) before it expired
+    if denylist.is_revoked(payload):
+        auth_failures.inc("revoked")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired session"
+        )
+
     return payload
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+Streaming NDJSON export and bulk import of a user's data.
+
+HTTP (the signed-in user's own data):
+
+    GET /export/me                 every kind, one document per line
+    GET /export/me/{kind}          a single kind
+
+CLI:
+
+    python -m main.export export <username> > alice.ndjson
+    python -m main.export import alice.ndjson
+
+Each line is {"kind": ..., "doc": ...} in MongoDB Extended JSON, so ids
+and dates survive the round trip. Both directions stream: the export reads
+Motor cursors batch by batch and the import reads the file line by line,
+so memory use does not depend on the size of the account.
+"""
+import asyncio
+import json
+import os
+import sys
+from typing import AsyncIterator, Iterable
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from bson import json_util  # noqa: E402
+from fastapi import APIRouter, Depends, HTTPException  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+from pymongo.errors import BulkWriteError  # noqa: E402
+
+from main.deps import get_current_user  # noqa: E402
+from main.database import (  # noqa: E402
+    profiles_collection,
+    relationships_collection,
+    posts_collection,
+    post_likes_collection,
+    post_comments_collection,
+    notifications_collection,
+    posts_archive_collection,
+    post_likes_archive_collection,
+    post_comments_archive_collection,
+    CASE_INSENSITIVE,
+    LIVE,
+)
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+
+# ======================
+# WHAT BELONGS TO A USER
+# ======================
+
+def owned(username: str):
+    """
+    kind -> [(collection, filter, find kwargs)...]. The first collection
+    of each kind is where imports go; archived documents are imported
+    into the hot tier and re-archived by the mover.
+    """
+    return {
+        "profile": [
+            (profiles_collection, {"username": username}, {"collation": CASE_INSENSITIVE}),
+        ],
+        "post": [
+            (posts_collection, {"author": username, **LIVE}, {}),
+            (posts_archive_collection, {"author": username, **LIVE}, {}),
+        ],
+        "comment": [
+            (post_comments_collection, {"author": username}, {}),
+            (post_comments_archive_collection, {"author": username}, {}),
+        ],
+        "like": [
+            (post_likes_collection, {"username": username}, {}),
+            (post_likes_archive_collection, {"username": username}, {}),
+        ],
+        "relationship": [
+            (relationships_collection, {"from_username": username}, {}),
+            (relationships_collection, {"to_username": username}, {}),
+        ],
+        "notification": [
+            (notifications_collection, {"to_username": username}, {}),
+        ],
+    }
+
+
+KINDS = tuple(owned("").keys())
+COLLECTIONS = {kind: sources[0][0] for kind, sources in owned("").items()}
+
+
+# ======================
+# EXPORT
+# ======================
+
+async def export_lines(username: str, kinds: Iterable[str] = KINDS) -> AsyncIterator[str]:
+    sources = owned(username)
+    for kind in kinds:
+        for collection, query, kwargs in sources[kind]:
+            cursor = collection.find(query, **kwargs).batch_size(EXPORT_BATCH_SIZE)
+            async for doc in cursor:
+                yield json_util.dumps({"kind": kind, "doc": doc}, json_options=JSON_OPTIONS) + "\n"
+
+
+def ndjson_response(lines: AsyncIterator[str], filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/me")
+async def export_me(user=Depends(get_current_user)):
+    username = user["username"]
+    return ndjson_response(export_lines(username), f"{username}.ndjson")
+
+
+@router.get("/me/{kind}")
+async def export_me_kind(kind: str, user=Depends(get_current_user)):
+    if kind not in KINDS:
+        raise HTTPException(404, "Unknown export kind")
+    username = user["username"]
+    return ndjson_response(export_lines(username, [kind]), f"{username}-{kind}.ndjson")
+
+
+# ======================
+# IMPORT
+# ======================
+
+async def _flush(kind: str, batch: list, totals: dict):
+    try:
+        res = await COLLECTIONS[kind].insert_many(batch, ordered=False)
+        totals["inserted"] += len(res.inserted_ids)
+    except BulkWriteError as e:
+        # Unordered: everything that could be written was; duplicates
+        # (re-imports) are counted and skipped.
+        totals["inserted"] += e.details.get("nInserted", 0)
+        totals["skipped"] += len(e.details.get("writeErrors", []))
+
+
+async def import_lines(lines: Iterable[str]) -> dict:
+    """Unordered insert_many per kind, IMPORT_BATCH_SIZE documents at a time."""
+    totals = {"inserted": 0, "skipped": 0}
+    batches = {kind: [] for kind in KINDS}
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        record = json_util.loads(line, json_options=JSON_OPTIONS)
+        kind = record.get("kind")
+        if kind not in batches:
+            raise ValueError(f"Unknown kind: {kind!r}")
+        batch = batches[kind]
+        batch.append(record["doc"])
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await _flush(kind, batch, totals)
+            batch.clear()
+
+    for kind, batch in batches.items():
+        if batch:
+            await _flush(kind, batch, totals)
+
+    return totals
+
+
+# ======================
+# CLI
+# ======================
+
+async def _cli(argv) -> int:
+    if len(argv) == 2 and argv[0] == "export":
+        async for line in export_lines(argv[1].strip().lower()):
+            sys.stdout.write(line)
+        return 0
+
+    if len(argv) == 2 and argv[0] == "import":
+        with open(argv[1]) as fh:
+            totals = await import_lines(fh)
+        print(json.dumps(totals))
+        return 0
+
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_cli(sys.argv[1:])))
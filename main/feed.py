@@ -1,19 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from datetime import datetime
-from typing import Optional
+import os
+from collections import Counter, defaultdict
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional, Tuple
 from bson import ObjectId
 from pydantic import BaseModel, Field
+from pymongo import ReturnDocument, UpdateOne
 from main.ws_manager import manager
+from main.log import get_logger
+from main.ranking import post_score, inc_counter, encode_cursor, epoch_ms
+from main.search import (
+    extract_hashtags,
+    keyset_after,
+    parse_cursor,
+    parse_time_cursor,
+    serialize,
+    comment_previews,
+    collect_visible,
+    time_cursor,
+    NEXT_CURSOR_HEADER,
+)
+from main.cache import LRUCache
+from main.breaker import stale_read, STALE_HEADER
 
 from main.deps import get_current_user
+from main.follow_graph import graph
+from main.ratelimit import rate_limit
 from main.database import (
     posts_collection,
     post_likes_collection,
     post_comments_collection,
-    notifications_collection,
+    post_likes_archive_collection,
+    post_comments_archive_collection,
+    posts_archive_collection,
+    counter_events_collection,
+    run_in_transaction,
+    LIVE,
 )
+from main import outbox
+from main.deletion import tombstone_post
+from main.views import views
+from main.wire import COLUMNAR_MEDIA_TYPE, accepts_columnar, dumps, encode_posts
+from main.tiering import archive_fill, archive_cutoff, is_archived_id, raise_missing_post
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
+logger = get_logger("feed")
+
+# Counter writes return the new values so they can be pushed to the feed.
+COUNTS_PROJECTION = {"author": 1, "like_count": 1, "comment_count": 1, "share_count": 1}
+
+# Author timelines: pages of raw posts keyed by (author, cursor). Always
+# fetched at AUTHOR_PAGE_MAX and sliced, so every `limit` shares an entry.
+AUTHOR_PAGE_MAX = 50
+AUTHOR_ORDER = [("created_at", -1), ("_id", -1)]
+author_pages = LRUCache(
+    "author_pages",
+    maxsize=int(os.getenv("AUTHOR_CACHE_SIZE", "2000")),
+    ttl=float(os.getenv("AUTHOR_CACHE_TTL_SECONDS", "30")),
+)
+
+# Newest comments kept on the post itself (bucket pattern), so feed items
+# carry previews with no extra query; full history pages from
+# post_comments. Appended with the counters (see apply_post_counts).
+COMMENT_PREVIEW_COUNT = int(os.getenv("COMMENT_PREVIEW_COUNT", "3"))
+COMMENT_PREVIEW_CHARS = int(os.getenv("COMMENT_PREVIEW_CHARS", "200"))
+
+
+def push_recent_comments(previews: List[dict]) -> dict:
+    """Pipeline stage: append `previews`, keep the last COMMENT_PREVIEW_COUNT."""
+    return {"$set": {"recent_comments": {"$slice": [
+        # $literal: comment text starting with "$" is not a field path.
+        {"$concatArrays": [{"$ifNull": ["$recent_comments", []]}, [{"$literal": p} for p in previews]]},
+        -COMMENT_PREVIEW_COUNT,
+    ]}}}
 
 
 # ======================
@@ -37,35 +97,125 @@ class CommentCreate(BaseModel):
 # GET FEED
 # ======================
 
+FEED_ORDERS = {
+    "new": [("created_at", -1), ("_id", -1)],
+    "top": [("score", -1), ("_id", -1)],
+}
+FEED_KEYS = {"new": "created_at", "top": "score"}
+
+
 @router.get("")
 async def get_posts(
-    skip: int = Query(0, ge=0),
+    response: Response,
     limit: int = Query(10, ge=1, le=50),
     after: Optional[datetime] = None,
+    sort: Literal["new", "top"] = "new",
+    cursor: Optional[str] = None,
+    accept: Optional[str] = Header(None),
     user=Depends(get_current_user),
 ):
-    query = {}
+    """
+    JSON by default; the compact columnar layout on request (main.wire).
+    Keyset paged: pass the X-Wire-Next-Cursor response header back as
+    `cursor`; it is absent on the last page.
+    """
+    viewer = user["username"]
+    (posts, next_cursor), stale = await stale_read(
+        "feed",
+        (viewer, limit, after, sort, cursor),
+        lambda: load_feed(viewer, limit, after, sort, cursor),
+    )
+    views.record(viewer, posts)
+
+    headers = {"Vary": "Accept"}
+    if stale:
+        headers[STALE_HEADER] = "true"
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if accepts_columnar(accept):
+        return Response(dumps(encode_posts(posts)), media_type=COLUMNAR_MEDIA_TYPE, headers=headers)
+    response.headers.update(headers)
+    return posts
+
+
+def feed_query(sort: str, after: Optional[datetime] = None, position: Optional[tuple] = None) -> dict:
+    """Filter for a feed page; `position` is the (key, _id) of the last post already paged."""
+    query = dict(LIVE)
     if after:
         query["created_at"] = {"$gt": after}
+    if position:
+        query.update(keyset_after(FEED_KEYS[sort], *position))
+    return query
+
+
+def feed_position(sort: str, cursor: Optional[str]) -> Optional[tuple]:
+    if sort == "top":
+        return parse_cursor(cursor)
+    return parse_time_cursor(cursor)
+
+
+def feed_cursor(sort: str, post: dict) -> str:
+    if sort == "top":
+        return encode_cursor(post["score"], str(post["_id"]))
+    return encode_cursor(epoch_ms(post["created_at"]), str(post["_id"]))
+
 
+async def fetch_feed_page(query: dict, order, limit: int, archived: bool) -> list:
+    """(post, likes collection) pairs; `archived` continues into the archive."""
     cursor = (
         posts_collection
         .find(query)
-        .sort("created_at", -1)
-        .skip(skip)
+        .sort(order)
         .limit(limit)
     )
+    docs = [(p, post_likes_collection) async for p in cursor]
+
+    # Older pages of the chronological feed continue into the archive. A
+    # post caught mid-move sits in both tiers; keep the hot copy.
+    if archived:
+        seen = {p["_id"] for p, _ in docs}
+        older = await archive_fill(query, order, limit - len(docs))
+        docs.extend((p, post_likes_archive_collection) for p in older if p["_id"] not in seen)
+    return docs
+
+
+async def load_feed(
+    viewer: str,
+    limit: int,
+    after: Optional[datetime],
+    sort: str,
+    cursor: Optional[str],
+) -> Tuple[list, Optional[str]]:
+    """One page of feed items and the cursor of the next, or None at the end."""
+    position = feed_position(sort, cursor)
+
+    if not graph.loaded:
+        # Visibility fails closed; an all-hidden page would end scrolling.
+        raise HTTPException(503, "Feed is starting up")
+
+    # Private authors are only visible to their accepted followers: scan
+    # in page order, skipping hidden posts, and continue the next page
+    # from the last post scanned.
+    order = FEED_ORDERS[sort]
+    archived = sort == "new" and not after
+
+    async def fetch(last, n):
+        at = (last[0][FEED_KEYS[sort]], last[0]["_id"]) if last else position
+        return await fetch_feed_page(feed_query(sort, after, at), order, n, archived)
+
+    docs, last = await collect_visible(viewer, limit, fetch, author=lambda r: r[0]["author"])
+    next_cursor = feed_cursor(sort, last[0]) if last else None
 
     posts = []
-    async for p in cursor:
+    for p, likes_collection in docs:
         oid = p["_id"]
 
-        liked = await post_likes_collection.find_one({
+        liked = await likes_collection.find_one({
             "post_id": oid,
-            "username": user["username"]
+            "username": viewer
         })
 
-        posts.append({
+        item = {
             "id": str(oid),
             "author": p["author"],
             "content": p["content"],
@@ -73,17 +223,95 @@ async def get_posts(
             "like_count": p.get("like_count", 0),
             "comment_count": p.get("comment_count", 0),
             "share_count": p.get("share_count", 0),
+            "view_count": p.get("view_count", 0),
+            "recent_comments": comment_previews(p),
             "liked": bool(liked),
-        })
+        }
+        if sort == "top" and "score" in p:
+            item["cursor"] = encode_cursor(p["score"], item["id"])
+        posts.append(item)
+
+    return posts, next_cursor
+
+
+# ======================
+# AUTHOR TIMELINE
+# ======================
+
+def author_query(author: str, after: Optional[Tuple[datetime, ObjectId]]) -> dict:
+    """`author`'s posts after the (created_at, _id) keyset `after`."""
+    query = {"author": author, **LIVE}
+    if after is not None:
+        query.update(keyset_after("created_at", *after))
+    return query
 
+
+async def load_author_page(author: str, after: Optional[Tuple[datetime, ObjectId]]) -> list:
+    """
+    Newest-first posts by `author` after the (created_at, _id) keyset
+    `after`, served from the (author, created_at, _id) index and continued
+    into the archive when the hot tier runs out.
+    """
+    query = author_query(author, after)
+
+    posts = await (
+        posts_collection
+        .find(query)
+        .sort(AUTHOR_ORDER)
+        .limit(AUTHOR_PAGE_MAX)
+        .to_list(AUTHOR_PAGE_MAX)
+    )
+    if len(posts) < AUTHOR_PAGE_MAX and archive_cutoff() is not None:
+        need = AUTHOR_PAGE_MAX - len(posts)
+        posts += await (
+            posts_archive_collection
+            .find(query)
+            .sort(AUTHOR_ORDER)
+            .limit(need)
+            .to_list(need)
+        )
     return posts
 
 
+@router.get("/by/{username}")
+async def get_author_posts(
+    username: str,
+    limit: int = Query(10, ge=1, le=AUTHOR_PAGE_MAX),
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user),
+):
+    """
+    Keyset paged on created_at; pass the last item's `cursor` back. Only
+    the first page changes when the author posts, so create_post drops
+    just that entry; older pages expire with the TTL.
+    """
+    author = username.strip().lower()
+    viewer = user["username"]
+    if not graph.loaded:
+        # Unknown and private would both look like "can't see" until then.
+        raise HTTPException(503, "Feed is starting up")
+    await graph.resolve([author])
+    if author != viewer and not graph.knows(author):
+        raise HTTPException(404, "User not found")
+    if not graph.can_see(viewer, author):
+        raise HTTPException(403, "This account is private")
+
+    after = parse_time_cursor(cursor)
+
+    key = (author, after)
+    posts = author_pages.get(key)
+    if posts is None:
+        posts = await load_author_page(author, after)
+        author_pages.set(key, posts)
+
+    return await serialize(posts[:limit], viewer, time_cursor)
+
+
 # ======================
 # LIKE / UNLIKE POST
 # ======================
 
-@router.post("/{post_id}/like")
+@router.post("/{post_id}/like", dependencies=[Depends(rate_limit("like"))])
 async def toggle_like(
     post_id: str,
     user=Depends(get_current_user)
@@ -94,9 +322,9 @@ async def toggle_like(
     oid = ObjectId(post_id)
     username = user["username"]
 
-    post = await posts_collection.find_one({"_id": oid})
+    post = await posts_collection.find_one({"_id": oid, **LIVE})
     if not post:
-        raise HTTPException(404, "Post not found")
+        await raise_missing_post(oid)
 
     existing = await post_likes_collection.find_one({
         "post_id": oid,
@@ -105,38 +333,36 @@ async def toggle_like(
 
     # ---------- UNLIKE ----------
     if existing:
-        await post_likes_collection.delete_one({"_id": existing["_id"]})
-
-        await posts_collection.update_one(
-            {"_id": oid, "like_count": {"$gt": 0}},
-            {"$inc": {"like_count": -1}}
-        )
+        async def unlike(session):
+            await post_likes_collection.delete_one({"_id": existing["_id"]}, session=session)
+            await outbox.enqueue("post_counts", {"post_id": oid, "field": "like_count", "delta": -1}, session=session)
 
+        await run_in_transaction(unlike)
         return {"status": "unliked"}
 
     # ---------- LIKE ----------
-    await post_likes_collection.insert_one({
-        "post_id": oid,
-        "username": username,
-        "created_at": datetime.utcnow()
-    })
-
-    await posts_collection.update_one(
-        {"_id": oid},
-        {"$inc": {"like_count": 1}}
-    )
+    now = datetime.utcnow()
 
-    # ---------- NOTIFICATION ----------
-    if post["author"] != username:
-        await notifications_collection.insert_one({
-            "to_username": post["author"],
-            "from_username": username,
-            "type": "like",
-            "post_id": post_id,
-            "created_at": datetime.utcnow(),
-            "seen": False,
-        })
+    async def like(session):
+        await post_likes_collection.insert_one({
+            "post_id": oid,
+            "username": username,
+            "created_at": now
+        }, session=session)
+        await outbox.enqueue("post_counts", {"post_id": oid, "field": "like_count", "delta": 1}, session=session)
+
+        # ---------- NOTIFICATION ----------
+        if post["author"] != username:
+            await outbox.enqueue("notify", {
+                "to_username": post["author"],
+                "from_username": username,
+                "type": "like",
+                "post_id": post_id,
+                "created_at": now,
+                "seen": False,
+            }, session=session)
 
+    await run_in_transaction(like)
     return {"status": "liked"}
 
 
@@ -144,7 +370,7 @@ async def toggle_like(
 # ADD COMMENT
 # ======================
 
-@router.post("/{post_id}/comment")
+@router.post("/{post_id}/comment", dependencies=[Depends(rate_limit("comment"))])
 async def add_comment(
     post_id: str,
     payload: CommentCreate,
@@ -155,36 +381,112 @@ async def add_comment(
 
     oid = ObjectId(post_id)
 
-    post = await posts_collection.find_one({"_id": oid})
+    post = await posts_collection.find_one({"_id": oid, **LIVE})
     if not post:
-        raise HTTPException(404, "Post not found")
+        await raise_missing_post(oid)
 
-    res = await post_comments_collection.insert_one({
-        "post_id": oid,
+    now = datetime.utcnow()
+    comment_id = ObjectId()
+    text = payload.text.strip()
+    preview = {
+        "id": comment_id,
         "author": user["username"],
-        "text": payload.text.strip(),
-        "created_at": datetime.utcnow()
-    })
+        "text": text[:COMMENT_PREVIEW_CHARS],
+        "created_at": now,
+    }
 
-    if res.inserted_id:
-        await posts_collection.update_one(
-            {"_id": oid},
-            {"$inc": {"comment_count": 1}}
-        )
+    async def comment(session):
+        await post_comments_collection.insert_one({
+            "_id": comment_id,
+            "post_id": oid,
+            "author": user["username"],
+            "text": text,
+            "created_at": now
+        }, session=session)
+        await outbox.enqueue("post_counts", {
+            "post_id": oid,
+            "field": "comment_count",
+            "delta": 1,
+            "preview": preview,
+        }, session=session)
 
         if post["author"] != user["username"]:
-            await notifications_collection.insert_one({
+            await outbox.enqueue("notify", {
                 "to_username": post["author"],
                 "from_username": user["username"],
                 "type": "comment",
                 "post_id": post_id,
-                "created_at": datetime.utcnow(),
+                "created_at": now,
                 "seen": False,
-            })
+            }, session=session)
 
+    await run_in_transaction(comment)
     return {"status": "ok"}
 
 
+# ======================
+# COUNTERS (OUTBOX)
+# ======================
+# Likes and comments commit with a "post_counts" outbox event instead of
+# rewriting the post in the same transaction, so concurrent likes on a
+# popular post don't conflict on its document. The handler folds a batch
+# into one counter delta (and preview append) per post, so a burst on one
+# post costs one write. The ids of applied events are recorded in
+# counter_events in the same transaction, which makes redelivery a no-op.
+# Full recounts are left to main.reconcile.
+
+# Longer than any event can still be redelivered: the lease, then the
+# retry backoff up to OUTBOX_MAX_ATTEMPTS (dead events are never retried).
+COUNTER_EVENT_TTL = timedelta(days=1)
+
+
+@outbox.handler("post_counts")
+async def apply_post_counts(events: List[dict]):
+    applied = {
+        d["_id"] async for d in
+        counter_events_collection.find({"_id": {"$in": [e["_id"] for e in events]}}, {"_id": 1})
+    }
+    fresh = sorted((e for e in events if e["_id"] not in applied), key=lambda e: e["created_at"])
+
+    deltas = defaultdict(Counter)
+    previews = defaultdict(list)
+    for e in fresh:
+        payload = e["payload"]
+        if "field" not in payload:
+            continue  # queued before deltas; main.reconcile recounts the post
+        deltas[payload["post_id"]][payload["field"]] += payload["delta"]
+        if "preview" in payload:
+            previews[payload["post_id"]].append(payload["preview"])
+
+    ops = []
+    for oid, fields in deltas.items():
+        update = [stage for field, n in fields.items() if n for stage in inc_counter(field, n)]
+        if previews[oid]:
+            update.append(push_recent_comments(previews[oid]))
+        if update:
+            ops.append(UpdateOne({"_id": oid}, update))
+
+    if fresh:
+        expires_at = datetime.utcnow() + COUNTER_EVENT_TTL
+
+        async def apply(session):
+            # A duplicate id means another worker applied it: abort and
+            # retry. Without transactions a crash after this insert leaves
+            # the counters low until the reconciler recounts them.
+            await counter_events_collection.insert_many(
+                [{"_id": e["_id"], "expires_at": expires_at} for e in fresh],
+                session=session,
+            )
+            if ops:
+                await posts_collection.bulk_write(ops, ordered=False, session=session)
+
+        await run_in_transaction(apply)
+
+    ids = list({e["payload"]["post_id"] for e in events})
+    async for counts in posts_collection.find({"_id": {"$in": ids}, **LIVE}, COUNTS_PROJECTION):
+        manager.publish_counts(counts)
+
+
 # ======================
 # GET COMMENTS
 # ======================
@@ -201,16 +503,33 @@ async def get_comments(
 
     oid = ObjectId(post_id)
 
-    cursor = (
-        post_comments_collection
+    # Tombstoned posts are gone for readers even while the cascade still
+    # holds their comments.
+    if not await posts_collection.find_one({"_id": oid, **LIVE}, {"_id": 1}) and not (
+        is_archived_id(oid) and await posts_archive_collection.find_one({"_id": oid, **LIVE}, {"_id": 1})
+    ):
+        raise HTTPException(404, "Post not found")
+
+    # Posts past the hot window keep their comments in the archive; the
+    # hot collection still has them while the mover hasn't reached them.
+    # Pick the one source that holds the thread, so skip pages over it.
+    source = post_comments_collection
+    if is_archived_id(oid) and await post_comments_archive_collection.find_one(
+        {"post_id": oid}, {"_id": 1}
+    ):
+        source = post_comments_archive_collection
+
+    docs = await (
+        source
         .find({"post_id": oid})
         .sort("created_at", 1)
         .skip(skip)
         .limit(limit)
+        .to_list(limit)
     )
 
     comments = []
-    async for c in cursor:
+    for c in docs:
         comments.append({
             "id": str(c["_id"]),
             "author": c["author"],
@@ -221,7 +540,7 @@ async def get_comments(
     return comments
 
 
-@router.post("", status_code=201)
+@router.post("", status_code=201, dependencies=[Depends(rate_limit("create_post"))])
 async def create_post(
     data: PostCreate,
     user=Depends(get_current_user)
@@ -235,6 +554,8 @@ async def create_post(
         "like_count": 0,
         "comment_count": 0,
         "share_count": 0,
+        "score": post_score(0, 0, 0, now),
+        "hashtags": extract_hashtags(data.content),
     }
 
     res = await posts_collection.insert_one(post)
@@ -247,22 +568,62 @@ async def create_post(
         "like_count": 0,
         "comment_count": 0,
         "share_count": 0,
+        "view_count": 0,
+        "recent_comments": [],
         "liked": False,
     }
 
-    print("📢 broadcasting to", len(manager.active), "clients")
+    logger.info(
+        "publish_new_post",
+        extra={"fields": {"post_id": full_post["id"], "clients": len(manager.active)}},
+    )
 
-    await manager.broadcast({
-        "type": "new_post",
-        "post": full_post
-    })
+    manager.publish_post(full_post)
+    author_pages.pop((post["author"], None))
 
     return full_post
+# ======================
+# DELETE POST
+# ======================
+
+@router.delete("/{post_id}")
+async def delete_post(
+    post_id: str,
+    user=Depends(get_current_user)
+):
+    """
+    Tombstones the post, in whichever tier holds it, which hides it from
+    every read at once; its likes, comments and notifications are removed
+    in the background.
+    """
+    if not ObjectId.is_valid(post_id):
+        raise HTTPException(400, "Invalid post id")
+
+    oid = ObjectId(post_id)
+    username = user["username"]
+
+    posts = posts_collection
+    post = await posts.find_one({"_id": oid, **LIVE}, {"author": 1})
+    if not post and is_archived_id(oid):
+        posts = posts_archive_collection
+        post = await posts.find_one({"_id": oid, **LIVE}, {"author": 1})
+    if not post:
+        raise HTTPException(404, "Post not found")
+    if post["author"] != username:
+        raise HTTPException(403, "Not your post")
+
+    if not await tombstone_post(oid, username, posts):
+        raise HTTPException(404, "Post not found")
+    author_pages.pop((username, None))
+
+    return {"status": "deleted"}
+
+
 # ======================
 # SHARE POST
 # ======================
 
-@router.post("/{post_id}/share")
+@router.post("/{post_id}/share", dependencies=[Depends(rate_limit("share"))])
 async def share_post(
     post_id: str,
     user=Depends(get_current_user)
@@ -272,12 +633,16 @@ async def share_post(
 
     oid = ObjectId(post_id)
 
-    result = await posts_collection.update_one(
-        {"_id": oid},
-        {"$inc": {"share_count": 1}}
+    counts = await posts_collection.find_one_and_update(
+        {"_id": oid, **LIVE},
+        inc_counter("share_count", 1),
+        projection=COUNTS_PROJECTION,
+        return_document=ReturnDocument.AFTER,
     )
 
-    if result.matched_count == 0:
-        raise HTTPException(404, "Post not found")
+    if not counts:
+        await raise_missing_post(oid)
+
+    manager.publish_counts(counts)
 
     return {"status": "shared"}
\ No newline at end of file
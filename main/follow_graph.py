@@ -0,0 +1,295 @@
+import asyncio
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from main.database import relationships_collection, profiles_collection
+from main.log import get_logger
+
+logger = get_logger("follow_graph")
+
+GRAPH_LOAD_BATCH_SIZE = int(os.getenv("GRAPH_LOAD_BATCH_SIZE", "10000"))
+# Live changes reach every worker through main.graph_sync; the periodic
+# reload is the backstop for anything that bypassed it.
+GRAPH_RELOAD_SECONDS = float(os.getenv("GRAPH_RELOAD_SECONDS", "300"))
+
+
+# ======================
+# FOLLOW GRAPH CACHE
+# ======================
+# Accepted relationships only. Usernames are interned to dense int ids;
+# each user has a sorted array('i') of ids they follow and of ids following
+# them (4 bytes per edge per direction); private accounts are a set of ids.
+# Membership is a bisect over a small array: well under a microsecond.
+#
+# Visibility fails closed: until the graph has loaded, or for an account
+# this worker has never seen, only the author can see their own posts.
+# Readers call resolve() first so accounts created since the last load
+# are looked up instead of hidden.
+
+def _sorted_insert(arr: array, value: int) -> bool:
+    i = bisect_left(arr, value)
+    if i < len(arr) and arr[i] == value:
+        return False
+    arr.insert(i, value)
+    return True
+
+
+def _sorted_remove(arr: array, value: int) -> bool:
+    i = bisect_left(arr, value)
+    if i < len(arr) and arr[i] == value:
+        del arr[i]
+        return True
+    return False
+
+
+def _contains(arr: array, value: int) -> bool:
+    i = bisect_left(arr, value)
+    return i < len(arr) and arr[i] == value
+
+
+class FollowGraph:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.following: List[array] = []
+        self.followers: List[array] = []
+        self.private: Set[int] = set()
+        self.loaded = False
+        # Live updates made while load() is reading Mongo; replayed onto
+        # the fresh graph so they aren't lost in the swap.
+        self._pending: Optional[List[Tuple[str, tuple]]] = None
+        self._load_lock = asyncio.Lock()
+
+    # ---------- INTERNING ----------
+
+    def intern(self, username: str) -> int:
+        uid = self.ids.get(username)
+        if uid is None:
+            uid = self.ids[username] = len(self.names)
+            self.names.append(sys.intern(username))
+            self.following.append(array("i"))
+            self.followers.append(array("i"))
+        return uid
+
+    # ---------- BULK LOAD ----------
+
+    async def load(self):
+        """Rebuild from Mongo in one pass per collection."""
+        async with self._load_lock:
+            self._pending = []
+            try:
+                await self._load()
+            finally:
+                self._pending = None
+
+    async def _load(self):
+        fresh = FollowGraph()
+        out: Dict[int, List[int]] = {}
+        inc: Dict[int, List[int]] = {}
+
+        cursor = relationships_collection.find(
+            {"status": "accepted"},
+            {"_id": 0, "from_username": 1, "to_username": 1},
+        ).batch_size(GRAPH_LOAD_BATCH_SIZE)
+        async for rel in cursor:
+            a = fresh.intern(rel["from_username"])
+            b = fresh.intern(rel["to_username"])
+            out.setdefault(a, []).append(b)
+            inc.setdefault(b, []).append(a)
+
+        for uid, targets in out.items():
+            fresh.following[uid] = array("i", sorted(set(targets)))
+        for uid, sources in inc.items():
+            fresh.followers[uid] = array("i", sorted(set(sources)))
+
+        # Every account, so an unknown author really is unknown.
+        cursor = profiles_collection.find(
+            {},
+            {"_id": 0, "username": 1, "is_private": 1},
+        ).batch_size(GRAPH_LOAD_BATCH_SIZE)
+        async for p in cursor:
+            uid = fresh.intern(p["username"])
+            if p.get("is_private"):
+                fresh.private.add(uid)
+
+        # Swap in atomically (no awaits below this line).
+        self.ids, self.names = fresh.ids, fresh.names
+        self.following, self.followers = fresh.following, fresh.followers
+        self.private = fresh.private
+        self.loaded = True
+
+        pending, self._pending = self._pending, None
+        for method, args in pending:
+            getattr(self, method)(*args)
+
+        logger.info(
+            "follow_graph_loaded",
+            extra={"fields": {"users": len(self.names), "edges": self.edge_count(), "bytes": self.memory_bytes()}},
+        )
+
+    # ---------- LIVE UPDATES ----------
+
+    def _record(self, method: str, *args):
+        if self._pending is not None:
+            self._pending.append((method, args))
+
+    def add_edge(self, follower: str, author: str):
+        self._record("add_edge", follower, author)
+        a, b = self.intern(follower), self.intern(author)
+        if _sorted_insert(self.following[a], b):
+            _sorted_insert(self.followers[b], a)
+
+    def remove_edge(self, follower: str, author: str):
+        self._record("remove_edge", follower, author)
+        a, b = self.ids.get(follower), self.ids.get(author)
+        if a is None or b is None:
+            return
+        if _sorted_remove(self.following[a], b):
+            _sorted_remove(self.followers[b], a)
+
+    def remove_user(self, username: str):
+        """Drop every edge of a deleted account; its id stays interned."""
+        self._record("remove_user", username)
+        uid = self.ids.get(username)
+        if uid is None:
+            return
+        for other in self.following[uid]:
+            _sorted_remove(self.followers[other], uid)
+        for other in self.followers[uid]:
+            _sorted_remove(self.following[other], uid)
+        self.following[uid] = array("i")
+        self.followers[uid] = array("i")
+        self.private.discard(uid)
+
+    def set_private(self, username: str, is_private: bool):
+        self._record("set_private", username, is_private)
+        uid = self.intern(username)
+        if is_private:
+            self.private.add(uid)
+        else:
+            self.private.discard(uid)
+
+    async def resolve(self, usernames: Iterable[str]):
+        """Intern accounts created since the last load (e.g. on another worker)."""
+        unknown = {u for u in usernames if u not in self.ids}
+        if not unknown or not self.loaded:
+            return
+        cursor = profiles_collection.find(
+            {"username": {"$in": list(unknown)}},
+            {"_id": 0, "username": 1, "is_private": 1},
+        )
+        async for p in cursor:
+            if p["username"] not in self.ids:
+                self.set_private(p["username"], bool(p.get("is_private")))
+
+    # ---------- QUERIES ----------
+
+    def follows(self, viewer: str, author: str) -> bool:
+        a, b = self.ids.get(viewer), self.ids.get(author)
+        if a is None or b is None:
+            return False
+        return _contains(self.following[a], b)
+
+    def knows(self, username: str) -> bool:
+        return username in self.ids
+
+    def can_see(self, viewer: str, author: str) -> bool:
+        if viewer == author:
+            return True
+        b = self.ids.get(author)
+        if not self.loaded or b is None:
+            return False
+        if b not in self.private:
+            return True
+        return self.follows(viewer, author)
+
+    def followers_of(self, author: str) -> List[str]:
+        b = self.ids.get(author)
+        if b is None:
+            return []
+        names = self.names
+        return [names[i] for i in self.followers[b]]
+
+    def following_of(self, viewer: str) -> List[str]:
+        a = self.ids.get(viewer)
+        if a is None:
+            return []
+        names = self.names
+        return [names[i] for i in self.following[a]]
+
+    # ---------- ACCOUNTING ----------
+
+    def edge_count(self) -> int:
+        return sum(len(a) for a in self.following)
+
+    def memory_bytes(self) -> int:
+        """Approximate: containers, adjacency arrays and interned names."""
+        total = (
+            sys.getsizeof(self.ids)
+            + sys.getsizeof(self.names)
+            + sys.getsizeof(self.following)
+            + sys.getsizeof(self.followers)
+            + sys.getsizeof(self.private)
+        )
+        total += sum(sys.getsizeof(a) for a in self.following)
+        total += sum(sys.getsizeof(a) for a in self.followers)
+        total += sum(sys.getsizeof(n) for n in self.names)
+        return total
+
+
+# 🔥 SINGLE GLOBAL INSTANCE
+graph = FollowGraph()
+
+
+# ======================
+# FOOTPRINT BENCH
+# ======================
+# python -m main.follow_graph [edges] [users]
+# Synthetic graph, no database needed.
+
+def _bench(edges: int, users: int):
+    import random
+    import time
+
+    rng = random.Random(42)
+    g = FollowGraph()
+    for i in range(users):
+        g.intern(f"user{i:07d}")
+
+    out: Dict[int, set] = {}
+    made = 0
+    while made < edges:
+        a, b = rng.randrange(users), rng.randrange(users)
+        targets = out.setdefault(a, set())
+        if a != b and b not in targets:
+            targets.add(b)
+            made += 1
+    inc: Dict[int, List[int]] = {}
+    for a, targets in out.items():
+        g.following[a] = array("i", sorted(targets))
+        for b in targets:
+            inc.setdefault(b, []).append(a)
+    for b, sources in inc.items():
+        g.followers[b] = array("i", sorted(sources))
+    g.private.update(rng.sample(range(users), users // 10))
+    g.loaded = True
+
+    probes = [(g.names[rng.randrange(users)], g.names[rng.randrange(users)]) for _ in range(100000)]
+    start = time.perf_counter()
+    for viewer, author in probes:
+        g.can_see(viewer, author)
+    per_check = (time.perf_counter() - start) / len(probes)
+
+    size = g.memory_bytes()
+    print(f"users={users} edges={g.edge_count()}")
+    print(f"memory={size / 1e6:.1f} MB ({size / g.edge_count():.1f} bytes/edge incl. names)")
+    print(f"can_see={per_check * 1e6:.2f} us/check")
+
+
+if __name__ == "__main__":
+    _edges = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    _users = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    _bench(_edges, _users)
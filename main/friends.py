@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from datetime import datetime
+import re
 from pydantic import BaseModel
 from typing import List
 
 from main.deps import get_current_user
+from main.ratelimit import rate_limit
+from main.graph_sync import graph_sync
+from main.breaker import stale_read, STALE_HEADER
 from main.database import (
     relationships_collection,
     profiles_collection,
     notifications_collection,
+    CASE_INSENSITIVE,
+    run_in_transaction,
 )
+from main import outbox
 
 router = APIRouter(prefix="/friends", tags=["Friends"])
 
@@ -45,10 +52,12 @@ async def list_users(
 ):
     viewer = me(user)
 
-    query = {
-        "username": {"$regex": q, "$options": "i"},
-        "username": {"$ne": viewer},
-    }
+    # Usernames are stored lowercase, so an anchored, case-sensitive prefix
+    # regex on the lowered query stays inside the username_prefix index.
+    query = {"username": {"$ne": viewer}}
+    prefix = q.strip().lower()
+    if prefix:
+        query["username"]["$regex"] = "^" + re.escape(prefix)
 
     cursor = (
         profiles_collection
@@ -71,7 +80,7 @@ async def list_users(
 # FOLLOW / REQUEST
 # ======================
 
-@router.post("/follow", status_code=201)
+@router.post("/follow", status_code=201, dependencies=[Depends(rate_limit("follow"))])
 async def follow_user(payload: UsernamePayload, user=Depends(get_current_user)):
     from_username = me(user)
     to_username = payload.username.strip().lower()
@@ -84,35 +93,45 @@ async def follow_user(payload: UsernamePayload, user=Depends(get_current_user)):
     target = await profiles_collection.find_one(
         {"username": to_username},
         {"is_private": 1},
+        collation=CASE_INSENSITIVE,
     )
     if not target:
         raise HTTPException(404, "User not found")
 
-    existing = await relationships_collection.find_one({
-        "from_username": from_username,
-        "to_username": to_username,
-    })
+    existing = await relationships_collection.find_one(
+        {"from_username": from_username, "to_username": to_username},
+        collation=CASE_INSENSITIVE,
+    )
     if existing:
         raise HTTPException(409, "Request already exists")
 
     status_value = "pending" if target.get("is_private") else "accepted"
     now = datetime.utcnow()
 
-    await relationships_collection.insert_one({
-        "from_username": from_username,
-        "to_username": to_username,
-        "status": status_value,
-        "created_at": now,
-        "updated_at": now,
-    })
-
-    await notifications_collection.insert_one({
-        "to_username": to_username,
-        "from_username": from_username,
-        "type": "follow_request" if status_value == "pending" else "follow",
-        "created_at": now,
-        "seen": False,
-    })
+    async def write(session):
+        await relationships_collection.insert_one({
+            "from_username": from_username,
+            "to_username": to_username,
+            "status": status_value,
+            "created_at": now,
+            "updated_at": now,
+        }, session=session)
+
+        await outbox.enqueue("notify", {
+            "to_username": to_username,
+            "from_username": from_username,
+            "type": "follow_request" if status_value == "pending" else "follow",
+            "created_at": now,
+            "seen": False,
+        }, session=session)
+
+        if status_value == "accepted":
+            await graph_sync.record("follow", from_username, to_username, session=session)
+
+    await run_in_transaction(write)
+
+    if status_value == "accepted":
+        graph_sync.apply("follow", from_username, to_username)
 
     return {"status": status_value}
 
@@ -126,25 +145,34 @@ async def accept_request(payload: UsernamePayload, user=Depends(get_current_user
     to_username = me(user)
     from_username = payload.username.strip().lower()
 
-    result = await relationships_collection.update_one(
-        {
-            "from_username": from_username,
-            "to_username": to_username,
-            "status": "pending",
-        },
-        {"$set": {"status": "accepted", "updated_at": datetime.utcnow()}},
-    )
+    now = datetime.utcnow()
 
-    if result.matched_count == 0:
+    async def write(session):
+        result = await relationships_collection.update_one(
+            {
+                "from_username": from_username,
+                "to_username": to_username,
+                "status": "pending",
+            },
+            {"$set": {"status": "accepted", "updated_at": now}},
+            collation=CASE_INSENSITIVE,
+            session=session,
+        )
+        if result.matched_count:
+            await outbox.enqueue("notify", {
+                "to_username": from_username,
+                "from_username": to_username,
+                "type": "follow_accepted",
+                "created_at": now,
+                "seen": False,
+            }, session=session)
+            await graph_sync.record("follow", from_username, to_username, session=session)
+        return result.matched_count
+
+    if not await run_in_transaction(write):
         raise HTTPException(404, "Request not found")
 
-    await notifications_collection.insert_one({
-        "to_username": from_username,
-        "from_username": to_username,
-        "type": "follow_accepted",
-        "created_at": datetime.utcnow(),
-        "seen": False,
-    })
+    graph_sync.apply("follow", from_username, to_username)
 
     return {"status": "accepted"}
 
@@ -158,11 +186,14 @@ async def reject_request(payload: UsernamePayload, user=Depends(get_current_user
     to_username = me(user)
     from_username = payload.username.strip().lower()
 
-    result = await relationships_collection.delete_one({
-        "from_username": from_username,
-        "to_username": to_username,
-        "status": "pending",
-    })
+    result = await relationships_collection.delete_one(
+        {
+            "from_username": from_username,
+            "to_username": to_username,
+            "status": "pending",
+        },
+        collation=CASE_INSENSITIVE,
+    )
 
     if result.deleted_count == 0:
         raise HTTPException(404, "Request not found")
@@ -179,15 +210,25 @@ async def unfollow(payload: UsernamePayload, user=Depends(get_current_user)):
     from_username = me(user)
     to_username = payload.username.strip().lower()
 
-    result = await relationships_collection.delete_one({
-        "from_username": from_username,
-        "to_username": to_username,
-        "status": "accepted",
-    })
-
-    if result.deleted_count == 0:
+    async def write(session):
+        result = await relationships_collection.delete_one(
+            {
+                "from_username": from_username,
+                "to_username": to_username,
+                "status": "accepted",
+            },
+            collation=CASE_INSENSITIVE,
+            session=session,
+        )
+        if result.deleted_count:
+            await graph_sync.record("unfollow", from_username, to_username, session=session)
+        return result.deleted_count
+
+    if not await run_in_transaction(write):
         raise HTTPException(404, "Not following")
 
+    graph_sync.apply("unfollow", from_username, to_username)
+
     return {"status": "unfollowed"}
 
 
@@ -196,16 +237,21 @@ async def unfollow(payload: UsernamePayload, user=Depends(get_current_user)):
 # ======================
 
 @router.get("/following")
-async def list_following(user=Depends(get_current_user)):
+async def list_following(response: Response, user=Depends(get_current_user)):
     username = me(user)
 
-    cursor = relationships_collection.find(
-        {"from_username": username, "status": "accepted"},
-        {"_id": 0, "to_username": 1},
-    )
+    async def fetch():
+        cursor = relationships_collection.find(
+            {"from_username": username, "status": "accepted"},
+            {"_id": 0, "to_username": 1},
+        )
+        users = [d["to_username"] async for d in cursor]
+        return {"count": len(users), "users": users}
 
-    users = [d["to_username"] async for d in cursor]
-    return {"count": len(users), "users": users}
+    result, stale = await stale_read("following", username, fetch)
+    if stale:
+        response.headers[STALE_HEADER] = "true"
+    return result
 
 
 @router.get("/followers")
@@ -233,10 +279,10 @@ async def relationship_status(username: str, user=Depends(get_current_user)):
     if viewer == target:
         return {"status": "self"}
 
-    outgoing = await relationships_collection.find_one({
-        "from_username": viewer,
-        "to_username": target,
-    })
+    outgoing = await relationships_collection.find_one(
+        {"from_username": viewer, "to_username": target},
+        collation=CASE_INSENSITIVE,
+    )
     if outgoing:
         return {
             "status": "following"
@@ -244,11 +290,10 @@ async def relationship_status(username: str, user=Depends(get_current_user)):
             else outgoing["status"]
         }
 
-    incoming = await relationships_collection.find_one({
-        "from_username": target,
-        "to_username": viewer,
-        "status": "pending",
-    })
+    incoming = await relationships_collection.find_one(
+        {"from_username": target, "to_username": viewer, "status": "pending"},
+        collation=CASE_INSENSITIVE,
+    )
     if incoming:
         return {"status": "incoming_request"}
 
@@ -276,4 +321,18 @@ async def friend_notifications(user=Depends(get_current_user)):
             "seen": n.get("seen", False),
         }
         async for n in cursor
-    ]
\ No newline at end of file
+    ]
+
+
+@router.post("/notifications/seen")
+async def mark_notifications_seen(user=Depends(get_current_user)):
+    username = me(user)
+    now = datetime.utcnow()
+
+    # seen_at drives the TTL index: seen notifications expire on their own.
+    result = await notifications_collection.update_many(
+        {"to_username": username, "seen": False},
+        {"$set": {"seen": True, "seen_at": now}},
+    )
+
+    return {"updated": result.modified_count}
\ No newline at end of file
@@ -0,0 +1,93 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from main.database import graph_events_collection
+from main.follow_graph import graph, GRAPH_RELOAD_SECONDS
+from main.log import get_logger
+from main.ws_manager import manager
+
+logger = get_logger("graph_sync")
+
+# ======================
+# CONFIG
+# ======================
+
+GRAPH_SYNC_SECONDS = float(os.getenv("GRAPH_SYNC_SECONDS", "2"))
+# Re-read this much history on each sync, so an event whose created_at
+# lags a concurrent sync (clock skew, slow insert) isn't missed.
+GRAPH_SYNC_OVERLAP = timedelta(seconds=10)
+# Anything older is already in every worker's last full reload.
+GRAPH_EVENT_TTL = timedelta(seconds=GRAPH_RELOAD_SECONDS * 2)
+
+
+# ======================
+# CROSS-WORKER GRAPH CHANGES
+# ======================
+# The follow graph and feed socket subscriptions live in each worker.
+# Every change is logged to graph_events in the transaction that makes it,
+# then applied locally once that commits; the other workers poll the log
+# (as the denylist polls revocations) and apply it, so an unfollow made
+# through one worker stops deliveries on all of them within
+# GRAPH_SYNC_SECONDS instead of at the next full reload. Because the log
+# commits with the change, a crash can't leave the other workers without it.
+#
+# Events are replayed in created_at order, overlap included, and every
+# operation is idempotent, so the latest change for a pair always wins.
+
+def _apply(op: str, args: list):
+    if op == "follow":
+        graph.add_edge(*args)
+        manager.follow(*args)
+    elif op == "unfollow":
+        graph.remove_edge(*args)
+        manager.unfollow(*args)
+    elif op == "set_private":
+        graph.set_private(*args)
+    elif op == "remove_user":
+        graph.remove_user(*args)
+    else:
+        logger.warning("graph_event_unknown", extra={"fields": {"op": op}})
+
+
+class GraphSync:
+    def __init__(self):
+        self.synced_at: Optional[datetime] = None
+
+    async def record(self, op: str, *args, session=None):
+        """
+        Log a change with the session of the write that makes it (from
+        inside run_in_transaction), then apply() it once that commits:
+
+            follow(viewer, author)       once viewer -> author is *accepted*
+            unfollow(viewer, author)
+            set_private(username, is_private)
+            remove_user(username)
+        """
+        now = datetime.utcnow()
+        await graph_events_collection.insert_one({
+            "op": op,
+            "args": list(args),
+            "created_at": now,
+            "expires_at": now + GRAPH_EVENT_TTL,
+        }, session=session)
+
+    def apply(self, op: str, *args):
+        """This worker's copy of a recorded change; the others sync it."""
+        _apply(op, list(args))
+
+    async def sync(self):
+        """Apply changes made through other workers; the first call replays all kept."""
+        now = datetime.utcnow()
+        query = {}
+        if self.synced_at:
+            query["created_at"] = {"$gt": self.synced_at - GRAPH_SYNC_OVERLAP}
+
+        cursor = graph_events_collection.find(query).sort([("created_at", 1), ("_id", 1)])
+        async for event in cursor:
+            _apply(event["op"], event["args"])
+        self.synced_at = now
+
+
+# 🔥 SINGLE GLOBAL INSTANCE
+graph_sync = GraphSync()
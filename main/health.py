@@ -0,0 +1,42 @@
+import asyncio
+import os
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from main.database import db
+
+router = APIRouter(tags=["Health"])
+
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT_MS", "1000")) / 1000
+
+# Flipped by the startup hook once indexes are ensured.
+state = {"indexes_ready": False}
+
+
+# ======================
+# LIVENESS
+# ======================
+
+@router.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Process is up and the event loop is responsive. No I/O."""
+    return {"status": "ok"}
+
+
+# ======================
+# READINESS
+# ======================
+
+@router.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Only report ready once indexes are in place and Mongo answers a ping."""
+    if not state["indexes_ready"]:
+        return JSONResponse({"status": "starting"}, status_code=503)
+
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_TIMEOUT)
+    except Exception:
+        return JSONResponse({"status": "mongo_unreachable"}, status_code=503)
+
+    return {"status": "ready"}
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Set
+
+from pymongo.errors import DuplicateKeyError
+
+from main.database import schema_meta_collection
+from main.log import get_logger
+
+logger = get_logger("jobs")
+
+# ======================
+# BACKGROUND JOBS
+# ======================
+# Every worker starts the same periodic jobs; a lease document in
+# schema_meta makes sure only one worker runs a given job at a time.
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_tasks: Set[asyncio.Task] = set()
+
+
+async def acquire_lease(name: str, ttl_seconds: float) -> bool:
+    now = datetime.utcnow()
+    try:
+        await schema_meta_collection.update_one(
+            {
+                "_id": f"lease:{name}",
+                "$or": [{"expires_at": {"$lt": now}}, {"owner": WORKER_ID}],
+            },
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # Lease exists, is live and belongs to another worker.
+        return False
+    return True
+
+
+async def _run_periodic(name: str, interval: float, fn: Callable[[], Awaitable], leased: bool):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not leased or await acquire_lease(name, interval * 2):
+                await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("job_failed", extra={"fields": {"job": name}})
+
+
+def start_periodic(name: str, interval: float, fn: Callable[[], Awaitable], leased: bool = True):
+    """leased=False runs on every worker (e.g. refreshing per-process caches)."""
+    task = asyncio.create_task(_run_periodic(name, interval, fn, leased), name=f"job:{name}")
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+def stop_all():
+    for task in list(_tasks):
+        task.cancel()
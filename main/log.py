@@ -0,0 +1,43 @@
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+# ======================
+# STRUCTURED LOGGING
+# ======================
+# One JSON object per line so log shippers can index fields directly:
+#   logger.info("ws_connect", extra={"fields": {"active": 12}})
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def setup_logging():
+    """Install the JSON handler on the `wire` logger. Idempotent."""
+    root = logging.getLogger("wire")
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"wire.{name}")
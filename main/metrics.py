@@ -0,0 +1,350 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from pymongo import monitoring
+
+from main import profiling
+
+router = APIRouter(tags=["Metrics"])
+
+
+# ======================
+# PRIMITIVES
+# ======================
+# Every metric keeps a dict keyed by a tuple of label values. Recording is a
+# dict lookup plus an add under a lock, which keeps it cheap enough to leave
+# on in production (Motor runs command listeners on its executor threads,
+# so the lock is required for the Mongo metrics).
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class CallbackGauge:
+    """Gauge whose value is read only when /metrics is scraped."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def collect(self):
+        yield f"{self.name} {self.fn()}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 2)
+            row[idx] += 1
+            row[-1] += value
+
+    def collect(self):
+        with self._lock:
+            items = [(labels, list(row)) for labels, row in self._values.items()]
+        for labels, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            cumulative += row[len(self.buckets)]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {row[-1]}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+# ======================
+# REGISTRY
+# ======================
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def gauge_callback(self, name: str, help: str, fn: Callable[[], float]) -> CallbackGauge:
+        return self.register(CallbackGauge(name, help, fn))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# ======================
+# WIRE METRICS
+# ======================
+
+http_requests = registry.counter(
+    "wire_http_requests_total",
+    "HTTP requests by route template, method and status",
+    ("method", "route", "status"),
+)
+http_latency = registry.histogram(
+    "wire_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route"),
+)
+
+mongo_commands = registry.counter(
+    "wire_mongo_commands_total",
+    "MongoDB commands by command name, collection and outcome",
+    ("command", "collection", "outcome"),
+)
+mongo_latency = registry.histogram(
+    "wire_mongo_command_duration_seconds",
+    "MongoDB command duration by command name and collection",
+    ("command", "collection"),
+)
+
+broadcast_latency = registry.histogram(
+    "wire_ws_broadcast_duration_seconds",
+    "Time to fan a feed event out to every connected socket",
+)
+broadcast_recipients = registry.counter(
+    "wire_ws_broadcast_messages_total",
+    "Feed frames sent to individual sockets",
+)
+
+auth_failures = registry.counter(
+    "wire_auth_failures_total",
+    "Rejected authentication attempts by reason",
+    ("reason",),
+)
+
+
+# ======================
+# HTTP MIDDLEWARE
+# ======================
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: records latency and status per route template
+    (not per raw path, so ObjectIds in URLs don't explode cardinality).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, route, str(status_holder[0]))
+            http_latency.observe(elapsed, method, route)
+
+
+# ======================
+# MONGO COMMAND LISTENER
+# ======================
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Feeds per-command and per-collection timings into the registry."""
+
+    def __init__(self):
+        self._inflight: Dict[Tuple, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event) -> Tuple:
+        return (event.request_id, event.connection_id, getattr(event, "operation_id", None))
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            # getMore carries the cursor id; the namespace is in "collection"
+            target = event.command.get("collection", "-")
+        with self._lock:
+            self._inflight[self._key(event)] = (event.command_name, str(target))
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            command, collection = self._inflight.pop(
+                self._key(event), (event.command_name, "-")
+            )
+        mongo_commands.inc(command, collection, outcome)
+        seconds = event.duration_micros / 1_000_000
+        mongo_latency.observe(seconds, command, collection)
+        profiling.record("mongo", seconds)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+# ======================
+# MONGO POOL LISTENER
+# ======================
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """
+    Tracks connections currently checked out, per server: the driver keeps
+    one pool (of maxPoolSize) for each server address.
+    """
+
+    def __init__(self):
+        self.by_address: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def checked_out(self) -> int:
+        return sum(self.by_address.values())
+
+    def busiest(self) -> int:
+        """Checked-out connections of the fullest pool."""
+        return max(self.by_address.values(), default=0)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.by_address[event.address] = self.by_address.get(event.address, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.by_address[event.address] = self.by_address.get(event.address, 0) - 1
+
+    # Required by the listener interface; nothing to record. Entries of
+    # closed pools stay (a handful of addresses); late check-ins zero them.
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+
+
+pool_listener = MongoPoolListener()
+
+registry.gauge_callback(
+    "wire_mongo_pool_checked_out",
+    "Driver connections currently checked out",
+    lambda: pool_listener.checked_out,
+)
+
+
+# ======================
+# ENDPOINT
+# ======================
+
+@router.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -9,6 +9,9 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class AccountDelete(BaseModel):
+    password: str
+
 class UserPublic(BaseModel):
     id: str
     username: str
@@ -0,0 +1,186 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from main.database import outbox_collection, notifications_collection
+from main.log import get_logger
+from main.metrics import registry
+
+logger = get_logger("outbox")
+
+# ======================
+# CONFIG
+# ======================
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_MS", "500")) / 1000
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "30"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "300"))
+
+events_total = registry.counter(
+    "wire_outbox_events_total",
+    "Outbox events handled",
+    ("kind", "result"),
+)
+
+
+# ======================
+# ENQUEUE
+# ======================
+# Call with the session of the primary write so the event commits (or
+# not) together with it. Handlers get whole batches of one kind and must
+# be idempotent: delivery is at-least-once, keyed by the event _id.
+
+Handler = Callable[[List[dict]], Awaitable]
+HANDLERS: Dict[str, Handler] = {}
+
+_wake = asyncio.Event()
+
+
+def handler(kind: str):
+    def register(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+async def enqueue(kind: str, payload: dict, session=None):
+    now = datetime.utcnow()
+    await outbox_collection.insert_one(
+        {"kind": kind, "payload": payload, "attempts": 0, "due_at": now, "created_at": now},
+        session=session,
+    )
+    # Only a hint: another worker process may still claim it first.
+    _wake.set()
+
+
+# ======================
+# HANDLERS
+# ======================
+
+@handler("notify")
+async def deliver_notifications(events: List[dict]):
+    # The event id doubles as the notification id, so a retried batch
+    # only inserts what is missing.
+    docs = [{**e["payload"], "_id": e["_id"]} for e in events]
+    try:
+        await notifications_collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+# ======================
+# WORKER POOL
+# ======================
+
+async def claim(limit: int) -> List[dict]:
+    """
+    Lease up to `limit` due events by pushing their due_at past the lease.
+    If the worker dies, they come due again and someone else retries.
+    """
+    now = datetime.utcnow()
+    ids = [
+        d["_id"] async for d in
+        outbox_collection.find({"due_at": {"$lte": now}}, {"_id": 1}).sort("due_at", 1).limit(limit)
+    ]
+    if not ids:
+        return []
+
+    token = ObjectId()
+    await outbox_collection.update_many(
+        {"_id": {"$in": ids}, "due_at": {"$lte": now}},
+        {
+            "$set": {"due_at": now + timedelta(seconds=OUTBOX_LEASE_SECONDS), "claim": token},
+            "$inc": {"attempts": 1},
+        },
+    )
+    return await outbox_collection.find({"claim": token}).to_list(limit)
+
+
+async def _fail(events: List[dict], error: Exception):
+    now = datetime.utcnow()
+    for e in events:
+        if e["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            # Parked for inspection; a null due_at is never claimed again.
+            update = {"$set": {"due_at": None, "dead_at": now, "error": repr(error)}}
+            events_total.inc(e["kind"], "dead")
+        else:
+            delay = min(2 ** e["attempts"], OUTBOX_MAX_BACKOFF_SECONDS)
+            update = {"$set": {"due_at": now + timedelta(seconds=delay), "error": repr(error)}}
+            events_total.inc(e["kind"], "retry")
+        await outbox_collection.update_one({"_id": e["_id"], "claim": e["claim"]}, update)
+
+
+async def process(events: List[dict]):
+    events.sort(key=lambda e: e["kind"])
+    for kind, group in groupby(events, key=lambda e: e["kind"]):
+        batch = list(group)
+        fn = HANDLERS.get(kind)
+        try:
+            if fn is None:
+                raise LookupError(f"no outbox handler for {kind!r}")
+            await fn(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("outbox_failed", extra={"fields": {"kind": kind, "events": len(batch)}})
+            await _fail(batch, e)
+            continue
+        await outbox_collection.delete_many({"_id": {"$in": [e["_id"] for e in batch]}})
+        events_total.inc(kind, "ok", amount=len(batch))
+
+
+async def _worker():
+    while True:
+        # Cleared before claiming, so an enqueue racing the claim still
+        # wakes us instead of waiting out the poll interval.
+        _wake.clear()
+        try:
+            events = await claim(OUTBOX_BATCH_SIZE)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("outbox_claim_failed")
+            events = []
+
+        if events:
+            try:
+                await process(events)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Bookkeeping failed (Mongo unreachable); leases expire
+                # and the events are retried.
+                logger.exception("outbox_process_failed")
+                await asyncio.sleep(OUTBOX_POLL_SECONDS)
+            continue
+
+        try:
+            await asyncio.wait_for(_wake.wait(), OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+_workers: List[asyncio.Task] = []
+
+
+def start():
+    for i in range(OUTBOX_WORKERS):
+        _workers.append(asyncio.create_task(_worker(), name=f"outbox:{i}"))
+
+
+async def stop(timeout: Optional[float] = 5):
+    for task in _workers:
+        task.cancel()
+    # Leased events that were cut off come due again after the lease.
+    if _workers:
+        await asyncio.wait(_workers, timeout=timeout)
+    _workers.clear()
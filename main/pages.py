@@ -0,0 +1,84 @@
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import PyMongoError
+
+from main.breaker import stale_read
+from main.deps import get_current_user
+from main.feed import load_feed
+from main.views import views
+
+# ======================
+# CONFIG
+# ======================
+
+# Must match `limit` in static/js/feed.js, which continues from here.
+HOME_FEED_PAGE_SIZE = int(os.getenv("HOME_FEED_PAGE_SIZE", "10"))
+
+BOOTSTRAP_MARKER = "<!--BOOTSTRAP-->"
+
+
+# ======================
+# PAGE TEMPLATES
+# ======================
+# A page is read and split at its marker once, at import. Rendering is
+# two byte-string concatenations around one JSON blob: no template
+# engine, no per-request file I/O.
+
+def json_script(data: dict) -> bytes:
+    """JSON that can't close its <script> element or open a comment."""
+    body = json.dumps(jsonable_encoder(data), separators=(",", ":"))
+    body = body.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+    return f'<script id="bootstrap" type="application/json">{body}</script>'.encode()
+
+
+class PageTemplate:
+    def __init__(self, path: Path):
+        head, marker, tail = path.read_text(encoding="utf-8").partition(BOOTSTRAP_MARKER)
+        if not marker:
+            raise RuntimeError(f"{path.name} has no {BOOTSTRAP_MARKER} marker")
+        self.head = head.encode()
+        self.tail = tail.encode()
+        self.empty = self.head + self.tail
+
+    def render(self, data: Optional[dict]) -> bytes:
+        if data is None:
+            return self.empty
+        return self.head + json_script(data) + self.tail
+
+
+# ======================
+# HOME
+# ======================
+
+async def home_bootstrap(request: Request) -> Optional[dict]:
+    """
+    Viewer identity and the first feed page, or None when the request
+    isn't signed in; the page then loads both itself, as before.
+    """
+    try:
+        user = get_current_user(request)
+    except HTTPException:
+        return None
+
+    viewer = user["username"]
+    data = {"user": {"username": viewer, "email": user.get("email")}}
+
+    # Same stale-read key as GET /posts?limit=N. Any failure just leaves
+    # the feed to the page's own fetch; the shell must still render.
+    try:
+        (posts, next_cursor), _ = await stale_read(
+            "feed",
+            (viewer, HOME_FEED_PAGE_SIZE, None, "new", None),
+            lambda: load_feed(viewer, HOME_FEED_PAGE_SIZE, None, "new", None),
+        )
+    except (HTTPException, PyMongoError):
+        return data
+
+    views.record(viewer, posts)
+    data["feed"] = {"posts": posts, "limit": HOME_FEED_PAGE_SIZE, "next_cursor": next_cursor}
+    return data
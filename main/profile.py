@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import Optional
 
 from main.deps import get_current_user
-from main.database import profiles_collection
+from main.database import profiles_collection, run_in_transaction, CASE_INSENSITIVE
+from main.graph_sync import graph_sync
+from main.breaker import stale_read, STALE_HEADER
 
 router = APIRouter(prefix="/profile", tags=["Profile"])
 
@@ -54,18 +56,25 @@ def default_profile(username: str) -> dict:
 # ======================
 
 @router.get("/me")
-async def get_my_profile(user=Depends(get_current_user)):
+async def get_my_profile(response: Response, user=Depends(get_current_user)):
     username = get_username(user)
 
-    profile = await profiles_collection.find_one(
-        {"username": username},
-        {"_id": 0}
-    )
+    async def fetch():
+        profile = await profiles_collection.find_one(
+            {"username": username},
+            {"_id": 0},
+            collation=CASE_INSENSITIVE
+        )
+
+        # 🔥 IMPORTANT: do NOT return 404
+        if not profile:
+            return default_profile(username)
 
-    # 🔥 IMPORTANT: do NOT return 404
-    if not profile:
-        return default_profile(username)
+        return profile
 
+    profile, stale = await stale_read("profile", username, fetch)
+    if stale:
+        response.headers[STALE_HEADER] = "true"
     return profile
 
 
@@ -90,19 +99,29 @@ async def update_profile(
 
     now = datetime.utcnow()
 
-    await profiles_collection.update_one(
-        {"username": username},
-        {
-            "$set": {
-                **update_data,
-                "updated_at": now
+    async def write(session):
+        await profiles_collection.update_one(
+            {"username": username},
+            {
+                "$set": {
+                    **update_data,
+                    "updated_at": now
+                },
+                "$setOnInsert": {
+                    "username": username,
+                    "created_at": now
+                }
             },
-            "$setOnInsert": {
-                "username": username,
-                "created_at": now
-            }
-        },
-        upsert=True
-    )
+            upsert=True,
+            collation=CASE_INSENSITIVE,
+            session=session,
+        )
+        if "is_private" in update_data:
+            await graph_sync.record("set_private", username, update_data["is_private"], session=session)
+
+    await run_in_transaction(write)
+
+    if "is_private" in update_data:
+        graph_sync.apply("set_private", username, update_data["is_private"])
 
     return {"status": "saved"}
\ No newline at end of file
@@ -0,0 +1,179 @@
+import contextvars
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from pathlib import Path
+from typing import Dict, Optional
+
+from main.log import get_logger
+
+logger = get_logger("profiling")
+
+# ======================
+# CONFIG
+# ======================
+# The middleware is only installed when PROFILE_ENABLED is set, so a
+# disabled profiler costs nothing. When installed, a request is profiled if
+# it carries `X-Wire-Profile: <PROFILE_TOKEN>` or wins the sampling draw.
+
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000
+
+PROFILE_HEADER = b"x-wire-profile"
+
+# Stack frames whose samples count as response encoding.
+ENCODING_FUNCS = {"jsonable_encoder", "serialize_response", "render", "dumps"}
+
+
+# ======================
+# PER-REQUEST SECTIONS
+# ======================
+# Handlers and the Mongo listener report time into whichever profile is
+# active for the current context. Motor copies the context onto its
+# executor threads, so driver callbacks land on the right request.
+
+_current: contextvars.ContextVar[Optional[Dict[str, float]]] = (
+    contextvars.ContextVar("wire_profile", default=None)
+)
+
+
+def record(section: str, seconds: float):
+    sections = _current.get()
+    if sections is not None:
+        sections[section] = sections.get(section, 0.0) + seconds
+
+
+class section:
+    """`with section("auth"): ...` — no-op unless the request is profiled."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        if _current.get() is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start:
+            record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# ======================
+# SAMPLER
+# ======================
+
+class StackSampler(threading.Thread):
+    """
+    Samples the event loop thread's stack every PROFILE_INTERVAL seconds
+    and keeps folded stacks (`a;b;c count`), the input format of
+    flamegraph.pl / speedscope. Other requests sharing the loop can show up
+    in the samples; profile under light load for a clean picture.
+    """
+
+    def __init__(self, target_thread_id: int):
+        super().__init__(daemon=True)
+        self.target = target_thread_id
+        self.stacks: StackCounter = StackCounter()
+        self.encoding_samples = 0
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(PROFILE_INTERVAL):
+            frame = sys._current_frames().get(self.target)
+            if frame is None:
+                continue
+            names = []
+            encoding = False
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                encoding = encoding or code.co_name in ENCODING_FUNCS
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+            self.encoding_samples += encoding
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# ======================
+# MIDDLEWARE
+# ======================
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._busy = threading.Lock()
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+
+    def _wanted(self, scope) -> bool:
+        if PROFILE_TOKEN:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value.decode("latin-1"), PROFILE_TOKEN)
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        # One profile at a time keeps the sampler's picture readable.
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        sections: Dict[str, float] = {}
+        token = _current.set(sections)
+        sampler = StackSampler(threading.get_ident())
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.stop()
+            wall = time.perf_counter() - start
+            _current.reset(token)
+            self._busy.release()
+            self._write(scope, wall, sections, sampler)
+
+    def _write(self, scope, wall: float, sections: Dict[str, float], sampler: StackSampler):
+        route = getattr(scope.get("route"), "path", None) or scope["path"]
+        slug = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        stem = PROFILE_DIR / f"{int(time.time() * 1000)}-{scope['method']}-{slug}"
+
+        with open(f"{stem}.folded", "w") as fh:
+            for stack, count in sampler.stacks.most_common():
+                fh.write(f"{stack} {count}\n")
+
+        encoding = sampler.encoding_samples * PROFILE_INTERVAL
+        breakdown = {
+            "method": scope["method"],
+            "route": route,
+            "wall_ms": round(wall * 1000, 3),
+            "auth_ms": round(sections.get("auth", 0.0) * 1000, 3),
+            "mongo_ms": round(sections.get("mongo", 0.0) * 1000, 3),
+            "encoding_ms": round(encoding * 1000, 3),
+            "samples": sampler.samples,
+            "interval_ms": PROFILE_INTERVAL * 1000,
+        }
+        with open(f"{stem}.json", "w") as fh:
+            json.dump(breakdown, fh, indent=2)
+
+        logger.info("request_profiled", extra={"fields": {**breakdown, "file": str(stem)}})
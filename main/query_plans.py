@@ -0,0 +1,287 @@
+"""
+Query-plan regression check for the hot read paths.
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=wire_plancheck \\
+        python -m main.query_plans
+
+Seeds a scratch database, builds the indexes from init_indexes() and runs
+every hot query from feed.py, search.py, friends.py, profile.py and auth.py through
+explain(). Exits non-zero when a plan uses COLLSCAN, a blocking SORT, or
+examines more than MAX_EXAMINED_RATIO documents per document returned.
+tests/test_query_plans.py runs it whenever MONGO_URL is set.
+
+Feed, author and hashtag pages are built with the same query builders
+(feed_query, author_query, tag_query) and orders as their handlers, so
+they can't drift; the simpler lookups below must match their handler's
+filter / sort / collation by hand.
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+SCRATCH_SUFFIX = "_plancheck"
+
+os.environ.setdefault("DB_NAME", "wire" + SCRATCH_SUFFIX)
+
+from main.database import (  # noqa: E402
+    db,
+    DB_NAME,
+    init_indexes,
+    users_collection,
+    profiles_collection,
+    relationships_collection,
+    posts_collection,
+    post_likes_collection,
+    post_comments_collection,
+    notifications_collection,
+    posts_archive_collection,
+    CASE_INSENSITIVE,
+    LIVE,
+    TOMBSTONED,
+)
+from main.feed import AUTHOR_ORDER, FEED_ORDERS, author_query, feed_query  # noqa: E402
+from main.ranking import post_score  # noqa: E402
+from main.search import TAG_ORDER, tag_query  # noqa: E402
+
+MAX_EXAMINED_RATIO = float(os.getenv("PLAN_MAX_EXAMINED_RATIO", "2.0"))
+BAD_STAGES = {"COLLSCAN", "SORT"}
+
+N_USERS = 300
+N_POSTS = 3000
+VIEWER = "user0007"
+OTHER = "user0042"
+
+
+# ======================
+# FIXTURES
+# ======================
+
+async def seed():
+    now = datetime.utcnow()
+    usernames = [f"user{i:04d}" for i in range(N_USERS)]
+
+    await users_collection.insert_many([
+        {
+            "email": f"{u}@example.com",
+            "username": u,
+            "password": "x",
+            "created_at": now,
+        }
+        for u in usernames
+    ])
+    await profiles_collection.insert_many([
+        {"username": u, "bio": "", "is_private": i % 5 == 0, "created_at": now}
+        for i, u in enumerate(usernames)
+    ])
+
+    relationships = []
+    for i, u in enumerate(usernames):
+        for step in (1, 7, 13):
+            relationships.append({
+                "from_username": u,
+                "to_username": usernames[(i + step) % N_USERS],
+                "status": "pending" if step == 13 else "accepted",
+                "created_at": now,
+                "updated_at": now,
+            })
+    await relationships_collection.insert_many(relationships)
+
+    posts = [
+        {
+            "author": usernames[i % N_USERS],
+            "content": f"post {i}",
+            "created_at": now - timedelta(seconds=i),
+            "like_count": 0,
+            "comment_count": 0,
+            "share_count": 0,
+            "score": post_score(i % 7, i % 3, 0, now - timedelta(seconds=i)),
+            "hashtags": [f"tag{i % 20}"],
+        }
+        for i in range(N_POSTS)
+    ]
+    await posts_collection.insert_many(posts)  # sets each post's _id
+    post_ids = [p["_id"] for p in posts]
+
+    await post_likes_collection.insert_many([
+        {"post_id": post_ids[i], "username": usernames[(i * 3) % N_USERS], "created_at": now}
+        for i in range(0, N_POSTS, 2)
+    ])
+    await post_comments_collection.insert_many([
+        {
+            "post_id": post_ids[i % 50],
+            "author": usernames[i % N_USERS],
+            "text": "c",
+            "created_at": now - timedelta(seconds=i),
+        }
+        for i in range(1000)
+    ])
+    await notifications_collection.insert_many([
+        {
+            "to_username": usernames[i % N_USERS],
+            "from_username": usernames[(i + 1) % N_USERS],
+            "type": "like",
+            "created_at": now - timedelta(seconds=i),
+            "seen": i % 3 == 0,
+        }
+        for i in range(N_USERS * 10)
+    ])
+
+    return posts
+
+
+# ======================
+# HOT QUERIES
+# ======================
+
+def hot_queries(posts):
+    """(name, collection, filter, sort, limit, collation)"""
+    poll_after = datetime.utcnow() - timedelta(seconds=30)
+    post_ids = [p["_id"] for p in posts]
+    # A page boundary deep enough that later pages have rows to return.
+    mid = posts[len(posts) // 2]
+    by_viewer = [p for p in posts if p["author"] == VIEWER]
+    mine = by_viewer[len(by_viewer) // 2]
+    tagged = [p for p in posts if "tag3" in p["hashtags"]]
+    tag_mid = tagged[len(tagged) // 2]
+
+    return [
+        # ---------- feed.py ----------
+        ("feed.get_posts", posts_collection,
+         feed_query("new"), FEED_ORDERS["new"], 10, None),
+        ("feed.get_posts(cursor)", posts_collection,
+         feed_query("new", position=(mid["created_at"], mid["_id"])), FEED_ORDERS["new"], 10, None),
+        ("feed.get_posts(after)", posts_collection,
+         feed_query("new", poll_after), FEED_ORDERS["new"], 5, None),
+        ("feed.get_posts(sort=top)", posts_collection,
+         feed_query("top"), FEED_ORDERS["top"], 10, None),
+        ("feed.get_posts(sort=top,cursor)", posts_collection,
+         feed_query("top", position=(mid["score"], mid["_id"])), FEED_ORDERS["top"], 10, None),
+        ("feed.get_posts(archive)", posts_archive_collection,
+         feed_query("new", position=(mid["created_at"], mid["_id"])), FEED_ORDERS["new"], 10, None),
+        ("feed.get_posts.liked", post_likes_collection,
+         {"post_id": post_ids[0], "username": VIEWER}, None, 1, None),
+        ("feed.get_comments", post_comments_collection,
+         {"post_id": post_ids[3]}, [("created_at", 1)], 20, None),
+
+        ("feed.get_author_posts", posts_collection,
+         author_query(VIEWER, None), AUTHOR_ORDER, 50, None),
+        ("feed.get_author_posts(cursor)", posts_collection,
+         author_query(VIEWER, (mine["created_at"], mine["_id"])), AUTHOR_ORDER, 50, None),
+
+        # ---------- search.py ----------
+        ("search.hashtag_timeline", posts_collection,
+         tag_query("tag3", None), TAG_ORDER, 20, None),
+        ("search.hashtag_timeline(cursor)", posts_collection,
+         tag_query("tag3", (tag_mid["created_at"], tag_mid["_id"])), TAG_ORDER, 20, None),
+
+        # ---------- deletion.py ----------
+        ("deletion.cascade_step.posts", posts_collection,
+         dict(TOMBSTONED), [("deleted_at", 1)], 1, None),
+        ("deletion.cascade_step.archived_posts", posts_archive_collection,
+         dict(TOMBSTONED), [("deleted_at", 1)], 1, None),
+        ("deletion.cascade_step.accounts", users_collection,
+         dict(TOMBSTONED), [("deleted_at", 1)], 1, None),
+        ("deletion.post_notifications", notifications_collection,
+         {"post_id": str(post_ids[0])}, None, 500, None),
+        ("deletion.sent_notifications", notifications_collection,
+         {"from_username": VIEWER}, None, 500, None),
+
+        # ---------- friends.py ----------
+        ("friends.list_users", profiles_collection,
+         {"username": {"$ne": VIEWER}}, [("username", 1)], 10, None),
+        ("friends.list_users(q)", profiles_collection,
+         {"username": {"$ne": VIEWER, "$regex": "^user00"}}, [("username", 1)], 10, None),
+        ("friends.follow_user.target", profiles_collection,
+         {"username": OTHER}, None, 1, CASE_INSENSITIVE),
+        ("friends.follow_user.existing", relationships_collection,
+         {"from_username": VIEWER, "to_username": OTHER}, None, 1, CASE_INSENSITIVE),
+        ("friends.list_following", relationships_collection,
+         {"from_username": VIEWER, "status": "accepted"}, None, 0, None),
+        ("friends.list_followers", relationships_collection,
+         {"to_username": VIEWER, "status": "accepted"}, None, 0, None),
+        ("friends.relationship_status.incoming", relationships_collection,
+         {"from_username": OTHER, "to_username": VIEWER, "status": "pending"},
+         None, 1, CASE_INSENSITIVE),
+        ("friends.friend_notifications", notifications_collection,
+         {"to_username": VIEWER}, [("created_at", -1)], 0, None),
+
+        # ---------- profile.py ----------
+        ("profile.get_my_profile", profiles_collection,
+         {"username": VIEWER}, None, 1, CASE_INSENSITIVE),
+
+        # ---------- auth.py ----------
+        ("auth.login", users_collection,
+         {"email": f"{VIEWER}@example.com", **LIVE}, None, 1, CASE_INSENSITIVE),
+    ]
+
+
+# ======================
+# PLAN INSPECTION
+# ======================
+
+def plan_stages(node):
+    """Yield every stage name in a (classic or SBE) winning plan tree."""
+    if not isinstance(node, dict):
+        return
+    if "stage" in node:
+        yield node["stage"]
+    for key in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+        if key in node:
+            yield from plan_stages(node[key])
+    for child in node.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+async def check(name, collection, query, sort, limit, collation):
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    if collation:
+        cursor = cursor.collation(collation)
+
+    explain = await cursor.explain()
+    stages = set(plan_stages(explain["queryPlanner"]["winningPlan"]))
+    stats = explain["executionStats"]
+    examined = stats["totalDocsExamined"]
+    returned = stats["nReturned"]
+    ratio = examined / max(returned, 1)
+
+    problems = []
+    for stage in sorted(stages & BAD_STAGES):
+        problems.append(stage)
+    if ratio > MAX_EXAMINED_RATIO:
+        problems.append(f"examined/returned={examined}/{returned}")
+
+    return problems, stages, ratio
+
+
+async def main() -> int:
+    if not DB_NAME.endswith(SCRATCH_SUFFIX):
+        print(f"refusing to drop {DB_NAME!r}: DB_NAME must end with {SCRATCH_SUFFIX!r}")
+        return 2
+
+    await db.client.drop_database(DB_NAME)
+    await init_indexes()
+    posts = await seed()
+
+    failures = 0
+    for spec in hot_queries(posts):
+        problems, stages, ratio = await check(*spec)
+        status = "FAIL" if problems else "ok"
+        print(f"{status:4}  {spec[0]:40} ratio={ratio:5.2f}  {','.join(sorted(stages))}")
+        for problem in problems:
+            print(f"      -> {problem}")
+        failures += bool(problems)
+
+    await db.client.drop_database(DB_NAME)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,99 @@
+import math
+import os
+from datetime import datetime, timedelta
+
+# ======================
+# TOP FEED SCORE
+# ======================
+# score = log10(max(engagement, 1)) + created_at / DECAY
+# engagement = likes + 2 comments + 3 shares + VIEW_WEIGHT unique viewers
+#
+# Adding age instead of dividing by it keeps the ordering between two posts
+# fixed over time, so the score only changes when a counter changes and
+# can be stored on the post and served from the (score, _id) index. Every
+# DECAY of age is worth 10x the engagement.
+
+RANK_DECAY_MS = float(os.getenv("RANK_DECAY_HOURS", "12")) * 3600 * 1000
+
+LIKE_WEIGHT = 1
+COMMENT_WEIGHT = 2
+SHARE_WEIGHT = 3
+# Unique viewers are estimated (main.views) and far more numerous.
+VIEW_WEIGHT = float(os.getenv("RANK_VIEW_WEIGHT", "0.1"))
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def epoch_ms(dt: datetime) -> int:
+    # BSON dates are millisecond precision; match what Mongo stores.
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
+def post_score(
+    like_count: int,
+    comment_count: int,
+    share_count: int,
+    created_at: datetime,
+    view_count: int = 0,
+) -> float:
+    engagement = (
+        LIKE_WEIGHT * like_count
+        + COMMENT_WEIGHT * comment_count
+        + SHARE_WEIGHT * share_count
+        + VIEW_WEIGHT * view_count
+    )
+    return math.log10(max(engagement, 1)) + epoch_ms(created_at) / RANK_DECAY_MS
+
+
+def _count(field: str) -> dict:
+    return {"$ifNull": [f"${field}", 0]}
+
+
+SCORE_EXPR = {
+    "$add": [
+        {"$log10": {"$max": [
+            {"$add": [
+                {"$multiply": [LIKE_WEIGHT, _count("like_count")]},
+                {"$multiply": [COMMENT_WEIGHT, _count("comment_count")]},
+                {"$multiply": [SHARE_WEIGHT, _count("share_count")]},
+                {"$multiply": [VIEW_WEIGHT, _count("view_count")]},
+            ]},
+            1,
+        ]}},
+        {"$divide": [{"$toLong": "$created_at"}, RANK_DECAY_MS]},
+    ]
+}
+
+
+def inc_counter(field: str, delta: int) -> list:
+    """
+    Pipeline update equivalent to {"$inc": {field: delta}} that also
+    rescores the post, in the same single-document write.
+    """
+    return [
+        {"$set": {field: {"$add": [_count(field), delta]}}},
+        {"$set": {"score": SCORE_EXPR}},
+    ]
+
+
+async def backfill_scores(posts_collection) -> int:
+    """Score posts written before ranking existed. Cheap once done."""
+    result = await posts_collection.update_many(
+        {"score": {"$exists": False}},
+        [{"$set": {"score": SCORE_EXPR}}],
+    )
+    return result.modified_count
+
+
+# ======================
+# KEYSET CURSOR
+# ======================
+
+def encode_cursor(score: float, post_id: str) -> str:
+    return f"{score!r}_{post_id}"
+
+
+def decode_cursor(cursor: str):
+    """Returns (score, post_id) or raises ValueError."""
+    score, _, post_id = cursor.partition("_")
+    return float(score), post_id
@@ -0,0 +1,222 @@
+import math
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import Depends, HTTPException, Request, status
+
+from main.database import client_options
+from main.deps import get_current_user
+from main.metrics import registry, pool_listener
+from main.breaker import breaker
+
+# ======================
+# CONFIG
+# ======================
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# route name -> (tokens per second, burst)
+LIMITS = {
+    "create_post": (0.2, 5),
+    "like": (2.0, 20),
+    "comment": (0.5, 10),
+    "share": (0.5, 10),
+    "follow": (0.5, 20),
+    # Unauthenticated, per client address: both tell whether an email is
+    # registered, so they are throttled against enumeration.
+    "available": (1.0, 20),
+    "signup": (0.1, 5),
+}
+
+MAX_INFLIGHT_REQUESTS = int(os.getenv("MAX_INFLIGHT_REQUESTS", "512"))
+
+# Reads that can answer from the last-known-good cache while the Mongo
+# breaker is open (see main.breaker.stale_read); everything else fails fast.
+STALE_OK = {
+    ("GET", "/posts"),
+    ("GET", "/profile/me"),
+    ("GET", "/friends/following"),
+    # Falls back to an identity-only bootstrap (see main.pages).
+    ("GET", "/home"),
+}
+# Pages served straight from static/ (see main.app): no Mongo behind
+# them, so neither the pool nor the breaker is a reason to refuse them.
+STATIC_PAGES = {"/", "/profile", "/users", "/friends-list", "/notifications", "/signup", "/login"}
+# Per server address: the driver keeps one pool of this size per server.
+# 0 means unbounded: there is no pool limit to shed at.
+MONGO_POOL_SIZE = client_options()["maxPoolSize"]
+
+# Idle buckets refill to full and carry no information, so they are
+# dropped once the table grows past this many entries. If that isn't
+# enough (every bucket active), the least recently used are evicted down
+# to 90%: the table stays bounded, at the cost of a fresh burst for keys
+# that have been quiet longest, never for one being throttled right now.
+MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+rejections = registry.counter(
+    "wire_admission_rejections_total",
+    "Requests turned away by rate limits or load shedding",
+    ("reason",),
+)
+
+
+# ======================
+# TOKEN BUCKETS
+# ======================
+
+class Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class TokenBuckets:
+    """One bucket per (username or client address, route); two floats each."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        # Least recently used first, so eviction never resets a busy key.
+        self.buckets: "OrderedDict[str, Bucket]" = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """Consume a token. Returns 0 on success, else seconds until one is free."""
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= MAX_BUCKETS:
+                self.prune(now)
+            if len(self.buckets) >= MAX_BUCKETS:
+                self.evict(MAX_BUCKETS * 9 // 10)
+            bucket = self.buckets[key] = Bucket(self.burst, now)
+        else:
+            self.buckets.move_to_end(key)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+    def prune(self, now: float):
+        full_after = self.burst / self.rate
+        self.buckets = OrderedDict(
+            (k, b) for k, b in self.buckets.items() if now - b.updated < full_after
+        )
+
+    def evict(self, keep: int):
+        """Drop the least recently used buckets until `keep` remain."""
+        while len(self.buckets) > keep:
+            self.buckets.popitem(last=False)
+
+
+_buckets = {name: TokenBuckets(rate, burst) for name, (rate, burst) in LIMITS.items()}
+
+
+def rate_limit(name: str):
+    """
+    Dependency for write endpoints:
+
+        @router.post("/{post_id}/like", dependencies=[Depends(rate_limit("like"))])
+    """
+    buckets = _buckets[name]
+
+    def check(user=Depends(get_current_user)):
+        _take(buckets, user["username"])
+
+    return check
+
+
+def rate_limit_ip(name: str):
+    """
+    Same, keyed by client address, for endpoints used before login:
+
+        @router.get("/available", dependencies=[Depends(rate_limit_ip("available"))])
+    """
+    buckets = _buckets[name]
+
+    def check(request: Request):
+        # The peer, or the X-Forwarded-For client when the peer is in
+        # FORWARDED_ALLOW_IPS (main.__main__). An untrusted load balancer
+        # would put every client in its one bucket.
+        _take(buckets, request.client.host if request.client else "")
+
+    return check
+
+
+def _take(buckets: TokenBuckets, key: str):
+    if not RATE_LIMIT_ENABLED:
+        return
+    wait = buckets.take(key)
+    if wait:
+        rejections.inc("rate_limit")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+
+# ======================
+# LOAD SHEDDING
+# ======================
+
+SHED_EXEMPT = ("/healthz", "/readyz", "/metrics", "/static")
+
+
+class AdmissionMiddleware:
+    """
+    Rejects API requests up front (503 + Retry-After) when the process
+    already has MAX_INFLIGHT_REQUESTS in flight, every connection to a Mongo server
+    is checked out, or the Mongo circuit breaker is open, instead of
+    queueing them behind the driver pool or server selection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.inflight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(SHED_EXEMPT):
+            await self.app(scope, receive, send)
+            return
+
+        reason = None
+        uses_mongo = scope["path"] not in STATIC_PAGES
+        if self.inflight >= MAX_INFLIGHT_REQUESTS:
+            reason = "inflight"
+        elif uses_mongo and MONGO_POOL_SIZE and pool_listener.busiest() >= MONGO_POOL_SIZE:
+            reason = "mongo_pool"
+        elif (
+            uses_mongo
+            and breaker.is_open()
+            and (scope["method"], scope["path"]) not in STALE_OK
+            and not breaker.allow()
+        ):
+            reason = "breaker"
+
+        if reason:
+            rejections.inc(reason)
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", b"1"),
+                ],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": b'{"detail":"Server busy, retry shortly"}',
+            })
+            return
+
+        self.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.inflight -= 1
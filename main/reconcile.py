@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+from main.database import (
+    posts_collection,
+    post_likes_collection,
+    post_comments_collection,
+    schema_meta_collection,
+)
+from main.log import get_logger
+from main.metrics import registry
+from main.ranking import SCORE_EXPR
+
+logger = get_logger("reconcile")
+
+# ======================
+# CONFIG
+# ======================
+
+RECONCILE_INTERVAL_SECONDS = float(os.getenv("RECONCILE_INTERVAL_SECONDS", "300"))
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "500"))
+# Fraction of wall time the reconciler may spend in Mongo; it sleeps the
+# rest. 0.1 means at most ~10% of one connection's worth of work.
+RECONCILE_DUTY_CYCLE = min(max(float(os.getenv("RECONCILE_DUTY_CYCLE", "0.1")), 0.01), 1.0)
+
+CHECKPOINT_ID = "reconcile:counters"
+
+# counter field -> collection of per-post documents that are the truth
+SOURCES = {
+    "like_count": post_likes_collection,
+    "comment_count": post_comments_collection,
+}
+
+checked_total = registry.counter(
+    "wire_reconcile_posts_checked_total",
+    "Posts whose counters the reconciler recounted",
+)
+fixed_total = registry.counter(
+    "wire_reconcile_fixed_total",
+    "Counters the reconciler found drifted and rewrote",
+    ("field",),
+)
+
+
+# ======================
+# RECOUNT
+# ======================
+
+async def recount(source, post_ids: List) -> Dict:
+    """post_id -> count, one $group over the post_id index for the whole chunk."""
+    pipeline = [
+        {"$match": {"post_id": {"$in": post_ids}}},
+        {"$group": {"_id": "$post_id", "n": {"$sum": 1}}},
+    ]
+    return {d["_id"]: d["n"] async for d in source.aggregate(pipeline)}
+
+
+async def reconcile_chunk(after_id) -> tuple:
+    """
+    Returns (last _id seen, posts checked). Posts are read before their
+    children are counted, and fixes are conditional on the counters still
+    holding the values read, so a like landing mid-check is never undone;
+    that post is simply rechecked next pass.
+    """
+    query = {"_id": {"$gt": after_id}} if after_id else {}
+    posts = await (
+        posts_collection
+        .find(query, {"like_count": 1, "comment_count": 1})
+        .sort("_id", 1)
+        .limit(RECONCILE_BATCH_SIZE)
+        .to_list(RECONCILE_BATCH_SIZE)
+    )
+    if not posts:
+        return None, 0
+
+    ids = [p["_id"] for p in posts]
+    actual = {
+        field: await recount(source, ids)
+        for field, source in SOURCES.items()
+    }
+
+    ops = []
+    for p in posts:
+        drift = {}
+        for field in SOURCES:
+            true_count = actual[field].get(p["_id"], 0)
+            if p.get(field, 0) != true_count:
+                drift[field] = true_count
+        if not drift:
+            continue
+        for field in drift:
+            fixed_total.inc(field)
+        ops.append(UpdateOne(
+            # None also matches a missing field.
+            {"_id": p["_id"], **{f: p.get(f) for f in SOURCES}},
+            [{"$set": drift}, {"$set": {"score": SCORE_EXPR}}],
+        ))
+
+    if ops:
+        await posts_collection.bulk_write(ops, ordered=False)
+
+    checked_total.inc(amount=len(posts))
+    return ids[-1], len(posts)
+
+
+# ======================
+# JOB
+# ======================
+
+async def reconcile_counters():
+    """
+    Periodic job: continue from the checkpoint, chunk by chunk, for at
+    most one interval (the job lease is two), then yield to the next run.
+    Reaching the end of posts starts a new pass from the beginning.
+    """
+    marker = await schema_meta_collection.find_one({"_id": CHECKPOINT_ID}) or {}
+    after_id = marker.get("after_id")
+    deadline = time.monotonic() + RECONCILE_INTERVAL_SECONDS
+
+    checked = 0
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        last_id, n = await reconcile_chunk(after_id)
+        busy = time.monotonic() - started
+
+        after_id = last_id
+        checked += n
+        update = {"after_id": after_id, "updated_at": datetime.utcnow()}
+        if last_id is None:
+            update["pass_completed_at"] = update["updated_at"]
+        await schema_meta_collection.update_one(
+            {"_id": CHECKPOINT_ID}, {"$set": update}, upsert=True
+        )
+        if last_id is None:
+            break
+
+        await asyncio.sleep(busy * (1 - RECONCILE_DUTY_CYCLE) / RECONCILE_DUTY_CYCLE)
+
+    logger.info(
+        "counters_reconciled",
+        extra={"fields": {"checked": checked, "resume_after": str(after_id) if after_id else None}},
+    )
@@ -0,0 +1,284 @@
+import math
+import os
+import re
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+
+from main.deps import get_current_user
+from main.follow_graph import graph
+from main.database import post_likes_collection, posts_collection, LIVE
+from main.ranking import EPOCH, encode_cursor, decode_cursor, epoch_ms
+
+router = APIRouter(prefix="/posts", tags=["Search"])
+
+# ======================
+# HASHTAGS
+# ======================
+# Extracted once on create_post into a lowercase `hashtags` array, which
+# the multikey (hashtags, created_at, _id) index serves directly.
+
+MAX_HASHTAGS = int(os.getenv("SEARCH_MAX_HASHTAGS", "30"))
+# Text search ranks at most this many matches per query (see
+# search_pipeline): results for common terms are approximate.
+SEARCH_MAX_MATCHES = int(os.getenv("SEARCH_MAX_MATCHES", "1000"))
+HASHTAG_PATTERN = r"#([A-Za-z0-9_]{1,64})"
+HASHTAG_RE = re.compile(HASHTAG_PATTERN)
+
+# Same extraction as a Mongo expression, for posts that predate it.
+HASHTAGS_EXPR = {
+    "$slice": [
+        {"$setUnion": [{"$map": {
+            "input": {"$regexFindAll": {"input": "$content", "regex": HASHTAG_PATTERN}},
+            "in": {"$toLower": {"$arrayElemAt": ["$$this.captures", 0]}},
+        }}]},
+        MAX_HASHTAGS,
+    ]
+}
+
+
+def extract_hashtags(content: str) -> List[str]:
+    return sorted({t.lower() for t in HASHTAG_RE.findall(content)})[:MAX_HASHTAGS]
+
+
+async def backfill_hashtags(posts_collection) -> int:
+    result = await posts_collection.update_many(
+        {"hashtags": {"$exists": False}},
+        [{"$set": {"hashtags": HASHTAGS_EXPR}}],
+    )
+    return result.modified_count
+
+
+# ======================
+# RESULTS
+# ======================
+
+def comment_previews(post: dict) -> List[dict]:
+    """The post's embedded newest comments (see feed.add_comment), oldest first."""
+    return [
+        {
+            "id": str(c["id"]),
+            "author": c["author"],
+            "text": c["text"],
+            "created_at": c["created_at"],
+        }
+        for c in post.get("recent_comments", [])
+    ]
+
+
+async def serialize(posts: List[dict], viewer: str, cursor_of) -> List[dict]:
+    """
+    Feed-shaped items, likes in one query. Callers pass only posts the
+    viewer may see (collect_visible, or an author already checked).
+    """
+    liked = {
+        d["post_id"] async for d in post_likes_collection.find(
+            {"post_id": {"$in": [p["_id"] for p in posts]}, "username": viewer},
+            {"_id": 0, "post_id": 1},
+        )
+    } if posts else set()
+
+    return [
+        {
+            "id": str(p["_id"]),
+            "author": p["author"],
+            "content": p["content"],
+            "created_at": p["created_at"],
+            "like_count": p.get("like_count", 0),
+            "comment_count": p.get("comment_count", 0),
+            "share_count": p.get("share_count", 0),
+            "view_count": p.get("view_count", 0),
+            "recent_comments": comment_previews(p),
+            "liked": p["_id"] in liked,
+            "cursor": cursor_of(p),
+        }
+        for p in posts
+    ]
+
+
+# Page-level continuation for keyset-paged lists: absent on the last page.
+NEXT_CURSOR_HEADER = "X-Wire-Next-Cursor"
+
+# Rows a page may scan past hidden private authors. Past that it returns
+# short (even empty) with a next cursor, so one viewer's page costs at
+# most this much however many private accounts exist.
+VISIBLE_SCAN_MAX = int(os.getenv("VISIBLE_SCAN_MAX", "200"))
+
+
+async def collect_visible(
+    viewer: str,
+    limit: int,
+    fetch: Callable[[Optional[object], int], Awaitable[list]],
+    author: Callable = itemgetter("author"),
+) -> Tuple[list, Optional[object]]:
+    """
+    Fill a page with rows `viewer` may see. `fetch(last, n)` returns up to
+    n rows after row `last` (None: from the page's start) in page order.
+    Returns (visible rows, last row scanned), the latter None at the end;
+    the next page's cursor comes from it, never from a visible row, so
+    hidden rows are not rescanned and never end paging early.
+    """
+    rows: list = []
+    last = None
+    scanned = 0
+    while scanned < VISIBLE_SCAN_MAX:
+        batch = await fetch(last, limit)
+        scanned += len(batch)
+        await graph.resolve(author(r) for r in batch)
+        for r in batch:
+            last = r
+            if graph.can_see(viewer, author(r)):
+                rows.append(r)
+                if len(rows) == limit:
+                    return rows, last
+        if len(batch) < limit:
+            return rows, None
+    return rows, last
+
+
+def keyset_after(field: str, value, last_id: ObjectId) -> dict:
+    """Filter for rows after (value, _id) in ({field: -1, _id: -1}) order."""
+    return {"$or": [
+        {field: {"$lt": value}},
+        {field: value, "_id": {"$lt": last_id}},
+    ]}
+
+
+def parse_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        value, last_id = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if not math.isfinite(value) or not ObjectId.is_valid(last_id):
+        raise HTTPException(400, "Invalid cursor")
+    return value, ObjectId(last_id)
+
+
+def parse_time_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, ObjectId]]:
+    """(created_at, _id) of a cursor written as encode_cursor(epoch_ms(...), id)."""
+    after = parse_cursor(cursor)
+    if not after:
+        return None
+    created_ms, last_id = after
+    if created_ms != int(created_ms):
+        raise HTTPException(400, "Invalid cursor")
+    try:
+        return EPOCH + timedelta(milliseconds=int(created_ms)), last_id
+    except OverflowError:
+        raise HTTPException(400, "Invalid cursor")
+
+
+# ======================
+# FULL TEXT
+# ======================
+
+def search_pipeline(q: str, after, limit: int) -> list:
+    """
+    Relevance can't come from an index, so every page scores and top-k
+    sorts its candidates. Capping them at SEARCH_MAX_MATCHES bounds that
+    work for common terms, at a price: the cap takes whichever matches
+    the text index yields first, not the best ones, so such a query ranks
+    an arbitrary sample, and writes between pages can change the sample
+    (a later page may skip or repeat a post). Queries with fewer matches
+    than the cap are ranked exactly.
+    """
+    pipeline = [
+        {"$match": {"$text": {"$search": q}, **LIVE}},
+        {"$limit": SEARCH_MAX_MATCHES},
+        {"$addFields": {"rank": {"$meta": "textScore"}}},
+    ]
+    if after:
+        rank, last_id = after
+        pipeline.append({"$match": {"$or": [
+            {"rank": {"$lt": rank}},
+            {"rank": rank, "_id": {"$lt": last_id}},
+        ]}})
+    pipeline += [
+        {"$sort": {"rank": -1, "_id": -1}},
+        {"$limit": limit},
+    ]
+    return pipeline
+
+
+def rank_cursor(post: dict) -> str:
+    return encode_cursor(post["rank"], str(post["_id"]))
+
+
+def time_cursor(post: dict) -> str:
+    return encode_cursor(epoch_ms(post["created_at"]), str(post["_id"]))
+
+
+@router.get("/search")
+async def search_posts(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user),
+):
+    """
+    Ranked by text relevance, then newest first. Pass the
+    X-Wire-Next-Cursor response header back as `cursor`; it is absent on
+    the last page.
+    """
+    start = parse_cursor(cursor)
+
+    async def fetch(last, n):
+        after = (last["rank"], last["_id"]) if last else start
+        return await posts_collection.aggregate(search_pipeline(q, after, n)).to_list(n)
+
+    viewer = user["username"]
+    posts, last = await collect_visible(viewer, limit, fetch)
+    if last:
+        response.headers[NEXT_CURSOR_HEADER] = rank_cursor(last)
+    return await serialize(posts, viewer, rank_cursor)
+
+
+# ======================
+# HASHTAG TIMELINE
+# ======================
+
+TAG_ORDER = [("created_at", -1), ("_id", -1)]
+
+
+def tag_query(tag: str, after: Optional[Tuple[datetime, ObjectId]]) -> dict:
+    query = {"hashtags": tag, **LIVE}
+    if after:
+        query.update(keyset_after("created_at", *after))
+    return query
+
+
+@router.get("/tags/{tag}")
+async def hashtag_timeline(
+    response: Response,
+    tag: str,
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user),
+):
+    tag = tag.lstrip("#").lower()
+    if not HASHTAG_RE.fullmatch("#" + tag):
+        raise HTTPException(400, "Invalid hashtag")
+
+    start = parse_time_cursor(cursor)
+
+    async def fetch(last, n):
+        after = (last["created_at"], last["_id"]) if last else start
+        return await (
+            posts_collection
+            .find(tag_query(tag, after))
+            .sort(TAG_ORDER)
+            .limit(n)
+            .to_list(n)
+        )
+
+    viewer = user["username"]
+    posts, last = await collect_visible(viewer, limit, fetch)
+    if last:
+        response.headers[NEXT_CURSOR_HEADER] = time_cursor(last)
+    return await serialize(posts, viewer, time_cursor)
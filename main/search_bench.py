@@ -0,0 +1,128 @@
+"""
+Search benchmark at realistic scale.
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=wire_bench \\
+        python -m main.search_bench [posts]
+
+Seeds `posts` synthetic posts (default 2,000,000) into a scratch database,
+builds the real indexes, then times /posts/search and /posts/tags/{tag}
+queries (first page and a cursor page) and prints p50/p95 latency with
+the documents examined per page. The scratch database is dropped at the end.
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+SCRATCH_SUFFIX = "_bench"
+
+os.environ.setdefault("DB_NAME", "wire" + SCRATCH_SUFFIX)
+
+from main.database import db, DB_NAME, init_indexes, posts_collection  # noqa: E402
+from main.search import search_pipeline, tag_query, TAG_ORDER, extract_hashtags  # noqa: E402
+from main.ranking import post_score  # noqa: E402
+
+SEED_BATCH = 10000
+VOCABULARY = 20000
+TAGS = 2000
+RUNS = 50
+PAGE = 20
+
+
+def _word(rng: random.Random, n: int) -> str:
+    # Zipf-ish: low ranks are much more common, like real text.
+    return f"w{int(n ** rng.random())}"
+
+
+async def seed(total: int):
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    for start in range(0, total, SEED_BATCH):
+        batch = []
+        for i in range(start, min(start + SEED_BATCH, total)):
+            words = [_word(rng, VOCABULARY) for _ in range(rng.randint(5, 40))]
+            words += [f"#t{int(TAGS ** rng.random())}" for _ in range(rng.randint(0, 3))]
+            content = " ".join(words)
+            created = now - timedelta(seconds=i)
+            batch.append({
+                "author": f"user{i % 5000:04d}",
+                "content": content,
+                "created_at": created,
+                "like_count": 0,
+                "comment_count": 0,
+                "share_count": 0,
+                "score": post_score(0, 0, 0, created),
+                "hashtags": extract_hashtags(content),
+            })
+        await posts_collection.insert_many(batch, ordered=False)
+        print(f"\rseeded {start + len(batch)}/{total}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+
+def _pct(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+
+async def bench(name, run):
+    timings = []
+    for i in range(RUNS):
+        started = time.perf_counter()
+        await run(i)
+        timings.append(time.perf_counter() - started)
+    print(f"{name:28} p50={_pct(timings, .5):7.2f}ms  p95={_pct(timings, .95):7.2f}ms")
+
+
+async def main(total: int) -> int:
+    if not DB_NAME.endswith(SCRATCH_SUFFIX):
+        print(f"refusing to drop {DB_NAME!r}: DB_NAME must end with {SCRATCH_SUFFIX!r}")
+        return 2
+
+    await db.client.drop_database(DB_NAME)
+    await seed(total)
+    started = time.perf_counter()
+    await init_indexes()
+    print(f"indexes built in {time.perf_counter() - started:.1f}s")
+
+    terms = ["w3", "w50 w51", "w1500", "w19999"]
+    tags = ["t1", "t40", "t1500"]
+
+    async def text_page(i, second=False):
+        q = terms[i % len(terms)]
+        posts = await posts_collection.aggregate(search_pipeline(q, None, PAGE)).to_list(PAGE)
+        if second and posts:
+            last = posts[-1]
+            await posts_collection.aggregate(
+                search_pipeline(q, (last["rank"], last["_id"]), PAGE)
+            ).to_list(PAGE)
+
+    async def tag_page(i, second=False):
+        tag = tags[i % len(tags)]
+        posts = await posts_collection.find(tag_query(tag, None)).sort(TAG_ORDER).limit(PAGE).to_list(PAGE)
+        if second and posts:
+            last = posts[-1]
+            await posts_collection.find(
+                tag_query(tag, (last["created_at"], last["_id"]))
+            ).sort(TAG_ORDER).limit(PAGE).to_list(PAGE)
+
+    await bench("search (page 1)", text_page)
+    await bench("search (pages 1+2)", lambda i: text_page(i, True))
+    await bench("tag timeline (page 1)", tag_page)
+    await bench("tag timeline (pages 1+2)", lambda i: tag_page(i, True))
+
+    for tag in tags:
+        plan = await posts_collection.find(tag_query(tag, None)).sort(TAG_ORDER).limit(PAGE).explain()
+        stats = plan["executionStats"]
+        print(f"tag {tag:6} examined={stats['totalDocsExamined']} returned={stats['nReturned']}")
+
+    await db.client.drop_database(DB_NAME)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)))
@@ -3,6 +3,7 @@ from argon2.exceptions import VerifyMismatchError
 from jose import jwt, JWTError, ExpiredSignatureError
 from datetime import datetime, timedelta
 import os
+import uuid
 
 # -------------------------
 # Password hashing
@@ -27,27 +28,48 @@ def verify_password(password: str, hashed: str) -> bool:
 # -------------------------
 SECRET_KEY = os.getenv("JWT_SECRET", "dev-secret")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Access tokens are short-lived and checked against the in-memory
+# denylist (main.sessions); refresh tokens rotate on every use.
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+
+ACCESS_TOKEN_TTL = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+REFRESH_TOKEN_TTL = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
 
 # -------------------------
 # JWT creation
 # -------------------------
-def create_access_token(data: dict) -> str:
+def _create_token(data: dict, kind: str, lifetime: timedelta) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode["exp"] = expire
+    to_encode["type"] = kind
+    to_encode["jti"] = uuid.uuid4().hex
+    to_encode["exp"] = datetime.utcnow() + lifetime
 
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def create_access_token(data: dict) -> str:
+    return _create_token(data, "access", ACCESS_TOKEN_TTL)
+
+
+def create_refresh_token(data: dict) -> str:
+    return _create_token(data, "refresh", REFRESH_TOKEN_TTL)
+
+
 # -------------------------
 # JWT decoding
 # -------------------------
-def decode_token(token: str) -> dict:
+def decode_token(token: str, kind: str = "access") -> dict:
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except ExpiredSignatureError:
         raise ValueError("Token expired")
     except JWTError:
-        raise ValueError("Invalid token")
\ No newline at end of file
+        raise ValueError("Invalid token")
+
+    # A refresh token must never pass as an access token (and vice
+    # versa); tokens from before revocation existed have no jti.
+    if payload.get("type") != kind or "jti" not in payload:
+        raise ValueError("Invalid token")
+    return payload
@@ -1,8 +1,11 @@
 from main.ws_manager import manager  # SAME INSTANCE
+from main.log import get_logger
+
+logger = get_logger("post_events")
 
 async def broadcast_new_post(post: dict):
-    print("📢 broadcasting to", len(manager.active), "clients")
-    await manager.broadcast({
-        "type": "new_post",
-        "post": post
-    })
\ No newline at end of file
+    logger.info(
+        "publish_new_post",
+        extra={"fields": {"post_id": post.get("id"), "clients": len(manager.active)}},
+    )
+    manager.publish_post(post)
\ No newline at end of file
@@ -0,0 +1,206 @@
+import calendar
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from main.database import sessions_collection, revocations_collection
+from main.log import get_logger
+from main.metrics import registry
+from main.security import (
+    create_access_token,
+    create_refresh_token,
+    decode_token,
+    ACCESS_TOKEN_TTL,
+    REFRESH_TOKEN_TTL,
+)
+
+logger = get_logger("sessions")
+
+# ======================
+# CONFIG
+# ======================
+
+DENYLIST_SYNC_SECONDS = float(os.getenv("DENYLIST_SYNC_SECONDS", "2"))
+# Re-read this much history on each sync, so a revocation whose
+# created_at lags a concurrent sync (clock skew, slow insert) isn't missed.
+DENYLIST_SYNC_OVERLAP = timedelta(seconds=10)
+# Two tabs refreshing with the same token at once is not theft: the
+# loser of the race gets an access token (and keeps the winner's cookie).
+REFRESH_REUSE_GRACE = timedelta(seconds=int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "30")))
+
+
+# ======================
+# DENYLIST
+# ======================
+# Revoked access-token ids (jti) and session ids (sid), each with the time
+# after which no token it covers can still be valid. A request costs two
+# dict lookups. Revocations go to Mongo and every worker polls for new
+# ones, so a logout reaches the other workers within DENYLIST_SYNC_SECONDS.
+
+class Denylist:
+    def __init__(self):
+        self.entries: Dict[str, float] = {}  # id -> expiry (epoch seconds)
+        self.synced_at: Optional[datetime] = None
+        registry.gauge_callback(
+            "wire_denylist_entries",
+            "Revoked token and session ids held in memory",
+            lambda: len(self.entries),
+        )
+
+    def _revoked(self, token_id: Optional[str], now: float) -> bool:
+        expires = self.entries.get(token_id)
+        return expires is not None and expires > now
+
+    def is_revoked(self, payload: dict) -> bool:
+        now = time.time()
+        return self._revoked(payload.get("jti"), now) or self._revoked(payload.get("sid"), now)
+
+    def add(self, token_id: str, expires_at: datetime):
+        # Naive datetimes (what Motor returns) are UTC.
+        self.entries[token_id] = calendar.timegm(expires_at.utctimetuple())
+
+    def prune(self):
+        now = time.time()
+        for token_id in [k for k, exp in self.entries.items() if exp <= now]:
+            del self.entries[token_id]
+
+    async def revoke(self, token_ids: Iterable[str], expires_at: datetime):
+        now = datetime.utcnow()
+        ids = [t for t in token_ids if t]
+        for token_id in ids:
+            self.add(token_id, expires_at)
+        if ids:
+            await revocations_collection.bulk_write([
+                UpdateOne(
+                    {"_id": token_id},
+                    {"$set": {"expires_at": expires_at, "created_at": now}},
+                    upsert=True,
+                )
+                for token_id in ids
+            ], ordered=False)
+
+    async def sync(self):
+        """Pull revocations made by other workers; the first call loads all."""
+        now = datetime.utcnow()
+        query = {"expires_at": {"$gt": now}}
+        if self.synced_at:
+            query["created_at"] = {"$gt": self.synced_at - DENYLIST_SYNC_OVERLAP}
+
+        async for doc in revocations_collection.find(query):
+            self.add(doc["_id"], doc["expires_at"])
+        self.synced_at = now
+        self.prune()
+
+
+# 🔥 SINGLE GLOBAL INSTANCE
+denylist = Denylist()
+
+
+# ======================
+# SESSIONS
+# ======================
+# One document per login. The refresh token names its session (sid) and
+# the session holds the only refresh jti that may still be used; every
+# refresh swaps it, so a replayed (stolen) refresh token is detected and
+# ends the session.
+
+class SessionError(Exception):
+    pass
+
+
+def _claims(user: dict, sid: str) -> dict:
+    return {"username": user["username"], "email": user.get("email"), "sid": sid}
+
+
+async def open_session(user: dict) -> Tuple[str, str]:
+    """Returns (access_token, refresh_token) for a fresh login."""
+    sid = uuid.uuid4().hex
+    claims = _claims(user, sid)
+    refresh = create_refresh_token(claims)
+    now = datetime.utcnow()
+
+    await sessions_collection.insert_one({
+        "_id": sid,
+        "username": user["username"],
+        "email": user.get("email"),
+        "refresh_jti": decode_token(refresh, "refresh")["jti"],
+        "created_at": now,
+        "expires_at": now + REFRESH_TOKEN_TTL,
+    })
+    return create_access_token(claims), refresh
+
+
+async def refresh_session(refresh_token: str) -> Tuple[str, Optional[str]]:
+    """
+    Rotate: a new access token and a new refresh token (None inside the
+    concurrent-refresh grace window), or SessionError.
+    """
+    try:
+        payload = decode_token(refresh_token, "refresh")
+    except ValueError as e:
+        raise SessionError(str(e))
+
+    sid = payload.get("sid")
+    claims = _claims(payload, sid)
+    refresh = create_refresh_token(claims)
+    now = datetime.utcnow()
+
+    session = await sessions_collection.find_one_and_update(
+        {"_id": sid, "refresh_jti": payload["jti"], "revoked_at": None},
+        {"$set": {
+            "refresh_jti": decode_token(refresh, "refresh")["jti"],
+            "previous_jti": payload["jti"],
+            "refreshed_at": now,
+            "expires_at": now + REFRESH_TOKEN_TTL,
+        }},
+    )
+    if session is not None:
+        return create_access_token(claims), refresh
+
+    # Unknown, revoked, or an already-rotated token. A replay outside the
+    # grace window means the token leaked: end the whole session.
+    session = await sessions_collection.find_one({"_id": sid, "revoked_at": None})
+    if session is None:
+        raise SessionError("Session expired")
+    if (
+        session.get("previous_jti") == payload["jti"]
+        and now - session["refreshed_at"] <= REFRESH_REUSE_GRACE
+    ):
+        return create_access_token(claims), None
+
+    logger.warning("refresh_reuse", extra={"fields": {"username": payload.get("username")}})
+    await revoke_session(sid)
+    raise SessionError("Session expired")
+
+
+async def revoke_user_sessions(username: str):
+    """Every open session of `username` (account deletion)."""
+    now = datetime.utcnow()
+    sids = [
+        s["_id"] async for s in
+        sessions_collection.find({"username": username, "revoked_at": None}, {"_id": 1})
+    ]
+    if sids:
+        await sessions_collection.update_many(
+            {"_id": {"$in": sids}}, {"$set": {"revoked_at": now}}
+        )
+        await denylist.revoke(sids, now + ACCESS_TOKEN_TTL)
+
+
+async def revoke_session(sid: Optional[str], jti: Optional[str] = None):
+    """
+    End a session. Access tokens already issued for it stay valid for at
+    most ACCESS_TOKEN_TTL, so that is how long the denylist keeps the sid.
+    """
+    if not sid and not jti:
+        return
+    now = datetime.utcnow()
+    if sid:
+        await sessions_collection.update_one(
+            {"_id": sid}, {"$set": {"revoked_at": now}}
+        )
+    await denylist.revoke([sid, jti], now + ACCESS_TOKEN_TTL)
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from main.database import (
+    db,
+    posts_collection,
+    post_likes_collection,
+    post_comments_collection,
+    notifications_collection,
+    posts_archive_collection,
+    post_likes_archive_collection,
+    post_comments_archive_collection,
+    LIVE,
+)
+from main.log import get_logger
+
+logger = get_logger("tiering")
+
+# ======================
+# CONFIG
+# ======================
+
+NOTIFICATION_TTL_DAYS = float(os.getenv("NOTIFICATION_TTL_DAYS", "30"))
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "180"))  # 0 disables
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "600"))
+ARCHIVE_PAUSE_SECONDS = float(os.getenv("ARCHIVE_PAUSE_MS", "50")) / 1000
+
+NOTIFICATION_TTL_INDEX = "seen_at_ttl"
+
+
+# ======================
+# NOTIFICATION TTL
+# ======================
+
+async def ensure_notification_ttl():
+    """
+    Seen notifications expire NOTIFICATION_TTL_DAYS after being seen.
+    Unseen ones have no seen_at and never expire. collMod keeps the index
+    when only the expiry changes.
+    """
+    seconds = int(NOTIFICATION_TTL_DAYS * 86400)
+    try:
+        await notifications_collection.create_index(
+            "seen_at",
+            name=NOTIFICATION_TTL_INDEX,
+            expireAfterSeconds=seconds,
+        )
+    except OperationFailure as e:
+        if e.code not in (85, 86):  # IndexOptionsConflict / IndexKeySpecsConflict
+            raise
+        await db.command({
+            "collMod": notifications_collection.name,
+            "index": {"name": NOTIFICATION_TTL_INDEX, "expireAfterSeconds": seconds},
+        })
+
+
+# ======================
+# HOT WINDOW
+# ======================
+
+def archive_cutoff() -> Optional[datetime]:
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return None
+    return datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+
+def is_archived_id(oid: ObjectId) -> bool:
+    """Post ids embed their creation time, so age needs no lookup."""
+    cutoff = archive_cutoff()
+    return cutoff is not None and oid.generation_time < cutoff.replace(tzinfo=timezone.utc)
+
+
+async def raise_missing_post(oid: ObjectId):
+    """404 for unknown posts, 409 for posts that moved to the read-only archive."""
+    if is_archived_id(oid) and await posts_archive_collection.find_one({"_id": oid, **LIVE}, {"_id": 1}):
+        raise HTTPException(409, "Post is archived")
+    raise HTTPException(404, "Post not found")
+
+
+async def archive_fill(query: dict, order, need: int) -> List[dict]:
+    """
+    Continue a chronological feed page into posts_archive once the hot
+    collection is exhausted. `query` carries the page's keyset, which means
+    the same thing in both tiers, so deep pages need no count of the hot
+    one. Pages inside the hot window never touch it.
+    """
+    if need <= 0 or archive_cutoff() is None:
+        return []
+    cursor = (
+        posts_archive_collection
+        .find(query)
+        .sort(order)
+        .limit(need)
+    )
+    return await cursor.to_list(need)
+
+
+# ======================
+# MOVER
+# ======================
+
+async def _copy(target, docs: List[dict]):
+    # Copy before delete; re-running after a crash hits duplicate keys,
+    # which are safe to ignore.
+    try:
+        await target.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+async def _move_children(source, target, post_ids: List[ObjectId]):
+    while True:
+        docs = await (
+            source.find({"post_id": {"$in": post_ids}})
+            .limit(ARCHIVE_BATCH_SIZE)
+            .to_list(ARCHIVE_BATCH_SIZE)
+        )
+        if not docs:
+            return
+        await _copy(target, docs)
+        await source.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        await asyncio.sleep(ARCHIVE_PAUSE_SECONDS)
+
+
+async def archive_batch(cutoff: datetime) -> int:
+    posts = await (
+        posts_collection
+        # Tombstoned posts are left for the deletion cascade.
+        .find({"created_at": {"$lt": cutoff}, **LIVE})
+        .sort("created_at", 1)
+        .limit(ARCHIVE_BATCH_SIZE)
+        .to_list(ARCHIVE_BATCH_SIZE)
+    )
+    if not posts:
+        return 0
+
+    post_ids = [p["_id"] for p in posts]
+    await _copy(posts_archive_collection, posts)
+    await _move_children(post_likes_collection, post_likes_archive_collection, post_ids)
+    await _move_children(post_comments_collection, post_comments_archive_collection, post_ids)
+    await posts_collection.delete_many({"_id": {"$in": post_ids}})
+    return len(posts)
+
+
+async def archive_old_posts():
+    """
+    Periodic job: drain everything older than the cutoff, batch by batch,
+    for at most one interval (the job lease is two); the next run picks
+    up where this one stopped.
+    """
+    cutoff = archive_cutoff()
+    if cutoff is None:
+        return
+    deadline = time.monotonic() + ARCHIVE_INTERVAL_SECONDS
+
+    moved = 0
+    while time.monotonic() < deadline:
+        n = await archive_batch(cutoff)
+        if not n:
+            break
+        moved += n
+        await asyncio.sleep(ARCHIVE_PAUSE_SECONDS)
+
+    if moved:
+        logger.info("posts_archived", extra={"fields": {"posts": moved}})
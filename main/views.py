@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import math
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import Binary, ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from main.database import posts_collection, post_views_collection
+from main.log import get_logger
+from main.metrics import registry
+from main.ranking import SCORE_EXPR
+
+logger = get_logger("views")
+
+# ======================
+# CONFIG
+# ======================
+
+# 2^p one-byte registers per post: 12 -> 4 KB, ~1.6% standard error.
+# Changing it resets stored sketches (registers of different sizes can't
+# be merged).
+VIEWS_HLL_PRECISION = min(max(int(os.getenv("VIEWS_HLL_PRECISION", "12")), 4), 16)
+VIEWS_FLUSH_SECONDS = float(os.getenv("VIEWS_FLUSH_SECONDS", "30"))
+# Posts with unflushed impressions per worker; reaching it flushes early.
+VIEWS_MAX_PENDING = int(os.getenv("VIEWS_MAX_PENDING", "5000"))
+VIEWS_FLUSH_BATCH = int(os.getenv("VIEWS_FLUSH_BATCH", "50"))
+VIEWS_MERGE_RETRIES = 5
+
+REGISTERS = 1 << VIEWS_HLL_PRECISION
+_RANK_BITS = 64 - VIEWS_HLL_PRECISION
+_INVERSE_POWERS = [2.0 ** -r for r in range(_RANK_BITS + 2)]
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+recorded_total = registry.counter(
+    "wire_views_recorded_total",
+    "Post impressions added to in-memory sketches",
+)
+conflicts_total = registry.counter(
+    "wire_views_merge_conflicts_total",
+    "Sketch merges retried because another worker wrote first",
+)
+
+
+# ======================
+# HYPERLOGLOG
+# ======================
+# Each viewer hashes to one register and a rank (leading zeros + 1 of
+# the remaining hash bits); a register keeps the highest rank it has
+# seen. Registers only ever grow, so two sketches merge by taking the
+# byte-wise max: each worker's impressions combine exactly, whatever the
+# order, and a viewer counted by two workers is still counted once.
+
+def viewer_hash(viewer: str) -> int:
+    return int.from_bytes(hashlib.blake2b(viewer.encode(), digest_size=8).digest(), "big")
+
+
+def position(h: int) -> Tuple[int, int]:
+    """(register index, rank) of a 64-bit hash."""
+    rest = h & ((1 << _RANK_BITS) - 1)
+    return h >> _RANK_BITS, _RANK_BITS - rest.bit_length() + 1
+
+
+def merge(a: bytes, b: bytes) -> bytes:
+    return bytes(map(max, a, b))
+
+
+def estimate(registers: bytes) -> int:
+    raw = _ALPHA * REGISTERS * REGISTERS / sum(map(_INVERSE_POWERS.__getitem__, registers))
+    zeros = registers.count(0)
+    if raw <= 2.5 * REGISTERS and zeros:
+        # Small cardinalities: linear counting is far more accurate.
+        return round(REGISTERS * math.log(REGISTERS / zeros))
+    return round(raw)
+
+
+# ======================
+# PER-WORKER SKETCHES
+# ======================
+
+class ViewCounter:
+    def __init__(self):
+        self.pending: Dict[str, bytearray] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        registry.gauge_callback(
+            "wire_views_pending_posts",
+            "Posts with impressions not yet merged into Mongo",
+            lambda: len(self.pending),
+        )
+
+    def record(self, viewer: str, posts: Iterable[dict]):
+        """Impressions of one feed page: one register write per post."""
+        index, rank = position(viewer_hash(viewer))
+        n = 0
+        for p in posts:
+            if p["author"] == viewer:
+                continue
+            registers = self.pending.get(p["id"])
+            if registers is None:
+                registers = self.pending[p["id"]] = bytearray(REGISTERS)
+            if registers[index] < rank:
+                registers[index] = rank
+            n += 1
+        if n:
+            recorded_total.inc(amount=n)
+        if len(self.pending) >= VIEWS_MAX_PENDING and not self._flush_task:
+            self._flush_task = asyncio.create_task(self._flush_early())
+
+    async def _flush_early(self):
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("views_flush_failed")
+        finally:
+            self._flush_task = None
+
+    def _requeue(self, post_id: str, registers: bytes):
+        current = self.pending.get(post_id)
+        self.pending[post_id] = bytearray(merge(current, registers) if current else registers)
+
+    # ---------- MERGE INTO MONGO ----------
+
+    async def flush(self):
+        """Periodic job (every worker): merge this worker's sketches."""
+        pending, self.pending = self.pending, {}
+        items = [(k, bytes(v)) for k, v in pending.items() if ObjectId.is_valid(k)]
+        failed = 0
+        for start in range(0, len(items), VIEWS_FLUSH_BATCH):
+            batch = items[start:start + VIEWS_FLUSH_BATCH]
+            try:
+                await self._flush_batch(batch)
+            except Exception:
+                # Merging is idempotent (register-wise max), so the whole
+                # batch goes back even if part of it was written.
+                logger.exception("views_flush_batch_failed", extra={"fields": {"posts": len(batch)}})
+                for post_id, registers in batch:
+                    self._requeue(post_id, registers)
+                failed += len(batch)
+        if items:
+            logger.info("views_flushed", extra={"fields": {"posts": len(items) - failed, "requeued": failed}})
+
+    async def _flush_batch(self, items: List[Tuple[str, bytes]]):
+        oids = [ObjectId(k) for k, _ in items]
+        stored = {
+            d["_id"]: d async for d in post_views_collection.find({"_id": {"$in": oids}})
+        }
+        counts = await asyncio.gather(*(
+            self._merge_one(oid, registers, stored.get(oid))
+            for oid, (_, registers) in zip(oids, items)
+        ), return_exceptions=True)
+
+        ops = []
+        for oid, (post_id, registers), count in zip(oids, items, counts):
+            if isinstance(count, Exception) or count is None:
+                # Keep the impressions for the next flush.
+                self._requeue(post_id, registers)
+                continue
+            ops.append(UpdateOne(
+                {"_id": oid},
+                # $max: a worker holding an older merge must not lower it.
+                [
+                    {"$set": {"view_count": {"$max": [{"$ifNull": ["$view_count", 0]}, count]}}},
+                    {"$set": {"score": SCORE_EXPR}},
+                ],
+            ))
+        if ops:
+            await posts_collection.bulk_write(ops, ordered=False)
+
+    async def _merge_one(self, oid: ObjectId, registers: bytes, doc: Optional[dict]) -> Optional[int]:
+        """
+        Read-merge-write guarded by a version number: the registers are
+        opaque bytes, so Mongo can't take the max itself. Returns the new
+        estimate, or None after repeated conflicts.
+        """
+        for _ in range(VIEWS_MERGE_RETRIES):
+            now = datetime.utcnow()
+            if doc is None or doc.get("p") != VIEWS_HLL_PRECISION:
+                count = estimate(registers)
+                body = {
+                    "p": VIEWS_HLL_PRECISION,
+                    "registers": Binary(registers),
+                    "count": count,
+                    "updated_at": now,
+                }
+                if doc is None:
+                    try:
+                        await post_views_collection.insert_one({"_id": oid, "v": 1, **body})
+                        return count
+                    except DuplicateKeyError:
+                        pass
+                else:
+                    result = await post_views_collection.update_one(
+                        {"_id": oid, "v": doc["v"]},
+                        {"$set": {**body, "v": doc["v"] + 1}},
+                    )
+                    if result.modified_count:
+                        return count
+            else:
+                merged = merge(doc["registers"], registers)
+                if merged == doc["registers"]:
+                    return doc["count"]
+                count = estimate(merged)
+                result = await post_views_collection.update_one(
+                    {"_id": oid, "v": doc["v"]},
+                    {"$set": {
+                        "registers": Binary(merged),
+                        "count": count,
+                        "updated_at": now,
+                        "v": doc["v"] + 1,
+                    }},
+                )
+                if result.modified_count:
+                    return count
+
+            conflicts_total.inc()
+            doc = await post_views_collection.find_one({"_id": oid})
+        return None
+
+
+# 🔥 SINGLE GLOBAL INSTANCE
+views = ViewCounter()
+
+
+# ======================
+# ACCURACY BENCH
+# ======================
+# python -m main.views [viewers]
+# Splits the viewers over four "workers" (overlapping), merges their
+# sketches and compares the estimate with the true count. No database.
+
+def _bench(viewers: int):
+    import random
+    import time
+
+    rng = random.Random(7)
+    workers = [bytearray(REGISTERS) for _ in range(4)]
+    started = time.perf_counter()
+    for i in range(viewers):
+        index, rank = position(viewer_hash(f"user{i}"))
+        for w in rng.sample(workers, rng.randint(1, 2)):
+            if w[index] < rank:
+                w[index] = rank
+    per_add = (time.perf_counter() - started) / viewers
+
+    merged = bytes(REGISTERS)
+    for w in workers:
+        merged = merge(merged, w)
+    est = estimate(merged)
+    print(f"registers={REGISTERS} bytes, viewers={viewers}, estimate={est}, "
+          f"error={(est - viewers) / viewers:+.2%}, add={per_add * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    for _n in ([int(sys.argv[1])] if len(sys.argv) > 1 else [10, 1000, 100_000, 1_000_000]):
+        _bench(_n)
@@ -0,0 +1,194 @@
+import json
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+from main.ranking import EPOCH, epoch_ms
+
+# ======================
+# COMPACT WIRE FORMAT
+# ======================
+# Opt-in alternative to the default JSON for feed pages and feed socket
+# frames. Still JSON (the browser's native parser decodes it), but
+# columnar: a page names its columns once, then sends one array per post;
+# authors go in a per-page dictionary and are referenced by index; times
+# are epoch milliseconds instead of ISO strings.
+#
+#   GET /posts           Accept: application/vnd.wire.columnar+json
+#   WS  /ws/feed         Sec-WebSocket-Protocol: wire.columnar.v1
+#
+# Page:  {"v": 1, "cols": [...], "comment_cols": [...], "authors": [...],
+#         "rows": [[id, author_idx, content, created_ms, ...], ...]}
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.wire.columnar+json"
+FEED_SUBPROTOCOL = "wire.columnar.v1"
+COLUMNAR_VERSION = 1
+
+POST_COLUMNS = (
+    "id", "author", "content", "created_at",
+    "like_count", "comment_count", "share_count", "view_count",
+    "liked", "recent_comments", "cursor",
+)
+COMMENT_COLUMNS = ("id", "author", "text", "created_at")
+COUNT_COLUMNS = ("post_id", "like_count", "comment_count", "share_count")
+
+
+def _ms(value) -> int:
+    # new_post events carry created_at already as an ISO string.
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return epoch_ms(value)
+
+
+def dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def accepts_columnar(accept: str) -> bool:
+    return COLUMNAR_MEDIA_TYPE in (accept or "")
+
+
+def encode_posts(posts: Iterable[dict]) -> dict:
+    """Feed-shaped items (see feed.load_feed) as one columnar page."""
+    authors: Dict[str, int] = {}
+
+    def author(name: str) -> int:
+        return authors.setdefault(name, len(authors))
+
+    rows = [
+        [
+            p["id"],
+            author(p["author"]),
+            p["content"],
+            _ms(p["created_at"]),
+            p.get("like_count", 0),
+            p.get("comment_count", 0),
+            p.get("share_count", 0),
+            p.get("view_count", 0),
+            1 if p.get("liked") else 0,
+            [
+                [c["id"], author(c["author"]), c["text"], _ms(c["created_at"])]
+                for c in p.get("recent_comments") or ()
+            ],
+            p.get("cursor"),
+        ]
+        for p in posts
+    ]
+    return {
+        "v": COLUMNAR_VERSION,
+        "cols": POST_COLUMNS,
+        "comment_cols": COMMENT_COLUMNS,
+        "authors": list(authors),
+        "rows": rows,
+    }
+
+
+def encode_feed_frame(events: List[dict], version: int) -> str:
+    """
+    A batch frame (see main.ws_manager) in columnar form: new posts as
+    one page, counter updates as rows. Both keep their oldest-first order.
+    """
+    frame = {"type": "batch", "v": version, "enc": "columnar"}
+    posts = [e["post"] for e in events if e["type"] == "new_post"]
+    counts = [
+        [e["post_id"], *(e.get(f, 0) for f in COUNT_COLUMNS[1:])]
+        for e in events if e["type"] == "counts"
+    ]
+    if posts:
+        frame["posts"] = encode_posts(posts)
+    if counts:
+        frame["counts"] = {"cols": COUNT_COLUMNS, "rows": counts}
+    return dumps(frame)
+
+
+def decode_posts(page: dict) -> List[dict]:
+    """Inverse of encode_posts, times as datetimes (the bench's decoder)."""
+    authors = page["authors"]
+    posts = []
+    for row in page["rows"]:
+        p = dict(zip(page["cols"], row))
+        p["author"] = authors[p["author"]]
+        p["created_at"] = EPOCH + timedelta(milliseconds=p["created_at"])
+        p["liked"] = bool(p["liked"])
+        p["recent_comments"] = [
+            {**dict(zip(page["comment_cols"], c)),
+             "author": authors[c[1]],
+             "created_at": EPOCH + timedelta(milliseconds=c[3])}
+            for c in p["recent_comments"]
+        ]
+        posts.append(p)
+    return posts
+
+
+# ======================
+# PAYLOAD BENCH
+# ======================
+# python -m main.wire [posts_per_page]
+# Synthetic feed pages, no database: bytes (raw and gzipped) and encode /
+# decode time of the default JSON against the columnar layout.
+
+def _bench(page_size: int):
+    import gzip
+    import random
+    import time
+
+    rng = random.Random(3)
+    authors = [f"user{i:04d}" for i in range(200)]
+    now = datetime.utcnow()
+    words = "the a wire post today feed new great #launch photo thanks see you".split()
+
+    def object_id():
+        return f"{rng.getrandbits(96):024x}"
+
+    def text(n):
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    posts = [
+        {
+            "id": object_id(),
+            "author": rng.choice(authors[:page_size]),
+            "content": text(rng.randint(5, 40)),
+            "created_at": now,
+            "like_count": rng.randint(0, 5000),
+            "comment_count": rng.randint(0, 300),
+            "share_count": rng.randint(0, 100),
+            "view_count": rng.randint(0, 50000),
+            "recent_comments": [
+                {"id": object_id(), "author": rng.choice(authors), "text": text(8), "created_at": now}
+                for _ in range(rng.randint(0, 3))
+            ],
+            "liked": rng.random() < 0.2,
+        }
+        for _ in range(page_size)
+    ]
+
+    def iso(v):
+        return v.isoformat() if isinstance(v, datetime) else str(v)
+
+    def default_json():
+        return json.dumps(posts, ensure_ascii=False, separators=(",", ":"), default=iso)
+
+    def columnar():
+        return dumps(encode_posts(posts))
+
+    def timed(fn, runs=2000):
+        started = time.perf_counter()
+        for _ in range(runs):
+            out = fn()
+        return out, (time.perf_counter() - started) / runs * 1e6
+
+    print(f"page of {page_size} posts")
+    for name, encode, decode in (
+        ("json", default_json, json.loads),
+        ("columnar", columnar, lambda s: decode_posts(json.loads(s))),
+    ):
+        body, enc_us = timed(encode)
+        _, dec_us = timed(lambda: decode(body))
+        raw = len(body.encode())
+        zipped = len(gzip.compress(body.encode()))
+        print(f"  {name:9} bytes={raw:7d} gzip={zipped:6d}  encode={enc_us:7.1f} us  decode={dec_us:7.1f} us")
+
+
+if __name__ == "__main__":
+    for _n in ([int(sys.argv[1])] if len(sys.argv) > 1 else [10, 50]):
+        _bench(_n)
@@ -1,15 +1,65 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from main.ws_manager import manager  # SAME INSTANCE
+from main.ws_conn import WS_CLOSE_UNAUTHORIZED
+from main.security import decode_token
+from main.database import relationships_collection
+from main.follow_graph import graph
+from main.sessions import denylist
+from main.wire import FEED_SUBPROTOCOL
+from main.log import get_logger
 
 router = APIRouter()
+logger = get_logger("ws")
+
+
+def ws_username(ws: WebSocket):
+    token = ws.cookies.get("access_token")
+    if not token:
+        return None
+    try:
+        payload = decode_token(token)
+    except ValueError:
+        return None
+    if denylist.is_revoked(payload):
+        return None
+    return payload.get("username")
+
 
 @router.websocket("/ws/feed")
 async def feed_ws(ws: WebSocket):
-    print("🟢 WS CONNECT")
-    await manager.connect(ws)
+    username = ws_username(ws)
+    if not username:
+        # Accept first: a close before the handshake reaches the browser
+        # as a bare 1006, and the client couldn't tell it should refresh.
+        await ws.accept()
+        await ws.close(code=WS_CLOSE_UNAUTHORIZED)
+        return
+
+    # Subscribe to the authors this viewer follows (accepted only).
+    if graph.loaded:
+        following = graph.following_of(username)
+    else:
+        cursor = relationships_collection.find(
+            {"from_username": username, "status": "accepted"},
+            {"_id": 0, "to_username": 1},
+        )
+        following = [d["to_username"] async for d in cursor]
+
+    # Clients that offer the compact subprotocol get columnar batch frames.
+    subprotocol = FEED_SUBPROTOCOL if FEED_SUBPROTOCOL in ws.scope.get("subprotocols", ()) else None
+
+    conn = await manager.connect(ws, username, following, subprotocol)
+    if not conn:
+        return
+
+    logger.info("ws_connect", extra={"fields": {"active": len(manager.active)}})
     try:
         while True:
+            # Any frame (including {"type": "pong"}) proves liveness.
             await ws.receive_text()
-    except WebSocketDisconnect:
-        print("🔴 WS DISCONNECT")
-        manager.disconnect(ws)
\ No newline at end of file
+            conn.touch()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        await manager.disconnect(ws)
+        logger.info("ws_disconnect", extra={"fields": {"active": len(manager.active)}})
@@ -0,0 +1,244 @@
+import asyncio
+import os
+import random
+import time
+from collections import Counter as UserCounter
+from typing import Callable, Dict, Optional, Set
+
+from fastapi import WebSocket
+
+from main.log import get_logger
+from main.metrics import registry
+
+logger = get_logger("ws_conn")
+
+# ======================
+# CONFIG
+# ======================
+
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL_SECONDS", "20"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60"))
+WS_MAX_TOTAL = int(os.getenv("WS_MAX_CONNECTIONS", "10000"))
+WS_MAX_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", "5"))
+WS_MAX_QUEUE = int(os.getenv("WS_MAX_QUEUE_MESSAGES", "256"))
+WS_MAX_QUEUE_BYTES = int(os.getenv("WS_MAX_QUEUE_BYTES", str(1024 * 1024)))
+# Shutdown: clients are told to reconnect after a random 0..JITTER delay,
+# then given up to DRAIN_SECONDS for queued frames to go out.
+WS_DRAIN_JITTER_MS = int(os.getenv("WS_DRAIN_JITTER_MS", "10000"))
+WS_DRAIN_SECONDS = float(os.getenv("WS_DRAIN_SECONDS", "2"))
+
+# Close codes
+WS_CLOSE_GOING_AWAY = 1001
+WS_CLOSE_POLICY = 1008
+WS_CLOSE_SERVICE_RESTART = 1012
+WS_CLOSE_TRY_AGAIN = 1013
+WS_CLOSE_UNAUTHORIZED = 4401
+
+
+# kind -> fn(after_ms) building that protocol's "reconnect later" frame.
+# Registered by ws_manager (feed) and ws_room (rooms).
+RECONNECT_FRAMES: Dict[str, Callable[[int], str]] = {}
+
+
+# ======================
+# CONNECTION
+# ======================
+
+class Connection:
+    """
+    One accepted socket with its own bounded send queue and sender task,
+    so a slow client can never stall a broadcast to everyone else.
+    """
+
+    __slots__ = (
+        "ws", "username", "kind", "ping_frame", "subprotocol", "queue",
+        "queued_bytes", "last_seen", "sender", "closed",
+    )
+
+    def __init__(self, ws: WebSocket, username: str, kind: str, ping_frame: str,
+                 subprotocol: Optional[str] = None):
+        self.ws = ws
+        self.username = username
+        self.kind = kind
+        self.ping_frame = ping_frame
+        # Negotiated frame encoding; None is the default JSON.
+        self.subprotocol = subprotocol
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_MAX_QUEUE)
+        self.queued_bytes = 0
+        self.last_seen = time.monotonic()
+        self.sender: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def start(self):
+        self.sender = asyncio.create_task(self._send_loop())
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def send(self, text: str) -> bool:
+        """Queue a frame. False (and the socket is dropped) if over budget."""
+        if self.closed:
+            return False
+        if self.queued_bytes + len(text) > WS_MAX_QUEUE_BYTES or self.queue.full():
+            tracker.slow_dropped.inc(self.kind)
+            asyncio.create_task(self.close(WS_CLOSE_TRY_AGAIN))
+            return False
+        self.queued_bytes += len(text)
+        tracker.queued_bytes += len(text)
+        self.queue.put_nowait(text)
+        return True
+
+    async def _send_loop(self):
+        try:
+            while True:
+                text = await self.queue.get()
+                self.queued_bytes -= len(text)
+                tracker.queued_bytes -= len(text)
+                await self.ws.send_text(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            await self.close()
+
+    async def close(self, code: int = WS_CLOSE_GOING_AWAY):
+        if self.closed:
+            return
+        self.closed = True
+        tracker.queued_bytes -= self.queued_bytes
+        self.queued_bytes = 0
+        if self.sender and self.sender is not asyncio.current_task():
+            self.sender.cancel()
+        try:
+            await self.ws.close(code=code)
+        except Exception:
+            pass
+
+
+# ======================
+# TRACKER
+# ======================
+
+class ConnectionTracker:
+    """Caps, heartbeats and idle reaping for every socket in the process."""
+
+    def __init__(self):
+        self.connections: Set[Connection] = set()
+        self.per_user: UserCounter = UserCounter()
+        self.queued_bytes = 0
+        self.draining = False
+        self._reaper: Optional[asyncio.Task] = None
+
+        self.rejected = registry.counter(
+            "wire_ws_rejected_total",
+            "WebSocket connections refused by caps",
+            ("kind", "reason"),
+        )
+        self.reaped = registry.counter(
+            "wire_ws_reaped_total",
+            "WebSocket connections closed for missing heartbeats",
+            ("kind",),
+        )
+        self.slow_dropped = registry.counter(
+            "wire_ws_slow_dropped_total",
+            "WebSocket connections dropped for exceeding their send queue",
+            ("kind",),
+        )
+        registry.gauge_callback(
+            "wire_ws_connections",
+            "Open WebSocket connections (feed + rooms)",
+            lambda: len(self.connections),
+        )
+        registry.gauge_callback(
+            "wire_ws_queued_bytes",
+            "Bytes waiting in per-connection send queues",
+            lambda: self.queued_bytes,
+        )
+
+    async def admit(
+        self,
+        ws: WebSocket,
+        username: str,
+        kind: str,
+        ping_frame: str,
+        subprotocol: Optional[str] = None,
+    ) -> Optional[Connection]:
+        """Accept the socket, or close it with a reason and return None."""
+        reason = None
+        if self.draining:
+            reason = "draining"
+        elif len(self.connections) >= WS_MAX_TOTAL:
+            reason = "global_cap"
+        elif self.per_user[username] >= WS_MAX_PER_USER:
+            reason = "user_cap"
+
+        await ws.accept(subprotocol=subprotocol)
+        if reason:
+            self.rejected.inc(kind, reason)
+            await ws.close(code=WS_CLOSE_POLICY if reason == "user_cap" else WS_CLOSE_TRY_AGAIN)
+            return None
+
+        conn = Connection(ws, username, kind, ping_frame, subprotocol)
+        conn.start()
+        self.connections.add(conn)
+        self.per_user[username] += 1
+        self._ensure_reaper()
+        return conn
+
+    async def release(self, conn: Connection):
+        if conn in self.connections:
+            self.connections.discard(conn)
+            self.per_user[conn.username] -= 1
+            if self.per_user[conn.username] <= 0:
+                del self.per_user[conn.username]
+        await conn.close()
+
+    async def drain(self, jitter_ms: int = WS_DRAIN_JITTER_MS, timeout: float = WS_DRAIN_SECONDS):
+        """
+        Graceful shutdown: refuse new sockets, ask every client to come back
+        after its own random delay (so a restart doesn't become a reconnect
+        stampede), let send queues empty, then close with 1012.
+        """
+        self.draining = True
+        conns = [c for c in self.connections if not c.closed]
+        for conn in conns:
+            frame = RECONNECT_FRAMES.get(conn.kind)
+            if frame:
+                conn.send(frame(random.randint(0, jitter_ms)))
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(
+            not c.closed and not c.queue.empty() for c in conns
+        ):
+            await asyncio.sleep(0.05)
+
+        await asyncio.gather(
+            *(c.close(WS_CLOSE_SERVICE_RESTART) for c in conns),
+            return_exceptions=True,
+        )
+        logger.info("ws_drained", extra={"fields": {"connections": len(conns)}})
+
+    def _ensure_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    async def _reap_loop(self):
+        while self.connections:
+            await asyncio.sleep(WS_PING_INTERVAL)
+            now = time.monotonic()
+            for conn in list(self.connections):
+                if conn.closed:
+                    continue
+                if now - conn.last_seen > WS_IDLE_TIMEOUT:
+                    self.reaped.inc(conn.kind)
+                    logger.info(
+                        "ws_reaped",
+                        extra={"fields": {"kind": conn.kind, "username": conn.username}},
+                    )
+                    # Closing makes the handler's receive() raise, and the
+                    # handler releases the connection.
+                    await conn.close(WS_CLOSE_GOING_AWAY)
+                else:
+                    conn.send(conn.ping_frame)
+
+
+tracker = ConnectionTracker()
@@ -1,24 +1,238 @@
 # main/ws_manager.py
-from typing import Set
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from fastapi import WebSocket
 
+from main.metrics import registry, broadcast_latency, broadcast_recipients
+from main.ws_conn import tracker, Connection, RECONNECT_FRAMES
+from main.wire import FEED_SUBPROTOCOL, encode_feed_frame
+
+PING_FRAME = json.dumps({"type": "ping"})
+
+RECONNECT_FRAMES["feed"] = lambda after_ms: json.dumps({"type": "reconnect", "after_ms": after_ms})
+
+# ======================
+# FEED EVENT COALESCING
+# ======================
+# Events are held for FEED_BATCH_WINDOW_MS (or until FEED_BATCH_MAX_EVENTS
+# pile up) and sent as one frame per client:
+#
+#   {"type": "batch", "v": 1, "events": [
+#       {"type": "new_post", "post": {...}},
+#       {"type": "counts", "post_id": "...", "like_count": 3, ...},
+#   ]}
+#
+# Events are oldest first. Counter events carry absolute values, so several
+# updates to one post collapse to the latest, and counts for a post created
+# in the same window are folded into its new_post event.
+#
+# Sockets that negotiated the FEED_SUBPROTOCOL get the same batch in the
+# columnar layout of main.wire instead; ping and reconnect frames are the
+# same for everyone.
+#
+# Each event belongs to its post's author and only reaches sockets
+# subscribed to that author (see ConnectionManager.subscribers), so every
+# client gets its own frame.
+
+FEED_BATCH_WINDOW = float(os.getenv("FEED_BATCH_WINDOW_MS", "75")) / 1000
+FEED_BATCH_MAX_EVENTS = int(os.getenv("FEED_BATCH_MAX_EVENTS", "50"))
+FEED_FRAME_VERSION = 1
+
+COUNT_FIELDS = ("like_count", "comment_count", "share_count")
+
+
+class FeedCoalescer:
+    def __init__(self, manager: "ConnectionManager"):
+        self.manager = manager
+        # post_id -> (author, event)
+        self.posts: Dict[str, Tuple[str, dict]] = {}
+        self.counts: Dict[str, Tuple[str, dict]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self):
+        return len(self.posts) + len(self.counts)
+
+    def add_post(self, post: dict):
+        self.posts[post["id"]] = (post["author"], {"type": "new_post", "post": post})
+        self._schedule()
+
+    def add_counts(self, post_id: str, author: str, counts: dict):
+        pending = self.posts.get(post_id)
+        if pending is not None:
+            pending[1]["post"].update(counts)
+        else:
+            self.counts[post_id] = (author, {"type": "counts", "post_id": post_id, **counts})
+        self._schedule()
+
+    def _schedule(self):
+        if len(self) >= FEED_BATCH_MAX_EVENTS or FEED_BATCH_WINDOW <= 0:
+            self._flush_now()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(FEED_BATCH_WINDOW, self._flush_now)
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not len(self):
+            return
+
+        pending = list(self.posts.values()) + list(self.counts.values())
+        self.posts = {}
+        self.counts = {}
+
+        per_conn: Dict[Connection, List[dict]] = {}
+        for author, event in pending:
+            for conn in self.manager.subscribers.get(author, ()):
+                per_conn.setdefault(conn, []).append(event)
+
+        self.manager.deliver(per_conn)
+
+
 class ConnectionManager:
     def __init__(self):
-        self.active: Set[WebSocket] = set()
+        self.active: Dict[WebSocket, Connection] = {}
+        self.events = FeedCoalescer(self)
+
+        # ---------- TOPICS ----------
+        # author -> sockets that should see the author's posts
+        self.subscribers: Dict[str, Set[Connection]] = {}
+        # socket -> authors it is subscribed to
+        self.topics: Dict[Connection, Set[str]] = {}
+        # viewer -> that viewer's sockets (for live follow/unfollow)
+        self.by_user: Dict[str, Set[Connection]] = {}
+
+    async def connect(
+        self,
+        ws: WebSocket,
+        username: str,
+        following: Iterable[str],
+        subprotocol: Optional[str] = None,
+    ) -> Optional[Connection]:
+        """
+        `following` must come from the viewer's *accepted* relationships;
+        that is what keeps private authors' posts away from non-followers.
+        """
+        conn = await tracker.admit(ws, username, "feed", PING_FRAME, subprotocol)
+        if conn:
+            self.active[ws] = conn
+            self.topics[conn] = set()
+            self.by_user.setdefault(username, set()).add(conn)
+            self._subscribe(conn, username)
+            for author in following:
+                self._subscribe(conn, author)
+        return conn
+
+    async def disconnect(self, ws: WebSocket):
+        conn = self.active.pop(ws, None)
+        if not conn:
+            return
+        for author in self.topics.pop(conn, ()):
+            subs = self.subscribers.get(author)
+            if subs is not None:
+                subs.discard(conn)
+                if not subs:
+                    del self.subscribers[author]
+        conns = self.by_user.get(conn.username)
+        if conns is not None:
+            conns.discard(conn)
+            if not conns:
+                del self.by_user[conn.username]
+        await tracker.release(conn)
+
+    def _subscribe(self, conn: Connection, author: str):
+        self.topics[conn].add(author)
+        self.subscribers.setdefault(author, set()).add(conn)
+
+    def _unsubscribe(self, conn: Connection, author: str):
+        self.topics[conn].discard(author)
+        subs = self.subscribers.get(author)
+        if subs is not None:
+            subs.discard(conn)
+            if not subs:
+                del self.subscribers[author]
+
+    # ---------- LIVE RELATIONSHIP CHANGES ----------
+
+    def follow(self, viewer: str, author: str):
+        """Call once viewer -> author is *accepted*."""
+        for conn in self.by_user.get(viewer, ()):
+            self._subscribe(conn, author)
 
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        self.active.add(ws)
+    def unfollow(self, viewer: str, author: str):
+        if viewer == author:
+            return
+        for conn in self.by_user.get(viewer, ()):
+            self._unsubscribe(conn, author)
 
-    def disconnect(self, ws: WebSocket):
-        self.active.discard(ws)
+    # ---------- PUBLISHING ----------
 
-    async def broadcast(self, message: dict):
-        for ws in list(self.active):
-            try:
-                await ws.send_json(message)
-            except Exception:
-                self.disconnect(ws)
+    def publish_post(self, post: dict):
+        self.events.add_post(post)
+
+    def publish_counts(self, doc: dict):
+        """`doc` is a post document (or projection) with author and counters."""
+        counts = {f: doc.get(f, 0) for f in COUNT_FIELDS}
+        self.events.add_counts(str(doc["_id"]), doc["author"], counts)
+
+    def deliver(self, per_conn: Dict[Connection, List[dict]]):
+        """Send each socket its own batch frame of the events it may see."""
+        start = time.perf_counter()
+        # Sockets with the same event list and encoding (the common case)
+        # share one encode.
+        encoded: Dict[Tuple, str] = {}
+        sent = 0
+        for conn, events in per_conn.items():
+            key = (conn.subprotocol, *map(id, events))
+            text = encoded.get(key)
+            if text is None:
+                if conn.subprotocol == FEED_SUBPROTOCOL:
+                    text = encode_feed_frame(events, FEED_FRAME_VERSION)
+                else:
+                    text = json.dumps(
+                        {"type": "batch", "v": FEED_FRAME_VERSION, "events": events},
+                        default=str,
+                    )
+                encoded[key] = text
+            sent += conn.send(text)
+        broadcast_recipients.inc(amount=sent)
+        broadcast_latency.observe(time.perf_counter() - start)
+
+    def broadcast(self, message: dict):
+        """Send one frame to every feed socket (system messages only)."""
+        text = json.dumps(message, default=str)
+        for conn in list(self.active.values()):
+            conn.send(text)
+
+    def flush(self):
+        """Send whatever is waiting in the coalescer now."""
+        self.events._flush_now()
 
 # 🔥 SINGLE GLOBAL INSTANCE
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
+
+
+async def drain_realtime():
+    """Worker shutdown: push buffered feed events, then drain every socket."""
+    manager.flush()
+    await tracker.drain()
+
+registry.gauge_callback(
+    "wire_ws_feed_sockets",
+    "Open /ws/feed connections",
+    lambda: len(manager.active),
+)
+registry.gauge_callback(
+    "wire_ws_feed_topics",
+    "Authors with at least one subscribed feed socket",
+    lambda: len(manager.subscribers),
+)
+registry.gauge_callback(
+    "wire_ws_feed_pending_events",
+    "Feed events waiting for the next batch frame",
+    lambda: len(manager.events),
+)
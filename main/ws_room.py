@@ -1,46 +1,71 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict, List
+from typing import Dict, List, Optional
 import random
 
+from main.log import get_logger
+from main.metrics import registry
+from main.ws_conn import tracker, Connection, RECONNECT_FRAMES
+
+PING_FRAME = "__PING__"
+PONG_FRAME = "__PONG__"
+
+RECONNECT_FRAMES["room"] = lambda after_ms: f"__RECONNECT__:{after_ms}"
+
 router = APIRouter()
+logger = get_logger("ws_room")
 
 # -------------------------
 # Room Manager
 # -------------------------
 class RoomManager:
     def __init__(self):
-        self.rooms: Dict[str, List[tuple[str, WebSocket]]] = {}
+        self.rooms: Dict[str, List[Connection]] = {}
 
     def create_room(self) -> str:
         room_id = str(random.randint(100000, 999999))
         self.rooms[room_id] = []
-        print("Room created:", room_id)
+        logger.info("room_created", extra={"fields": {"room_id": room_id}})
         return room_id
 
-    async def join(self, room_id: str, username: str, ws: WebSocket):
-        await ws.accept()
-        self.rooms.setdefault(room_id, []).append((username, ws))
-        await self.system_message(room_id, f"{username} joined the room")
+    async def join(self, room_id: str, username: str, ws: WebSocket) -> Optional[Connection]:
+        conn = await tracker.admit(ws, username, "room", PING_FRAME)
+        if not conn:
+            return None
+        self.rooms.setdefault(room_id, []).append(conn)
+        self.system_message(room_id, f"{username} joined the room")
+        return conn
 
-    def leave(self, room_id: str, username: str, ws: WebSocket):
+    async def leave(self, room_id: str, conn: Connection):
         self.rooms[room_id] = [
-            (u, w) for (u, w) in self.rooms.get(room_id, []) if w != ws
+            c for c in self.rooms.get(room_id, []) if c is not conn
         ]
         if not self.rooms[room_id]:
             del self.rooms[room_id]
+        await tracker.release(conn)
 
-    async def broadcast(self, room_id: str, message: str, sender_ws: WebSocket):
-        for _, ws in self.rooms.get(room_id, []):
-            if ws != sender_ws:
-                await ws.send_text(message)
+    def broadcast(self, room_id: str, message: str, sender: Connection):
+        for conn in self.rooms.get(room_id, []):
+            if conn is not sender:
+                conn.send(message)
 
-    async def system_message(self, room_id: str, message: str):
-        for _, ws in self.rooms.get(room_id, []):
-            await ws.send_text(f"__SYSTEM__:{message}")
+    def system_message(self, room_id: str, message: str):
+        for conn in self.rooms.get(room_id, []):
+            conn.send(f"__SYSTEM__:{message}")
 
 
 manager = RoomManager()
 
+registry.gauge_callback(
+    "wire_ws_room_sockets",
+    "Open chat room connections across all rooms",
+    lambda: sum(len(members) for members in manager.rooms.values()),
+)
+registry.gauge_callback(
+    "wire_ws_rooms",
+    "Chat rooms with at least one member",
+    lambda: len(manager.rooms),
+)
+
 # -------------------------
 # HTTP: Create Room
 # -------------------------
@@ -58,10 +83,18 @@ async def chat(ws: WebSocket, room_id: str):
         await ws.close()
         return
 
+    conn = await manager.join(room_id, username, ws)
+    if not conn:
+        return
+
     try:
-        await manager.join(room_id, username, ws)
         while True:
             msg = await ws.receive_text()
-            await manager.broadcast(room_id, f"{username}: {msg}", ws)
-    except WebSocketDisconnect:
-        manager.leave(room_id, username, ws)
\ No newline at end of file
+            conn.touch()
+            if msg == PONG_FRAME:
+                continue
+            manager.broadcast(room_id, f"{username}: {msg}", conn)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        await manager.leave(room_id, conn)
@@ -3,18 +3,22 @@
 // =========================
 async function loadCurrentUser() {
   try {
-    const res = await fetch("/auth/me", {
-      credentials: "include",
-    });
+    let user = window.readBootstrap?.()?.user;
 
-    if (res.status === 401) {
-      location.replace("/login");
-      return;
-    }
+    if (!user) {
+      const res = await fetch("/auth/me", {
+        credentials: "include",
+      });
 
-    if (!res.ok) return;
+      if (res.status === 401) {
+        location.replace("/login");
+        return;
+      }
 
-    const user = await res.json();
+      if (!res.ok) return;
+
+      user = await res.json();
+    }
 
     // ----- Avatar letter -----
     const avatar = document.getElementById("avatar-letter");
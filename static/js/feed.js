@@ -1,7 +1,8 @@
 // =========================
 // FEED STATE
 // =========================
-let skip = 0;
+// Keyset position of the next page (X-Wire-Next-Cursor); null at the end.
+let nextCursor = null;
 const limit = 10;
 let loading = false;
 let finished = false;
@@ -16,6 +17,11 @@ const renderedPostIds = new Set();
 let ws = null;
 let wsConnected = false;
 let pollTimer = null;
+// Set by a server "reconnect" frame (deploy drain): wait this long before
+// reconnecting or polling, so clients don't all come back at once.
+let reconnectAfterMs = null;
+// Server closes with this when the access token is missing or expired.
+const WS_CLOSE_UNAUTHORIZED = 4401;
 
 // =========================
 // DOM REFERENCES
@@ -30,7 +36,8 @@ function startWebSocket() {
   if (wsConnected) return;
 
   const protocol = location.protocol === "https:" ? "wss" : "ws";
-  ws = new WebSocket(`${protocol}://${location.host}/ws/feed`);
+  // Offer the compact frames; a server without them just answers JSON.
+  ws = new WebSocket(`${protocol}://${location.host}/ws/feed`, [FEED_SUBPROTOCOL]);
 
   ws.onopen = () => {
     console.log("🟢 WS connected");
@@ -46,21 +53,47 @@ function startWebSocket() {
       return;
     }
 
-    if (msg.type !== "new_post") return;
+    if (msg.type === "ping") {
+      ws.send(JSON.stringify({ type: "pong" }));
+      return;
+    }
 
-    const p = msg.post;
-    if (!p || !p.id) return;
-    if (renderedPostIds.has(p.id)) return;
+    if (msg.type === "reconnect") {
+      reconnectAfterMs = msg.after_ms;
+      return;
+    }
 
-    renderPost(p, true);
-    renderedPostIds.add(p.id);
-    newestTimestamp = p.created_at;
+    if (msg.type === "batch") {
+      applyBatch(msg.enc === "columnar" ? columnarBatch(msg) : msg);
+    }
   };
 
-  ws.onclose = () => {
-    console.log("🔴 WS disconnected → fallback to polling");
+  ws.onclose = async (e) => {
     wsConnected = false;
     ws = null;
+
+    // Access token expired: refresh it, then reconnect straight away.
+    if (e.code === WS_CLOSE_UNAUTHORIZED) {
+      if (await window.refreshSession?.()) {
+        startWebSocket();
+      } else {
+        location.replace("/login");
+      }
+      return;
+    }
+
+    if (reconnectAfterMs !== null) {
+      console.log(`🟡 WS drained → reconnect in ${reconnectAfterMs}ms`);
+      const delay = reconnectAfterMs;
+      reconnectAfterMs = null;
+      setTimeout(() => {
+        pollNewPosts();
+        startWebSocket();
+      }, delay);
+      return;
+    }
+
+    console.log("🔴 WS disconnected → fallback to polling");
     startPolling();
     retryWebSocket();
   };
@@ -68,6 +101,105 @@ function startWebSocket() {
   ws.onerror = () => ws.close();
 }
 
+// =========================
+// COMPACT WIRE FORMAT
+// =========================
+// Columnar pages and frames (see main/wire.py): column names once per
+// page, one array per post, authors by index, times in epoch ms.
+const COLUMNAR_TYPE = "application/vnd.wire.columnar+json";
+const FEED_SUBPROTOCOL = "wire.columnar.v1";
+
+function decodePosts(page) {
+  const { cols, comment_cols: commentCols, authors, rows } = page;
+  return rows.map(row => {
+    const p = {};
+    cols.forEach((c, i) => { p[c] = row[i]; });
+    p.author = authors[p.author];
+    p.created_at = new Date(p.created_at).toISOString();
+    p.liked = !!p.liked;
+    p.recent_comments = (p.recent_comments || []).map(cr => {
+      const c = {};
+      commentCols.forEach((k, i) => { c[k] = cr[i]; });
+      c.author = authors[c.author];
+      c.created_at = new Date(c.created_at).toISOString();
+      return c;
+    });
+    return p;
+  });
+}
+
+// Columnar batch frame -> the v1 event list applyBatch expects.
+function columnarBatch(msg) {
+  const events = [];
+  if (msg.posts) {
+    for (const post of decodePosts(msg.posts)) events.push({ type: "new_post", post });
+  }
+  if (msg.counts) {
+    const { cols, rows } = msg.counts;
+    for (const row of rows) {
+      const ev = { type: "counts" };
+      cols.forEach((c, i) => { ev[c] = row[i]; });
+      events.push(ev);
+    }
+  }
+  return { type: "batch", v: msg.v, events };
+}
+
+async function fetchPosts(url) {
+  const res = await fetch(url, {
+    credentials: "include",
+    headers: { Accept: `${COLUMNAR_TYPE}, application/json` },
+  });
+  if (!res.ok) return { res, posts: null };
+
+  const type = res.headers.get("content-type") || "";
+  const body = await res.json();
+  return {
+    res,
+    posts: type.includes(COLUMNAR_TYPE) ? decodePosts(body) : body,
+    next: res.headers.get("X-Wire-Next-Cursor"),
+  };
+}
+
+// =========================
+// BATCH FRAMES (v1)
+// =========================
+// { type: "batch", v: 1, events: [new_post | counts, ...] }, oldest first.
+function applyBatch(msg) {
+  if (msg.v !== 1 || !Array.isArray(msg.events)) return;
+
+  const fresh = [];
+  for (const ev of msg.events) {
+    if (ev.type === "new_post") {
+      const p = ev.post;
+      if (!p || !p.id || renderedPostIds.has(p.id)) continue;
+      fresh.push(p);
+    } else if (ev.type === "counts") {
+      applyCounts(ev);
+    }
+  }
+
+  if (!fresh.length) return;
+
+  // One DOM insertion for the whole batch, newest on top.
+  const frag = document.createDocumentFragment();
+  for (let i = fresh.length - 1; i >= 0; i--) {
+    frag.appendChild(buildPost(fresh[i]));
+    renderedPostIds.add(fresh[i].id);
+  }
+  feedEl.prepend(frag);
+  newestTimestamp = fresh[fresh.length - 1].created_at;
+}
+
+function applyCounts(ev) {
+  const div = feedEl.querySelector(`.post[data-post-id="${ev.post_id}"]`);
+  if (!div) return;
+
+  div.querySelector(".like-btn span").textContent = ev.like_count;
+  div.querySelector(".comment-btn span").textContent = ev.comment_count;
+  div.querySelector(".share-count").textContent = ev.share_count;
+}
+
 function retryWebSocket() {
   setTimeout(() => {
     if (!wsConnected) startWebSocket();
@@ -95,9 +227,8 @@ async function loadPosts() {
   if (loading || finished) return;
   loading = true;
 
-  const res = await fetch(`/posts?skip=${skip}&limit=${limit}`, {
-    credentials: "include"
-  });
+  const cursor = nextCursor ? `&cursor=${encodeURIComponent(nextCursor)}` : "";
+  const { res, posts, next } = await fetchPosts(`/posts?limit=${limit}${cursor}`);
 
   if (res.status === 401) {
     location.replace("/login");
@@ -109,12 +240,19 @@ async function loadPosts() {
     return;
   }
 
-  const posts = await res.json();
-  if (!Array.isArray(posts) || posts.length === 0) {
-    finished = true;
-    loading = false;
-    return;
-  }
+  appendPosts(posts, next);
+  loading = false;
+
+  // A page can come back empty when everything scanned was hidden from
+  // this viewer; the cursor still moved past it.
+  if (!posts?.length) loadPosts();
+}
+
+function appendPosts(posts, next) {
+  nextCursor = next || null;
+  if (!nextCursor) finished = true;
+
+  if (!Array.isArray(posts)) return;
 
   for (const p of posts) {
     if (!p || renderedPostIds.has(p.id)) continue;
@@ -127,8 +265,6 @@ async function loadPosts() {
     }
   }
 
-  skip += limit;
-  loading = false;
 }
 
 // =========================
@@ -137,14 +273,12 @@ async function loadPosts() {
 async function pollNewPosts() {
   if (wsConnected || !newestTimestamp) return;
 
-  const res = await fetch(
-    `/posts?after=${encodeURIComponent(newestTimestamp)}&limit=5`,
-    { credentials: "include" }
+  const { res, posts } = await fetchPosts(
+    `/posts?after=${encodeURIComponent(newestTimestamp)}&limit=5`
   );
 
   if (!res.ok) return;
 
-  const posts = await res.json();
   const fresh = posts.filter(
     p => p && p.id && !renderedPostIds.has(p.id)
   );
@@ -173,6 +307,11 @@ function loadNewPosts() {
 // RENDER POST
 // =========================
 function renderPost(p, prepend) {
+  const div = buildPost(p);
+  prepend ? feedEl.prepend(div) : feedEl.appendChild(div);
+}
+
+function buildPost(p) {
   const div = document.createElement("div");
   div.className = "post";
   div.dataset.postId = p.id;
@@ -194,8 +333,12 @@ function renderPost(p, prepend) {
         💬 <span>${p.comment_count}</span>
       </button>
 
-      <button disabled>🔁 ${p.share_count}</button>
+      <button disabled>🔁 <span class="share-count">${p.share_count}</span></button>
+
+      <span class="views" title="Viewed by about this many people">👁 ${p.view_count || 0}</span>
     </div>
+
+    ${renderCommentPreviews(p)}
   `;
 
   // like
@@ -207,8 +350,33 @@ function renderPost(p, prepend) {
   div.querySelector(".comment-btn").addEventListener("click", () => {
     window.openComments?.(p.id);
   });
+  div.querySelector(".comment-previews")?.addEventListener("click", () => {
+    window.openComments?.(p.id);
+  });
 
-  prepend ? feedEl.prepend(div) : feedEl.appendChild(div);
+  return div;
+}
+
+// Newest few comments embedded on the post by the server; the modal
+// still pages the full history.
+function renderCommentPreviews(p) {
+  const previews = p.recent_comments || [];
+  if (!previews.length) return "";
+
+  const more = p.comment_count > previews.length
+    ? `<div class="muted">View all ${p.comment_count} comments</div>`
+    : "";
+
+  return `
+    <div class="comment-previews">
+      ${more}
+      ${previews.map(c => `
+        <div class="comment-preview">
+          <strong>${escapeHTML(c.author)}</strong> ${escapeHTML(c.text)}
+        </div>
+      `).join("")}
+    </div>
+  `;
 }
 
 // =========================
@@ -293,7 +461,14 @@ document.addEventListener("DOMContentLoaded", () => {
   window.createPost = createPost;
   window.loadNewPosts = loadNewPosts;
 
-  loadPosts();      // REST = source of truth
+  // First page inlined by the server (see main.pages); else fetch it.
+  const firstPage = window.readBootstrap?.()?.feed;
+  if (firstPage && firstPage.limit === limit) {
+    appendPosts(firstPage.posts, firstPage.next_cursor);
+    if (!firstPage.posts?.length) loadPosts();
+  } else {
+    loadPosts();    // REST = source of truth
+  }
   startPolling();   // safety
   startWebSocket(); // realtime
 });
\ No newline at end of file
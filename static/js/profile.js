@@ -79,6 +79,56 @@ async function loadCounts() {
   }
 }
 
+// =========================
+// LOAD POSTS (keyset paged)
+// =========================
+const POSTS_PAGE = 10;
+let postsCursor = null;
+
+function renderProfilePost(p) {
+  const div = document.createElement("div");
+  div.className = "post";
+
+  const time = document.createElement("div");
+  time.className = "time";
+  time.textContent = new Date(p.created_at).toLocaleString();
+
+  const content = document.createElement("div");
+  content.className = "post-content";
+  content.textContent = p.content;
+
+  const stats = document.createElement("div");
+  stats.className = "post-actions";
+  stats.textContent = `❤️ ${p.like_count}  💬 ${p.comment_count}  🔁 ${p.share_count}`;
+
+  div.append(time, content, stats);
+  return div;
+}
+
+async function loadPosts() {
+  if (!profile) return;
+
+  const params = new URLSearchParams({ limit: POSTS_PAGE });
+  if (postsCursor) params.set("cursor", postsCursor);
+
+  const res = await fetch(
+    `/posts/by/${encodeURIComponent(profile.username)}?${params}`,
+    { credentials: "include" }
+  );
+  if (!res.ok) return;
+
+  const posts = await res.json();
+  const list = document.getElementById("postsList");
+  const fragment = document.createDocumentFragment();
+  posts.forEach(p => fragment.appendChild(renderProfilePost(p)));
+  list.appendChild(fragment);
+
+  if (posts.length) postsCursor = posts[posts.length - 1].cursor;
+  document
+    .getElementById("morePostsBtn")
+    .classList.toggle("hidden", posts.length < POSTS_PAGE);
+}
+
 // =========================
 // EDIT MODE
 // =========================
@@ -182,7 +232,9 @@ document.addEventListener("DOMContentLoaded", async () => {
     .querySelector("[data-following]")
     ?.addEventListener("click", () => goToFriends("following"));
 
+  document.getElementById("morePostsBtn").addEventListener("click", loadPosts);
+
   // Initial load
-  loadProfile();
+  loadProfile().then(loadPosts);
   loadCounts();
 });
\ No newline at end of file
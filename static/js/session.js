@@ -0,0 +1,63 @@
+// =========================
+// SESSION (GLOBAL)
+// =========================
+// Access tokens are short-lived. When a request comes back 401, ask
+// /auth/refresh for a new one (once, shared by every request that failed
+// at the same time) and retry the request. If the refresh fails too, the
+// session is over and the page's own 401 handling takes over.
+(function () {
+  const nativeFetch = window.fetch.bind(window);
+  let refreshing = null;
+
+  // Endpoints whose 401 is the answer itself, not an expired access token.
+  const NO_RETRY = ["/auth/refresh", "/auth/login", "/auth/logout"];
+
+  function refreshSession() {
+    if (!refreshing) {
+      refreshing = nativeFetch("/auth/refresh", {
+        method: "POST",
+        credentials: "include",
+      })
+        .then((res) => res.ok)
+        .catch(() => false)
+        .finally(() => {
+          refreshing = null;
+        });
+    }
+    return refreshing;
+  }
+
+  window.fetch = async function (input, init) {
+    const res = await nativeFetch(input, init);
+    const url = typeof input === "string" ? input : input.url;
+    const path = new URL(url, location.href).pathname;
+
+    if (res.status !== 401 || NO_RETRY.includes(path)) return res;
+    if (!(await refreshSession())) return res;
+    return nativeFetch(input, init);
+  };
+
+  // For sockets closed as unauthorized (see feed.js).
+  window.refreshSession = refreshSession;
+})();
+
+// =========================
+// SERVER BOOTSTRAP
+// =========================
+// Pages rendered by the server may inline data the scripts would
+// otherwise fetch: <script id="bootstrap" type="application/json">.
+// Read once; null when absent (not signed in, or a static page).
+let bootstrapData;
+
+function readBootstrap() {
+  if (bootstrapData !== undefined) return bootstrapData;
+  const el = document.getElementById("bootstrap");
+  try {
+    bootstrapData = el ? JSON.parse(el.textContent) : null;
+  } catch {
+    bootstrapData = null;
+  }
+  return bootstrapData;
+}
+
+window.readBootstrap = readBootstrap;
@@ -0,0 +1,22 @@
+"""
+Runs the query-plan check (main.query_plans) against a real mongod:
+
+    MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_query_plans.py
+
+Skipped without MONGO_URL. Uses and drops a scratch database.
+"""
+import asyncio
+import os
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.getenv("MONGO_URL"), reason="needs MONGO_URL (a mongod to explain against)")
+
+
+def test_hot_queries_use_indexes():
+    # Never the configured database: main() drops what it uses.
+    if not os.getenv("DB_NAME", "").endswith("_plancheck"):
+        os.environ["DB_NAME"] = "wire_plancheck"
+    from main import query_plans
+
+    assert asyncio.run(query_plans.main()) == 0